@@ -0,0 +1,134 @@
+"""
+Production analytics per cliente, artigo, cor and layout.
+
+Finished orders and espulas of a period are pulled with a projection, a
+batch at a time, straight into per-field columns (no per-document models),
+turned into a DataFrame and aggregated with a single groupby: metros
+produced, documents finished and the average wait (created -> started) and
+production (started -> finished) times in hours.
+
+Quantities are free-form text ("1.500", "1500 m", "2,5"); parse_quantities
+applies the rules of parsing.parse_quantity to the whole column at once.
+"""
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+GROUP_FIELDS = ("cliente", "artigo", "cor", "layout_type")
+BATCH_SIZE = 5000
+
+# Source collection -> fields used for quantity and the three timestamps
+SOURCES = {
+    "orders": {
+        "quantity": "quantidade",
+        "created": "created_at",
+        "started": "started_at",
+        "finished": "finished_at",
+    },
+    "espulas": {
+        "quantity": "quantidade_metros",
+        "created": "created_at",
+        "started": "iniciado_em",
+        "finished": "finalizado_em",
+    },
+}
+
+
+def projection(source: str) -> dict:
+    fields = SOURCES[source]
+    # espulas have no layout_type of their own: it comes from the allocations
+    layout = "machine_allocations.layout_type" if source == "espulas" else "layout_type"
+    return {"_id": 0, layout: 1, **{field: 1 for field in GROUP_FIELDS[:3]},
+            **{field: 1 for field in fields.values()}}
+
+
+async def collect_columns(cursors: Iterable, fields: Sequence[str], batch_size: int = BATCH_SIZE) -> Dict[str, list]:
+    """Drain (motor) cursors batch by batch into one list per field"""
+    columns = {field: [] for field in fields}
+    for cursor in cursors:
+        while True:
+            batch = await cursor.to_list(batch_size)
+            if not batch:
+                break
+            for field, column in columns.items():
+                column.extend(doc.get(field) for doc in batch)
+            if len(batch) < batch_size:
+                break
+    return columns
+
+
+def allocation_layouts(allocations: list) -> list:
+    """Layout of an espula = layout of its first machine allocation"""
+    return [(a[0] or {}).get("layout_type") if isinstance(a, list) and a else None for a in allocations]
+
+
+def parse_quantities(values: Sequence) -> np.ndarray:
+    """Vectorized parsing.parse_quantity: float64 array, NaN where nothing parses.
+
+    The same few quantities repeat across thousands of documents, so only
+    the distinct values go through the string operations.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    series = pd.Series(uniques, dtype=object)
+    numeric = pd.to_numeric(series.where(series.map(lambda v: isinstance(v, (int, float)))), errors="coerce")
+
+    text = series.where(numeric.isna()).astype("string")
+    number = text.str.extract(r"(\d[\d.,]*)", expand=False).str.rstrip(".,")
+    brazilian = number.str.contains(",", regex=False).fillna(False)
+    thousands = number.str.fullmatch(r"\d{1,3}(?:\.\d{3})+").fillna(False)
+    number = number.mask(brazilian, number.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    number = number.mask(thousands & ~brazilian, number.str.replace(".", "", regex=False))
+    parsed = numeric.fillna(pd.to_numeric(number, errors="coerce")).to_numpy(dtype="float64", na_value=np.nan)
+    # factorize marks missing values with -1, which picks the trailing NaN
+    return np.append(parsed, np.nan)[codes]
+
+
+def production_frame(source: str, columns: Dict[str, list]) -> pd.DataFrame:
+    """Columns of one source -> frame with the group fields, metros and durations in hours"""
+    fields = SOURCES[source]
+    layouts = (allocation_layouts(columns.get("machine_allocations", []))
+               if source == "espulas" else columns.get("layout_type", []))
+    created, started, finished = (
+        pd.to_datetime(pd.Series(columns[fields[name]], dtype=object), utc=True, format="mixed", errors="coerce")
+        for name in ("created", "started", "finished")
+    )
+    hour = np.timedelta64(1, "h")
+    frame = pd.DataFrame({
+        "cliente": columns["cliente"],
+        "artigo": columns["artigo"],
+        "cor": columns["cor"],
+        "layout_type": layouts,
+        "metros": parse_quantities(columns[fields["quantity"]]),
+        "wait_hours": (started - created) / hour,
+        "production_hours": (finished - started) / hour,
+    })
+    frame[list(GROUP_FIELDS)] = frame[list(GROUP_FIELDS)].fillna("").astype(str).apply(lambda c: c.str.strip())
+    return frame
+
+
+def _records(stats: pd.DataFrame) -> List[dict]:
+    stats = stats.round({"metros": 2, "avg_wait_hours": 2, "avg_production_hours": 2})
+    # NaN (no timestamps in the group) -> None for JSON
+    return stats.astype(object).where(stats.notna(), None).to_dict("records")
+
+
+def production_stats(frame: pd.DataFrame, group_by: Sequence[str]) -> dict:
+    """Totals and per-group statistics, largest metros first"""
+    aggregations = {
+        "metros": ("metros", "sum"),
+        "finished": ("metros", "size"),
+        "avg_wait_hours": ("wait_hours", "mean"),
+        "avg_production_hours": ("production_hours", "mean"),
+    }
+    totals = pd.DataFrame({
+        "metros": [frame["metros"].sum()],
+        "finished": [len(frame)],
+        "avg_wait_hours": [frame["wait_hours"].mean()],
+        "avg_production_hours": [frame["production_hours"].mean()],
+    })
+    if frame.empty:
+        return {"totals": _records(totals)[0], "groups": []}
+    groups = (frame.groupby(list(group_by), sort=False).agg(**aggregations)
+              .reset_index().sort_values(["metros", "finished"], ascending=False))
+    return {"totals": _records(totals)[0], "groups": _records(groups)}
@@ -0,0 +1,87 @@
+"""
+Parsing of the free-form text fields, shared by server.py and seed_plant.py.
+
+Quantity-like fields and delivery dates are free-form strings; every write
+also stores a parsed shadow copy so that totals, range filters and sorts can
+run in MongoDB: <field>_num (None when it does not parse) and <field>_dt
+(UTC datetime, date-only values at Brazil midnight). Artigos are matched on
+a normalized name (artigo_normalizado).
+"""
+import re
+from datetime import datetime, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+# Brazil timezone usando zoneinfo (padrão Python 3.9+)
+BRAZIL_TZ = ZoneInfo("America/Sao_Paulo")
+
+NUMERIC_FIELDS = {
+    "orders": ("quantidade",),
+    "espulas": ("quantidade_metros", "carga", "qtde_fios"),
+    "ordens_producao": ("metragem", "fios", "engrenagem"),
+    "banco_dados": ("ciclos", "carga", "fios", "engrenagem"),
+}
+DATE_FIELDS = {
+    "espulas": ("data_prevista_entrega",),
+    "ordens_producao": ("data_entrega",),
+}
+
+
+def parse_quantity(value) -> Optional[float]:
+    """Parse free-form quantities such as "1.500", "1500 m" or "2,5" into a number"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r"\d[\d.,]*", str(value))
+    if not match:
+        return None
+    number = match.group(0).rstrip(".,")
+    if "," in number:
+        # Brazilian format: "." thousands separator, "," decimal separator
+        number = number.replace(".", "").replace(",", ".")
+    elif re.fullmatch(r"\d{1,3}(\.\d{3})+", number):
+        number = number.replace(".", "")
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def parse_delivery_date(value) -> Optional[datetime]:
+    """Parse an ISO delivery date; date-only values are read as Brazil local midnight"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=BRAZIL_TZ)
+    return parsed.astimezone(timezone.utc)
+
+
+def shadowed_fields(collection_name: str) -> tuple:
+    return NUMERIC_FIELDS[collection_name] + DATE_FIELDS.get(collection_name, ())
+
+
+def with_shadow_fields(collection_name: str, data: dict) -> dict:
+    """Add <field>_num / <field>_dt next to every shadowed field present in `data` (in place)"""
+    for field in NUMERIC_FIELDS[collection_name]:
+        if field in data:
+            data[f"{field}_num"] = parse_quantity(data[field])
+    for field in DATE_FIELDS.get(collection_name, ()):
+        if field in data:
+            data[f"{field}_dt"] = parse_delivery_date(data[field])
+    if collection_name == "espulas" and isinstance(data.get("machine_allocations"), list):
+        for allocation in data["machine_allocations"]:
+            allocation["quantidade_num"] = parse_quantity(allocation.get("quantidade"))
+    return data
+
+
+def normalize_artigo(name: str) -> str:
+    """Key used to detect duplicate artigos: trimmed, single-spaced and case-insensitive"""
+    return " ".join((name or "").split()).casefold()
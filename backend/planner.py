@@ -0,0 +1,216 @@
+"""
+Machine-allocation planner for espulagem.
+
+Proposes how to split the metragem of an ordem/espula over up to five
+machines, looking at how much work is already queued on each machine, the
+machines recommended for the artigo in the banco de dados, the layout type
+and the delivery date.
+
+The solver is a greedy "water-filling" heuristic: candidates are ranked by
+the time they become free, and for k = 1..max_machines the quantity is split
+so that all chosen machines finish together. The smallest k that meets the
+delivery date wins (fewer machines means fewer setups); when none does, the
+k with the earliest finish is used, and without a delivery date each extra
+machine has to pay for its setup time. Everything is O(n log n) in the number
+of machines, so planning across the whole plant takes well under a
+millisecond per hundred machines.
+"""
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from layouts import MACHINE_LAYOUTS
+
+MAX_ALLOCATIONS = 5  # Espula.machine_allocations holds up to 5 machines
+
+# Machines that cannot receive work
+UNAVAILABLE_STATUSES = {"azul", "desativada"}
+
+_CODE_RE = re.compile(r"^([A-Z]+)(\d+)$")
+_RANGE_RE = re.compile(r"^([A-Z]+)(\d+)-(?:([A-Z]+))?(\d+)$")
+
+
+def parse_recommended_machines(maquinas: str) -> Tuple[Set[str], Set[str]]:
+    """Parse the free-form `maquinas` field of an artigo.
+
+    Returns (codes, families): explicit machine codes such as "CD1" (ranges
+    like "CD1-CD4" or "U1-10" are expanded) and whole families such as "CT".
+    Layout names ("16", "32 fusos") are mapped to their families.
+    """
+    codes: Set[str] = set()
+    families: Set[str] = set()
+    if not maquinas:
+        return codes, families
+
+    text = re.sub(r"\s*-\s*", "-", maquinas.upper())
+    for token in re.split(r"[,;/\s]+", text):
+        if token in ("", "E", "FUSOS"):
+            continue
+        range_match = _RANGE_RE.match(token)
+        if range_match:
+            prefix, start, other_prefix, end = range_match.groups()
+            if other_prefix in (None, prefix):
+                first, last = sorted((int(start), int(end)))
+                codes.update(f"{prefix}{n}" for n in range(first, last + 1))
+            continue
+        if _CODE_RE.match(token):
+            codes.add(token)
+        elif token in ("16", "32"):
+            families.update(LAYOUT_FAMILIES[f"{token}_fusos"])
+        elif token.isalpha():
+            families.add(token)
+    return codes, families
+
+
+def machine_family(code: str) -> str:
+    match = _CODE_RE.match(code.upper())
+    return match.group(1) if match else code.upper()
+
+
+# Machine code families per layout ("16" in `maquinas` means every 16 fusos family)
+LAYOUT_FAMILIES = {
+    layout_type: {machine_family(machine["code"]) for machine in machines}
+    for layout_type, machines in MACHINE_LAYOUTS.items()
+}
+
+
+def _format_metros(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.2f}"
+
+
+def _water_level(candidates: List[dict], quantity: float) -> float:
+    """Smallest finish time (hours from now) reachable by splitting `quantity`
+    over `candidates` so that every machine used finishes at the same time."""
+    # Candidates are sorted by free_at; fill the earliest machines first
+    total_rate = 0.0
+    weighted_free = 0.0
+    level = 0.0
+    for i, cand in enumerate(candidates):
+        total_rate += cand["rate"]
+        weighted_free += cand["rate"] * cand["free_at"]
+        level = (quantity + weighted_free) / total_rate
+        next_free = candidates[i + 1]["free_at"] if i + 1 < len(candidates) else None
+        if next_free is None or level <= next_free:
+            return level
+    return level
+
+
+def _split(candidates: List[dict], quantity: float, level: float) -> List[Tuple[dict, float]]:
+    shares = []
+    for cand in candidates:
+        share = max(0.0, (level - cand["free_at"]) * cand["rate"])
+        if share > 0:
+            shares.append((cand, share))
+    # Round to whole meters and give the rounding remainder to the first machine
+    rounded = [(cand, float(int(share))) for cand, share in shares]
+    remainder = quantity - sum(share for _, share in rounded)
+    if rounded:
+        cand, share = rounded[0]
+        rounded[0] = (cand, share + remainder)
+    return [(cand, share) for cand, share in rounded if share > 0]
+
+
+def plan_allocations(
+    quantity: float,
+    machines: Iterable[dict],
+    backlog: Dict[str, float],
+    recommended_codes: Optional[Set[str]] = None,
+    recommended_families: Optional[Set[str]] = None,
+    layout_type: Optional[str] = None,
+    delivery_date: Optional[datetime] = None,
+    now: Optional[datetime] = None,
+    meters_per_hour: float = 100.0,
+    max_machines: int = MAX_ALLOCATIONS,
+    non_recommended_penalty: float = 8.0,
+    setup_hours: float = 2.0,
+    ranking_size: int = 10,
+) -> dict:
+    """Plan the allocation of `quantity` meters.
+
+    `machines` are machine documents (id, code, layout_type, status, active).
+    `backlog` maps machine code to the meters still to produce on it (pending
+    orders plus the remainder of the order in production).
+    Non-recommended machines are only preferred when they free up more than
+    `non_recommended_penalty` hours earlier than a recommended one. Without a
+    delivery date each extra machine must save at least `setup_hours`.
+    """
+    recommended_codes = recommended_codes or set()
+    recommended_families = recommended_families or set()
+    has_recommendation = bool(recommended_codes or recommended_families)
+    now = now or datetime.now(timezone.utc)
+
+    candidates = []
+    for machine in machines:
+        if not machine.get("active", True) or machine.get("status") in UNAVAILABLE_STATUSES:
+            continue
+        if layout_type and machine.get("layout_type") != layout_type:
+            continue
+        code = machine["code"]
+        recommended = code in recommended_codes or machine_family(code) in recommended_families
+        queued = backlog.get(code, 0.0)
+        free_at = queued / meters_per_hour
+        score = free_at + (non_recommended_penalty if has_recommendation and not recommended else 0.0)
+        candidates.append({
+            "machine_id": machine["id"],
+            "machine_code": code,
+            "layout_type": machine.get("layout_type"),
+            "status": machine.get("status"),
+            "recommended": recommended,
+            "backlog_metros": round(queued, 2),
+            "free_at": free_at,
+            "rate": meters_per_hour,
+            "score": score,
+        })
+
+    candidates.sort(key=lambda c: (c["score"], c["machine_code"]))
+
+    deadline_hours = None
+    if delivery_date is not None:
+        deadline_hours = (delivery_date - now).total_seconds() / 3600
+
+    best = None
+    if quantity > 0 and candidates:
+        cheapest = fastest = None
+        for k in range(1, min(max_machines, len(candidates)) + 1):
+            chosen = sorted(candidates[:k], key=lambda c: c["free_at"])
+            level = _water_level(chosen, quantity)
+            if deadline_hours is not None and level <= deadline_hours:
+                best = (chosen, level)
+                break
+            cost = level + (k - 1) * setup_hours
+            if cheapest is None or cost < cheapest[2] - 1e-9:
+                cheapest = (chosen, level, cost)
+            if fastest is None or level < fastest[1] - 1e-9:
+                fastest = (chosen, level)
+        if best is None:
+            # Late anyway: go as fast as possible; no deadline: balance speed and setups
+            best = fastest if deadline_hours is not None else cheapest[:2]
+
+    allocations = []
+    finish_hours = None
+    if best is not None:
+        chosen, finish_hours = best
+        for cand, share in _split(chosen, quantity, finish_hours):
+            allocations.append({
+                "machine_code": cand["machine_code"],
+                "machine_id": cand["machine_id"],
+                "layout_type": cand["layout_type"],
+                "quantidade": _format_metros(share),
+            })
+
+    ranking = [
+        {key: value for key, value in cand.items() if key not in ("rate", "free_at")}
+        | {"livre_em_horas": round(cand["free_at"], 2), "score": round(cand["score"], 2)}
+        for cand in candidates[:ranking_size]
+    ]
+
+    return {
+        "allocations": allocations,
+        "ranking": ranking,
+        "candidates": len(candidates),
+        "finish_in_hours": round(finish_hours, 2) if finish_hours is not None else None,
+        "meets_delivery": (
+            None if deadline_hours is None or finish_hours is None
+            else finish_hours <= deadline_hours
+        ),
+    }
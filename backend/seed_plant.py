@@ -0,0 +1,373 @@
+"""
+Synthetic plant data for scale testing.
+
+Generates years of history for the real machine layout (CD/CI/F and
+CT/U/N): banco_dados artigos, ordens de produção with sequential
+numero_os, espulas with machine_allocations and cargas_fracoes, the
+orders they create (plus manual orders), maintenance episodes and the
+machine status timeline. Every machine is simulated as a queue, so the
+final state is consistent: finished orders in the past, at most one order
+in production per machine, pending queues, machine colours and open
+maintenances that match.
+
+The same seed and arguments always produce the same documents (ids
+included). `generate_plant()` returns plain dicts, so benchmarks can use
+the data in memory; the command line writes it with bulk inserts:
+
+    python seed_plant.py --orders 300000 --years 3 --seed 42
+
+This REPLACES machines, orders, espulas, ordens_producao, maintenance,
+banco_dados and the status timeline of DB_NAME (users are kept).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from layouts import MACHINE_LAYOUTS
+from parsing import normalize_artigo, with_shadow_fields
+
+QUEUE_POSITION_GAP = 1024  # same spacing as server.next_queue_position
+STATUS_TIMELINE = "machine_status_samples"
+USERS = ["admin", "interno", "externo"]
+
+ARTIGO_TYPES = ["ELASTICO", "CADARCO", "FITA", "VIES", "SUTACHE", "GORGORAO", "ALCA", "DEBRUM", "CORDAO", "RENDA"]
+CLIENT_PREFIXES = ["CONFECCOES", "MALHARIA", "TEXTIL", "MODA", "INDUSTRIA", "LINGERIE", "CALCADOS"]
+CLIENT_NAMES = ["AURORA", "BELA VISTA", "SAO JOSE", "PRIMAVERA", "ATLANTICO", "SERRA", "HORIZONTE", "VALE",
+                "ESTRELA", "PARANA", "MINUANO", "IPE", "JACARANDA", "CRISTAL", "PAMPA", "LITORAL"]
+COLORS = ["BRANCO", "PRETO", "AZUL MARINHO", "VERMELHO", "BEGE", "CINZA", "ROSA", "VERDE BANDEIRA",
+          "AMARELO", "MARROM", "NUDE", "ROYAL", "VINHO", "LARANJA", "LILAS", "CRU"]
+MATERIAS_PRIMAS = ["POLIESTER", "POLIAMIDA", "ALGODAO", "ELASTANO", "VISCOSE"]
+MOTIVOS = ["Troca de correia", "Quebra de agulha", "Lubrificação", "Ajuste de tensão", "Revisão preventiva",
+           "Troca de engrenagem", "Problema elétrico"]
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _family(code: str) -> str:
+    return code.rstrip("0123456789")
+
+
+def _metros(value: float) -> str:
+    return str(int(round(value)))
+
+
+def generate_artigos(rng: random.Random, count: int, created_at: datetime) -> list:
+    families = {}
+    for layout_type, machines in MACHINE_LAYOUTS.items():
+        for machine in machines:
+            families.setdefault(_family(machine["code"]), []).append(machine["code"])
+
+    artigos = []
+    for n in range(count):
+        name = f"{rng.choice(ARTIGO_TYPES)} {n + 1:04d}"
+        family = rng.choice(sorted(families))
+        codes = families[family]
+        if rng.random() < 0.5:
+            maquinas = family
+        else:
+            first = rng.randrange(len(codes))
+            last = min(len(codes) - 1, first + rng.randrange(1, 6))
+            maquinas = f"{codes[first]}-{codes[last]}"
+        artigos.append({
+            "id": _uuid(rng),
+            "artigo": name,
+            "artigo_normalizado": normalize_artigo(name),
+            "engrenagem": f"{rng.randint(20, 80)}/{rng.randint(20, 80)}",
+            "fios": str(rng.choice([8, 12, 16, 24, 32, 48])),
+            "maquinas": maquinas,
+            "ciclos": str(rng.randint(1, 12)),
+            "carga": f"{rng.randint(1, 40)}{rng.choice(['', 'A', 'B', 'C'])}",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return artigos
+
+
+def generate_plant(
+    orders: int = 300_000,
+    years: float = 3,
+    artigos: int = 400,
+    seed: int = 42,
+    end: datetime = None,
+    meters_per_hour: float = 100.0,
+    utilization: float = 0.8,
+    manual_share: float = 0.2,
+    maintenance_per_month: float = 1.0,
+    open_maintenances: int = 3,
+) -> dict:
+    """Documents per collection for a plant with about `orders` orders over `years`.
+
+    `end` (default: today 00:00 UTC) is "now" for the generated plant: work
+    scheduled after it is still pending or in production.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=365 * years)
+    horizon_hours = (end - start).total_seconds() / 3600
+
+    machines = []
+    for layout_type, layout_machines in MACHINE_LAYOUTS.items():
+        for machine in layout_machines:
+            machines.append({
+                "id": f"{layout_type}_{machine['code']}_{_uuid(rng)[:8]}",
+                "code": machine["code"],
+                "position": machine["position"],
+                "status": "verde",
+                "layout_type": layout_type,
+                "active": True,
+                "updated_at": end,
+                "version": 0,
+            })
+    machines_by_family = {}
+    for machine in machines:
+        machines_by_family.setdefault(_family(machine["code"]), []).append(machine)
+
+    banco_dados = generate_artigos(rng, artigos, start)
+    clients = [f"{rng.choice(CLIENT_PREFIXES)} {name} {n}" for n, name in
+               enumerate(rng.choices(CLIENT_NAMES, k=120))]
+
+    # Mean order size so that the plant runs at `utilization` over the horizon
+    mean_hours = len(machines) * horizon_hours * utilization / max(orders, 1)
+    mean_meters = mean_hours * meters_per_hour
+
+    # 1. Demand: ordens -> espulas -> allocations, plus manual orders
+    ordens_producao, espulas, planned = [], [], []  # planned: (machine, created_at, meters, order fields)
+    espula_share = 1 - manual_share
+    numero = 0
+    while len(planned) < orders:
+        created = start + timedelta(hours=rng.uniform(0, horizon_hours))
+        artigo = rng.choice(banco_dados)
+        cliente = rng.choice(clients)
+        cor = rng.choice(COLORS)
+        if rng.random() >= espula_share:
+            machine = rng.choice(machines)
+            meters = rng.expovariate(1 / mean_meters)
+            planned.append((machine, created, meters, {
+                "cliente": cliente, "artigo": artigo["artigo"], "cor": cor, "origem": "manual",
+            }))
+            continue
+
+        numero += 1
+        numero_os = str(numero).zfill(4)
+        allocations_count = rng.choices([1, 2, 3, 4, 5], weights=[30, 30, 20, 12, 8])[0]
+        total_meters = sum(rng.expovariate(1 / mean_meters) for _ in range(allocations_count))
+        family = _family(artigo["maquinas"].split("-")[0]) if artigo["maquinas"] else rng.choice(sorted(machines_by_family))
+        candidates = machines_by_family.get(family) or machines
+        allocated = rng.sample(candidates, min(allocations_count, len(candidates)))
+        shares = [rng.uniform(0.5, 1.5) for _ in allocated]
+        quantities = [total_meters * share / sum(shares) for share in shares]
+
+        ordem_id, espula_id = _uuid(rng), _uuid(rng)
+        delivery = (created + timedelta(days=rng.randint(5, 30))).date().isoformat()
+        espula_created = created + timedelta(hours=rng.uniform(1, 48))
+        finalized = espula_created + timedelta(hours=rng.uniform(1, 24))
+        ordem = {
+            "id": ordem_id, "numero_os": numero_os, "cliente": cliente, "artigo": artigo["artigo"], "cor": cor,
+            "metragem": _metros(total_meters), "data_entrega": delivery, "observacao": "",
+            "engrenagem": artigo["engrenagem"], "fios": artigo["fios"], "maquinas": artigo["maquinas"],
+            "status": "finalizado", "criado_em": created, "iniciado_em": espula_created, "finalizado_em": finalized,
+            "criado_por": rng.choice(USERS), "created_at": created, "updated_at": finalized,
+            "dados_temporarios_maquinas": [], "espula_data_temp": {}, "editado_por": None, "editado_em": None,
+        }
+        espula = {
+            "id": espula_id, "numero_os": numero_os, "ordem_producao_id": ordem_id,
+            "maquina": allocated[0]["code"], "mat_prima": rng.choice(MATERIAS_PRIMAS), "qtde_fios": artigo["fios"],
+            "machine_allocations": [
+                {"machine_code": m["code"], "machine_id": m["id"], "layout_type": m["layout_type"],
+                 "quantidade": _metros(q)}
+                for m, q in zip(allocated, quantities)
+            ],
+            "cargas_fracoes": [f"{rng.randint(1, 40)}/{rng.randint(1, 8)}" for _ in range(rng.randint(1, 4))],
+            "cliente": cliente, "artigo": artigo["artigo"], "cor": cor,
+            "quantidade_metros": _metros(total_meters), "carga": artigo["carga"], "observacoes": "",
+            "status": "finalizado", "data_lancamento": espula_created, "data_prevista_entrega": delivery,
+            "created_by": rng.choice(USERS), "created_at": espula_created, "updated_at": finalized,
+            "iniciado_em": espula_created, "finalizado_em": finalized,
+        }
+        if finalized > end:
+            # Recent work not released to the machines yet
+            espula["status"] = rng.choice(["pendente", "em_producao_aguardando"])
+            espula["finalizado_em"] = None
+            espula["updated_at"] = espula_created
+            ordem["status"], ordem["finalizado_em"], ordem["updated_at"] = "em_producao", None, espula_created
+            if espula_created > end:
+                continue  # not even launched yet: the ordem would be in the future
+        ordens_producao.append(ordem)
+        espulas.append(espula)
+        if espula["status"] != "finalizado":
+            continue
+        for machine, quantity in zip(allocated, quantities):
+            planned.append((machine, finalized, quantity, {
+                "cliente": cliente, "artigo": artigo["artigo"], "cor": cor, "origem": "espulagem",
+                "espulagem_id": espula_id, "ordem_producao_id": ordem_id, "numero_os": numero_os,
+                "observacao": "",
+            }))
+
+    # numero_os follows creation order, like get_next_ordem_number
+    ordens_producao.sort(key=lambda o: o["criado_em"])
+    renumber = {}
+    for n, ordem in enumerate(ordens_producao, start=1):
+        renumber[ordem["numero_os"]] = str(n).zfill(4)
+        ordem["numero_os"] = renumber[ordem["numero_os"]]
+    for espula in espulas:
+        espula["numero_os"] = renumber[espula["numero_os"]]
+    planned = [
+        (m, c, q, {**f, "numero_os": renumber[f["numero_os"]]} if f.get("numero_os") else f)
+        for m, c, q, f in planned
+    ]
+
+    # 2. Supply: every machine works its queue in creation order
+    by_machine = {}
+    for item in planned:
+        by_machine.setdefault(item[0]["code"], []).append(item)
+
+    orders_docs, maintenance, samples = [], [], []
+    maintenance_chance = maintenance_per_month * len(machines) * horizon_hours / (730 * max(len(planned), 1))
+    open_codes = set(m["code"] for m in rng.sample(machines, min(open_maintenances, len(machines))))
+
+    def sample(machine, ts, status, previous, **context):
+        doc = {"ts": ts, "meta": {"machine_code": machine["code"], "layout_type": machine["layout_type"]},
+               "status": status, "previous_status": previous, "changed_by": rng.choice(USERS)}
+        doc.update(context)
+        samples.append(doc)
+
+    for machine in machines:
+        queue = sorted(by_machine.get(machine["code"], []), key=lambda item: item[1])
+        free_at = start
+        colour = "verde"
+        sample(machine, start, "verde", None)
+        for position, (_, created, meters, fields) in enumerate(queue, start=1):
+            if rng.random() < maintenance_chance and free_at < end:
+                opened = max(free_at, created - timedelta(hours=rng.uniform(0, 12)))
+                duration = timedelta(hours=rng.uniform(1, 48))
+                if opened < end:
+                    maintenance_id = _uuid(rng)
+                    maintenance.append({
+                        "id": maintenance_id, "machine_id": machine["id"], "machine_code": machine["code"],
+                        "motivo": rng.choice(MOTIVOS), "status": "finalizada", "created_by": rng.choice(USERS),
+                        "created_at": opened, "finished_at": min(opened + duration, end),
+                        "finished_by": rng.choice(USERS), "previous_status": colour,
+                    })
+                    sample(machine, opened, "azul", colour, maintenance_id=maintenance_id)
+                    free_at = opened + duration
+                    sample(machine, min(free_at, end), "verde", "azul", maintenance_id=maintenance_id)
+                    colour = "verde"
+
+            started = max(created + timedelta(minutes=rng.uniform(5, 240)), free_at)
+            finished = started + timedelta(hours=meters / meters_per_hour)
+            order = {
+                "id": _uuid(rng), "machine_id": machine["id"], "machine_code": machine["code"],
+                "layout_type": machine["layout_type"], "quantidade": _metros(meters), "observacao": "",
+                "status": "finalizado", "created_by": rng.choice(USERS), "created_at": created,
+                "started_at": started, "finished_at": finished, "finished_by": rng.choice(USERS),
+                "observacao_liberacao": "", "laudo_final": "", "espulagem_id": None, "ordem_producao_id": None,
+                "numero_os": None, "queue_position": position * QUEUE_POSITION_GAP, "version": 2,
+                **fields,
+            }
+            if created >= end:
+                continue
+            if started >= end:
+                order.update(status="pendente", started_at=None, finished_at=None, finished_by=None, version=0)
+            elif finished >= end:
+                order.update(status="em_producao", finished_at=None, finished_by=None, version=1)
+                sample(machine, started, "vermelho", colour, order_id=order["id"])
+                colour = "vermelho"
+            else:
+                sample(machine, started, "vermelho", colour, order_id=order["id"])
+                sample(machine, finished, "verde", "vermelho", order_id=order["id"])
+                colour = "verde"
+            orders_docs.append(order)
+            free_at = finished
+
+        statuses = {o["status"] for o in orders_docs[-len(queue):]} if queue else set()
+        status = "vermelho" if "em_producao" in statuses else "amarelo" if "pendente" in statuses else "verde"
+        if machine["code"] in open_codes:
+            opened = end - timedelta(hours=rng.uniform(1, 12))
+            maintenance_id = _uuid(rng)
+            maintenance.append({
+                "id": maintenance_id, "machine_id": machine["id"], "machine_code": machine["code"],
+                "motivo": rng.choice(MOTIVOS), "status": "em_manutencao", "created_by": rng.choice(USERS),
+                "created_at": opened, "finished_at": None, "finished_by": None, "previous_status": status,
+            })
+            sample(machine, opened, "azul", status, maintenance_id=maintenance_id)
+            status = "azul"
+        machine["status"] = status
+        machine["version"] = len(queue)
+
+    orders_docs.sort(key=lambda o: o["created_at"])
+    samples.sort(key=lambda s: s["ts"])
+    # Same document shape as the API writes: parsed <field>_num / <field>_dt copies
+    for collection_name, docs in (("banco_dados", banco_dados), ("ordens_producao", ordens_producao),
+                                  ("espulas", espulas), ("orders", orders_docs)):
+        for doc in docs:
+            with_shadow_fields(collection_name, doc)
+    return {
+        "machines": machines,
+        "banco_dados": banco_dados,
+        "ordens_producao": ordens_producao,
+        "espulas": espulas,
+        "orders": orders_docs,
+        "maintenance": maintenance,
+        STATUS_TIMELINE: samples,
+    }
+
+
+async def seed_database(db, data: dict, chunk_size: int = 5000, log=print):
+    """Replace the plant collections of `db` with `data` using bulk inserts"""
+    for name in list(data) + [f"{n}_archive" for n in ("orders", "espulas", "ordens_producao")] + ["status_history", "jobs"]:
+        if name != STATUS_TIMELINE:
+            await db[name].delete_many({})
+    # Time-series collections cannot be emptied with delete_many on every server
+    # version: recreate it with the options of server.ensure_status_timeline_collection
+    await db[STATUS_TIMELINE].drop()
+    options = {"timeseries": {"timeField": "ts", "metaField": "meta", "granularity": "minutes"}}
+    retention_days = int(os.getenv("MACHINE_STATUS_RETENTION_DAYS", "730"))
+    if retention_days > 0:
+        options["expireAfterSeconds"] = retention_days * 24 * 60 * 60
+    await db.create_collection(STATUS_TIMELINE, **options)
+    await db[STATUS_TIMELINE].create_index([("meta.machine_code", 1), ("ts", 1)])
+
+    for name, docs in data.items():
+        started = time.perf_counter()
+        for i in range(0, len(docs), chunk_size):
+            await db[name].insert_many(docs[i:i + chunk_size], ordered=False)
+        log(f"{name}: {len(docs)} documents in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=300_000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--artigos", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", help="ISO date the plant is generated up to (default: today)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end else None
+
+    started = time.perf_counter()
+    data = generate_plant(orders=args.orders, years=args.years, artigos=args.artigos, seed=args.seed, end=end)
+    print(f"Generated in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{name}={len(docs)}" for name, docs in data.items()))
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        asyncio.run(seed_database(client[os.environ["DB_NAME"]], data, args.chunk_size))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
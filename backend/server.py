@@ -1,19 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, UploadFile, File
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
+import io
+import csv
+import itertools
+import unicodedata
+import asyncio
+import time
 import logging
+from collections import deque
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
-from zoneinfo import ZoneInfo
+from datetime import datetime, timedelta, timezone
+import re
+import json
 import jwt
 import hashlib
 from passlib.context import CryptContext
+import analytics
+import simulation
+from layouts import MACHINE_LAYOUTS
+from parsing import (
+    BRAZIL_TZ, DATE_FIELDS, NUMERIC_FIELDS, normalize_artigo, parse_delivery_date, parse_quantity,
+    shadowed_fields, with_shadow_fields,
+)
+from planner import MAX_ALLOCATIONS, parse_recommended_machines, plan_allocations
+from token_cache import TokenCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -33,9 +54,8 @@ api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 JWT_SECRET = os.getenv("JWT_SECRET", "fusosmanager_secret_key_2024")
-
-# Brazil timezone usando zoneinfo (padrão Python 3.9+)
-BRAZIL_TZ = ZoneInfo("America/Sao_Paulo")
+TOKEN_LIFETIME_SECONDS = 24 * 60 * 60
+token_cache = TokenCache(int(os.getenv("TOKEN_CACHE_SIZE", "4096")), TOKEN_LIFETIME_SECONDS)
 
 def get_utc_now():
     """Get current UTC time - MongoDB best practice"""
@@ -79,6 +99,66 @@ def serialize_docs(docs):
         return []
     return [serialize_doc(doc) for doc in docs]
 
+def start_of_brazil_day() -> datetime:
+    """Today's Brazil midnight in UTC: delivery dates before it are overdue"""
+    return get_brazil_time().replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+
+def render_json(data) -> bytes:
+    """Serialize models/documents to the same JSON bytes FastAPI would send"""
+    return JSONResponse(content=jsonable_encoder(data)).body
+
+# Single-flight for read endpoints: identical concurrent reads share one query
+READ_COALESCE_WINDOW = float(os.getenv("READ_COALESCE_WINDOW_MS", "500")) / 1000
+
+class SingleFlight:
+    """Share one in-flight load (and its result) between identical concurrent callers.
+
+    A finished result is reused for `window` seconds; `clear()` drops everything
+    so that a write is never followed by a stale read.
+    """
+
+    def __init__(self, window: float, max_entries: int = 1024):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (task, finished_at or None while in flight)
+
+    async def run(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None:
+            task, finished_at = entry
+            if finished_at is None or time.monotonic() - finished_at < self.window:
+                return await asyncio.shield(task)
+
+        if len(self._entries) >= self.max_entries:
+            self._prune()
+
+        task = asyncio.ensure_future(loader())
+        self._entries[key] = (task, None)
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        # Shield so a client disconnect does not cancel the read for the others
+        return await asyncio.shield(task)
+
+    def _on_done(self, key, task):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not task:
+            return
+        if task.cancelled() or task.exception() is not None:
+            # Never keep failures around, the next caller retries
+            del self._entries[key]
+        else:
+            self._entries[key] = (task, time.monotonic())
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, (task, finished_at) in list(self._entries.items()):
+            if finished_at is not None and now - finished_at >= self.window:
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+read_coalescer = SingleFlight(READ_COALESCE_WINDOW)
+
 # Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -97,6 +177,7 @@ class User(BaseModel):
         "banco_dados": True,
         "administracao": False
     })
+    permissions_version: int = 0  # bumped when an admin changes a token claim (username, email, role, permissions) or active, tokens carry the version they were issued with
     created_at: datetime = Field(default_factory=get_utc_now)
 
 class UserCreate(BaseModel):
@@ -130,6 +211,7 @@ class Machine(BaseModel):
     layout_type: str  # 16_fusos or 32_fusos
     active: bool = True  # True = ativa, False = desativada
     updated_at: datetime = Field(default_factory=get_utc_now)
+    version: int = 0  # incremented on every write, for conditional updates
 
 class Maintenance(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -168,7 +250,11 @@ class Order(BaseModel):
     ordem_producao_id: Optional[str] = None  # Link to ordem de producao
     numero_os: Optional[str] = None  # OS number
     origem: str = "manual"  # manual, espulagem, ordem
-    queue_position: int = 0  # Position in machine queue
+    queue_position: int = 0  # Sparse ordering key in machine queue (multiples of QUEUE_POSITION_GAP)
+    version: int = 0  # incremented on every write, for conditional updates
+
+class QueuedOrder(Order):
+    eta: Optional[dict] = None  # projected_start/projected_finish of pending and in-production orders
 
 class OrderCreate(BaseModel):
     machine_id: str
@@ -183,6 +269,10 @@ class OrderUpdate(BaseModel):
     observacao_liberacao: str = ""
     laudo_final: str = ""
 
+class OrderMove(BaseModel):
+    position: int = Field(..., ge=1)  # 1 = next pending order to be produced
+    machine_code: Optional[str] = None  # Target machine, defaults to the current one
+
 class OrdemProducao(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     numero_os: str  # Sequential number: 0001, 0002, etc.
@@ -330,26 +420,379 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(user_id: str, username: str, role: str) -> str:
+def create_access_token(user: dict) -> str:
+    """Signed token carrying everything authorization needs (role, per-tab permissions and their version)"""
+    issued_at = time.time()
     payload = {
-        "user_id": user_id,
-        "username": username,
-        "role": role,
-        "exp": get_brazil_time().timestamp() + (24 * 60 * 60)  # 24 hours
+        "user_id": user["id"],
+        "username": user["username"],
+        "email": user.get("email", ""),
+        "role": user["role"],
+        "permissions": user.get("permissions") or {},
+        "pv": user.get("permissions_version", 0),
+        "iat": issued_at,
+        "exp": issued_at + TOKEN_LIFETIME_SECONDS  # 24 hours
     }
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
+def verify_token(token: str) -> dict:
+    """Decoded claims of a valid token; verified tokens are cached by digest"""
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        if token_cache.is_revoked(payload):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        token_cache.put(token, payload)
+    return payload
+
+# Authorization works from the token claims. The only per-user state checked
+# on a request is the permissions version (and active flag), read with a tiny
+# projection at most once per USER_CACHE_SECONDS; user writes on this process
+# drop the entry right away. A token whose version is stale must log in again.
+USER_CACHE_SECONDS = float(os.getenv("USER_CACHE_SECONDS", "30"))
+user_versions = {}  # user_id -> (permissions_version or None when inactive/deleted, loaded_at)
+
+def cache_user_version(user: dict) -> Optional[int]:
+    version = user.get("permissions_version", 0) if user.get("active", True) else None
+    user_versions[user["id"]] = (version, time.monotonic())
+    return version
+
+async def current_permissions_version(user_id: str) -> Optional[int]:
+    cached = user_versions.get(user_id)
+    if cached is not None and time.monotonic() - cached[1] < USER_CACHE_SECONDS:
+        return cached[0]
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "id": 1, "active": 1, "permissions_version": 1})
+    if not user:
+        user_versions[user_id] = (None, time.monotonic())
+        return None
+    return cache_user_version(user)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = verify_token(credentials.credentials)
+    if "pv" not in payload:
+        # Issued before permissions were embedded in tokens
+        raise HTTPException(status_code=401, detail="Token outdated, please log in again")
+    version = await current_permissions_version(payload["user_id"])
+    if version is None:
+        raise HTTPException(status_code=401, detail="User inactive or not found")
+    if version != payload["pv"]:
+        raise HTTPException(status_code=401, detail="Permissions changed, please log in again")
+    return User(
+        id=payload["user_id"],
+        username=payload["username"],
+        email=payload.get("email", ""),
+        role=payload["role"],
+        permissions=payload["permissions"],
+        permissions_version=payload["pv"],
+    )
+
+async def coalesced_read(request: Request, current_user: User, loader):
+    """Serve a read endpoint through the single-flight layer.
+
+    Requests with the same route, query string and role share one Mongo read
+    and the serialized JSON bytes produced by `loader`.
+    """
+    key = (request.url.path, str(request.query_params), current_user.role)
+    body = await read_coalescer.run(key, loader)
+    return Response(content=body, media_type="application/json")
+
+# Machine status timeline
+# Every status transition is stored as a sample in a MongoDB time-series
+# collection (metaField = machine code + layout), so long-range timelines are
+# bucketed by the database instead of scanning regular documents.
+MACHINE_STATUS_TS = "machine_status_samples"
+MACHINE_STATUS_RETENTION_DAYS = int(os.getenv("MACHINE_STATUS_RETENTION_DAYS", "730"))
+
+async def ensure_status_timeline_collection():
+    if await db.list_collection_names(filter={"name": MACHINE_STATUS_TS}):
+        return
+    options = {"timeseries": {"timeField": "ts", "metaField": "meta", "granularity": "minutes"}}
+    if MACHINE_STATUS_RETENTION_DAYS > 0:
+        options["expireAfterSeconds"] = MACHINE_STATUS_RETENTION_DAYS * 24 * 60 * 60
+    try:
+        await db.create_collection(MACHINE_STATUS_TS, **options)
+    except OperationFailure as e:
+        # Created concurrently by another worker
+        if e.code != 48:
+            raise
+    await db[MACHINE_STATUS_TS].create_index([("meta.machine_code", 1), ("ts", 1)])
+
+def status_sample(machine: dict, status: str, previous_status: Optional[str] = None,
+                  changed_by: Optional[str] = None, **context) -> dict:
+    sample = {
+        "ts": get_utc_now(),
+        "meta": {"machine_code": machine["code"], "layout_type": machine["layout_type"]},
+        "status": status,
+        "previous_status": previous_status,
+        "changed_by": changed_by,
+    }
+    sample.update({key: value for key, value in context.items() if value is not None})
+    return sample
+
+async def set_machine_status(query: dict, status: str, changed_by: Optional[str] = None,
+                             extra: Optional[dict] = None, order_id: Optional[str] = None,
+                             maintenance_id: Optional[str] = None):
+    """Update a machine status and record the transition in the status timeline"""
+    update = {"status": status, "updated_at": get_utc_now()}
+    if extra:
+        update.update(extra)
+    before = await db.machines.find_one_and_update(
+        query,
+        {"$set": update, "$inc": {"version": 1}},
+        projection={"_id": 0, "code": 1, "layout_type": 1, "status": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before and before.get("status") != status:
+        await db[MACHINE_STATUS_TS].insert_one(status_sample(
+            before, status, before.get("status"), changed_by,
+            order_id=order_id, maintenance_id=maintenance_id
+        ))
+    return before
+
+# Machine queue ordering
+# queue_position is a sparse key: new orders go GAP after the last one and a
+# move takes the midpoint between its new neighbours, so a move only touches
+# the moved order. When neighbours run out of room the queue is renumbered.
+QUEUE_POSITION_GAP = 1024
+QUEUE_SORT = [("queue_position", 1), ("created_at", 1)]
+
+background_tasks = set()
+
+def run_in_background(coro):
+    """Fire-and-forget task that is kept referenced until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Background jobs
+# Only three kinds of work go through the queue: queue compaction,
+# shadow-field backfills and machine colour refreshes that conflicted after
+# their order write committed. They are stored in the `jobs` collection and
+# run by JOB_WORKERS asyncio workers, so they survive a restart and are
+# retried with exponential backoff. Everything a response depends on (ordem
+# cascades, machine colours) is written inline by the handlers.
+# A running job is leased: `run_at` is the lease expiry, after which another
+# worker may pick it up again, so handlers must be idempotent. Only the
+# holder of the latest lease (same `attempts`) records the outcome.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = 1.0
+JOB_RETENTION_DAYS = 7
+
+job_handlers = {}
+job_wakeup = asyncio.Event()
+
+def job_handler(name: str):
+    """Register `func(**payload)` as the handler of jobs called `name`"""
+    def register(func):
+        job_handlers[name] = func
+        return func
+    return register
+
+def new_job(name: str, payload: dict, delay: float = 0) -> dict:
+    now = get_utc_now()
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "payload": payload,
+        "status": "pending",  # pending, running, done, failed
+        "attempts": 0,
+        "run_at": now + timedelta(seconds=delay),
+        "created_at": now,
+        "updated_at": now,
+    }
+
+def job_dedupe_key(payload: dict) -> str:
+    return json.dumps(payload, sort_keys=True, default=str)
+
+async def enqueue_job(name: str, payload: Optional[dict] = None, delay: float = 0, dedupe: bool = False):
+    """Store a job; with `dedupe` nothing is added while an identical job is still pending.
+
+    A unique partial index on (name, dedupe_key) over pending jobs makes the
+    dedupe hold between concurrent enqueues too.
+    """
+    job = new_job(name, payload or {}, delay)
+    if dedupe:
+        job["dedupe_key"] = job_dedupe_key(job["payload"])
+        try:
+            await db.jobs.update_one(
+                {"name": name, "dedupe_key": job["dedupe_key"], "status": "pending"},
+                {"$setOnInsert": {key: value for key, value in job.items()
+                                  if key not in ("name", "dedupe_key", "status")}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # a concurrent enqueue inserted the same pending job
+    else:
+        await db.jobs.insert_one(job)
+    job_wakeup.set()
+
+async def claim_job():
+    now = get_utc_now()
+    return await db.jobs.find_one_and_update(
+        {"status": {"$in": ["pending", "running"]}, "run_at": {"$lte": now}},
+        {"$set": {"status": "running", "run_at": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def finish_job(job: dict, update: dict):
+    """Record the outcome of a run, unless the lease expired and another run took the job over"""
+    lease = {"id": job["id"], "status": "running", "attempts": job["attempts"]}
+    try:
+        await db.jobs.update_one(lease, {"$set": {**update, "updated_at": get_utc_now()}})
+    except DuplicateKeyError:
+        # Back to pending while an identical job was enqueued meanwhile: that one covers it
+        await db.jobs.update_one(lease, {"$set": {
+            "status": "done", "superseded": True, "finished_at": get_utc_now(), "updated_at": get_utc_now(),
+            "expire_at": get_utc_now() + timedelta(days=JOB_RETENTION_DAYS)
+        }})
+
+async def run_job(job: dict):
+    handler = job_handlers.get(job["name"])
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=["HS256"])
-        user = await db.users.find_one({"id": payload["user_id"]})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        if handler is None:
+            raise RuntimeError(f"No handler for job {job['name']}")
+        await handler(**job["payload"])
+    except Exception as e:
+        now = get_utc_now()
+        error = getattr(e, "detail", None) or str(e)
+        if job["attempts"] >= JOB_MAX_ATTEMPTS:
+            logger.error(f"Job {job['name']} {job['id']} failed after {job['attempts']} attempts: {error}")
+            update = {"status": "failed", "error": error, "finished_at": now,
+                      "expire_at": now + timedelta(days=JOB_RETENTION_DAYS)}
+        else:
+            delay = JOB_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1)
+            logger.warning(f"Job {job['name']} {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+            update = {"status": "pending", "error": error, "run_at": now + timedelta(seconds=delay)}
+        await finish_job(job, update)
+        return
+    finally:
+        # Job writes do not go through the invalidate_read_caches middleware
+        clear_read_caches()
+    now = get_utc_now()
+    await finish_job(job, {"status": "done", "finished_at": now, "expire_at": now + timedelta(days=JOB_RETENTION_DAYS)})
+
+async def job_worker():
+    while True:
+        try:
+            job = await claim_job()
+        except Exception as e:
+            logger.error(f"Error claiming job: {str(e)}")
+            job = None
+        if job is None:
+            job_wakeup.clear()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(job)
+
+async def next_queue_position(machine_code: str) -> int:
+    last = await db.orders.find(
+        {"machine_code": machine_code}, {"_id": 0, "queue_position": 1}
+    ).sort("queue_position", -1).limit(1).to_list(1)
+    return (last[0].get("queue_position", 0) + QUEUE_POSITION_GAP) if last else QUEUE_POSITION_GAP
+
+async def compact_machine_queue(machine_code: str):
+    """Renumber a machine queue to evenly spaced positions"""
+    orders = await db.orders.find(
+        {"machine_code": machine_code}, {"_id": 0, "id": 1, "queue_position": 1}
+    ).sort(QUEUE_SORT).to_list(None)
+
+    requests = [
+        UpdateOne({"id": order["id"]}, {"$set": {"queue_position": (i + 1) * QUEUE_POSITION_GAP}, "$inc": {"version": 1}})
+        for i, order in enumerate(orders)
+        if order.get("queue_position") != (i + 1) * QUEUE_POSITION_GAP
+    ]
+    if requests:
+        await db.orders.bulk_write(requests, ordered=False)
+    logger.info(f"Queue of {machine_code} compacted ({len(requests)} orders renumbered)")
+
+job_handler("compact_queue")(compact_machine_queue)
+
+async def schedule_queue_compaction(machine_code: str):
+    await enqueue_job("compact_queue", {"machine_code": machine_code}, dedupe=True)
+
+async def queue_position_for_move(machine_code: str, order_id: str, position: int):
+    """Ordering key that puts an order at `position` among the pending orders of a machine.
+
+    Returns (queue_position, needs_compaction); None when there is no room left
+    between the neighbours.
+    """
+    pending = {"machine_code": machine_code, "status": "pendente", "id": {"$ne": order_id}}
+    projection = {"_id": 0, "queue_position": 1}
+    skip = max(0, position - 2)
+    neighbours = await db.orders.find(pending, projection).sort(QUEUE_SORT).skip(skip).limit(2).to_list(2)
+
+    if position == 1:
+        if not neighbours:
+            return await next_queue_position(machine_code), False
+        return neighbours[0]["queue_position"] - QUEUE_POSITION_GAP, False
+
+    if len(neighbours) < 2:
+        # Past the end of the pending orders: append
+        return await next_queue_position(machine_code), False
+
+    before, after = neighbours[0]["queue_position"], neighbours[1]["queue_position"]
+    if after - before < 2:
+        return None, True
+    return (before + after) // 2, after - before < 4
+
+MACHINE_STATUS_RETRIES = 5
+
+async def refresh_machine_status(machine_code: str, changed_by: Optional[str] = None,
+                                 order_id: Optional[str] = None, maintenance_id: Optional[str] = None,
+                                 keep_statuses=("azul", "desativada")):
+    """Derive machine colour from its orders (maintenance/deactivated machines are left alone).
+
+    Every order transition ends here instead of setting a colour itself. The
+    machine version is read before the orders and the colour is only written
+    if the version did not move meanwhile; otherwise another transition ran
+    concurrently and the colour is derived again.
+    """
+    invalidate_machine_etas(machine_code)
+    for _ in range(MACHINE_STATUS_RETRIES):
+        machine = await db.machines.find_one({"code": machine_code}, {"_id": 0, "status": 1, "version": 1})
+        if machine is None or machine["status"] in keep_statuses:
+            return None
+        in_production = await db.orders.find_one({"machine_code": machine_code, "status": "em_producao"}, {"_id": 1})
+        pending = await db.orders.find_one({"machine_code": machine_code, "status": "pendente"}, {"_id": 1})
+        new_status = "vermelho" if in_production else "amarelo" if pending else "verde"
+        before = await set_machine_status(
+            {"code": machine_code, "version": machine.get("version", 0)}, new_status, changed_by,
+            order_id=order_id, maintenance_id=maintenance_id
+        )
+        if before is not None:
+            return new_status
+    raise HTTPException(status_code=409, detail="Machine was updated concurrently, please retry")
+
+job_handler("refresh_machine_status")(refresh_machine_status)
+
+async def refresh_machine_status_after_write(machine_code: str, changed_by: Optional[str] = None, **context):
+    """refresh_machine_status for a write that is already committed.
+
+    A conflict (409 after every retry) must not fail a request whose change
+    did persist: the refresh is handed to the job queue and retried there.
+    """
+    try:
+        await refresh_machine_status(machine_code, changed_by, **context)
+    except HTTPException as e:
+        if e.status_code != 409:
+            raise
+        logger.warning(f"Machine status of {machine_code} conflicted, refreshing in a job")
+        await enqueue_job("refresh_machine_status", {"machine_code": machine_code, "changed_by": changed_by, **context},
+                          dedupe=True)
 
 # Initialize data
 async def init_data():
@@ -359,8 +802,13 @@ async def init_data():
     await db.ordens_producao.delete_many({})
     await db.maintenance.delete_many({})
     await db.status_history.delete_many({})
+    await db[MACHINE_STATUS_TS].drop()
+    await ensure_status_timeline_collection()
     await db.machines.delete_many({})
     await db.banco_dados.delete_many({})  # Reset banco de dados de artigos
+    for collection_name in ARCHIVED_COLLECTIONS:
+        await db[f"{collection_name}_archive"].delete_many({})
+    await db.jobs.delete_many({})
     
     # Create default users if they don't exist
     admin_exists = await db.users.find_one({"username": "admin"})
@@ -416,117 +864,25 @@ async def init_data():
         externo_dict["password"] = hash_password("externo123")
         await db.users.insert_one(externo_dict)
 
-    # Initialize machines for 16 fusos layout - EXACT as per user image
-    layout_16_machines = [
-        # Top row blocks CD1-CD4, CD5-CD8 (2x2 each), CD17-CD20 (1x4)
-        {"code": "CD1", "position": "block1-1"},
-        {"code": "CD2", "position": "block1-2"},
-        {"code": "CD3", "position": "block1-3"},
-        {"code": "CD4", "position": "block1-4"},
-        {"code": "CD5", "position": "block2-1"},
-        {"code": "CD6", "position": "block2-2"},
-        {"code": "CD7", "position": "block2-3"},
-        {"code": "CD8", "position": "block2-4"},
-        {"code": "CD17", "position": "block3-1"},
-        {"code": "CD18", "position": "block3-2"},
-        {"code": "CD19", "position": "block3-3"},
-        {"code": "CD20", "position": "block3-4"},
-        # Middle blocks CD9-CD12, CD13-CD16 (2x2 each), CD21-CD24 (1x4)
-        {"code": "CD9", "position": "block4-1"},
-        {"code": "CD10", "position": "block4-2"},
-        {"code": "CD11", "position": "block4-3"},
-        {"code": "CD12", "position": "block4-4"},
-        {"code": "CD13", "position": "block5-1"},
-        {"code": "CD14", "position": "block5-2"},
-        {"code": "CD15", "position": "block5-3"},
-        {"code": "CD16", "position": "block5-4"},
-        {"code": "CD21", "position": "block6-1"},
-        {"code": "CD22", "position": "block6-2"},
-        {"code": "CD23", "position": "block6-3"},
-        {"code": "CD24", "position": "block6-4"},
-        # CI block (1x4) - labeled as "17 FUSOS" in image
-        {"code": "CI1", "position": "ci-1"},
-        {"code": "CI2", "position": "ci-2"},
-        {"code": "CI3", "position": "ci-3"},
-        {"code": "CI4", "position": "ci-4"},
-        # F blocks (bottom section) F1-F24
-        {"code": "F1", "position": "f-1"}, {"code": "F2", "position": "f-2"},
-        {"code": "F3", "position": "f-3"}, {"code": "F4", "position": "f-4"},
-        {"code": "F5", "position": "f-5"}, {"code": "F6", "position": "f-6"},
-        {"code": "F7", "position": "f-7"}, {"code": "F8", "position": "f-8"},
-        {"code": "F9", "position": "f-9"}, {"code": "F10", "position": "f-10"},
-        {"code": "F11", "position": "f-11"}, {"code": "F12", "position": "f-12"},
-        {"code": "F13", "position": "f-13"}, {"code": "F14", "position": "f-14"},
-        {"code": "F15", "position": "f-15"}, {"code": "F16", "position": "f-16"},
-        {"code": "F17", "position": "f-17"}, {"code": "F18", "position": "f-18"},
-        {"code": "F19", "position": "f-19"}, {"code": "F20", "position": "f-20"},
-        {"code": "F21", "position": "f-21"}, {"code": "F22", "position": "f-22"},
-        {"code": "F23", "position": "f-23"}, {"code": "F24", "position": "f-24"}
-    ]
-
-    # Create 16 fusos machines
-    for i, machine_data in enumerate(layout_16_machines):
-        machine = Machine(
-            code=machine_data["code"],
-            position=machine_data["position"],
-            layout_type="16_fusos"
-        )
-        machine_dict = machine.dict()
-        machine_dict["id"] = f"16_fusos_{machine_data['code']}_{str(uuid.uuid4())[:8]}"
-        await db.machines.insert_one(machine_dict)
-
-    # Initialize machines for 32 fusos layout - EXACT as per user image
-    layout_32_machines = [
-        # Top row CT1-CT24
-        {"code": "CT1", "position": "ct-1"}, {"code": "CT2", "position": "ct-2"},
-        {"code": "CT3", "position": "ct-3"}, {"code": "CT4", "position": "ct-4"},
-        {"code": "CT5", "position": "ct-5"}, {"code": "CT6", "position": "ct-6"},
-        {"code": "CT7", "position": "ct-7"}, {"code": "CT8", "position": "ct-8"},
-        {"code": "CT9", "position": "ct-9"}, {"code": "CT10", "position": "ct-10"},
-        {"code": "CT11", "position": "ct-11"}, {"code": "CT12", "position": "ct-12"},
-        {"code": "CT13", "position": "ct-13"}, {"code": "CT14", "position": "ct-14"},
-        {"code": "CT15", "position": "ct-15"}, {"code": "CT16", "position": "ct-16"},
-        {"code": "CT17", "position": "ct-17"}, {"code": "CT18", "position": "ct-18"},
-        {"code": "CT19", "position": "ct-19"}, {"code": "CT20", "position": "ct-20"},
-        {"code": "CT21", "position": "ct-21"}, {"code": "CT22", "position": "ct-22"},
-        {"code": "CT23", "position": "ct-23"}, {"code": "CT24", "position": "ct-24"},
-        # U groups (3 columns of 10 machines each)
-        {"code": "U1", "position": "u1-1"}, {"code": "U2", "position": "u1-2"},
-        {"code": "U3", "position": "u1-3"}, {"code": "U4", "position": "u1-4"},
-        {"code": "U5", "position": "u1-5"}, {"code": "U6", "position": "u1-6"},
-        {"code": "U7", "position": "u1-7"}, {"code": "U8", "position": "u1-8"},
-        {"code": "U9", "position": "u1-9"}, {"code": "U10", "position": "u1-10"},
-        {"code": "U11", "position": "u2-1"}, {"code": "U12", "position": "u2-2"},
-        {"code": "U13", "position": "u2-3"}, {"code": "U14", "position": "u2-4"},
-        {"code": "U15", "position": "u2-5"}, {"code": "U16", "position": "u2-6"},
-        {"code": "U17", "position": "u2-7"}, {"code": "U18", "position": "u2-8"},
-        {"code": "U19", "position": "u2-9"}, {"code": "U20", "position": "u2-10"},
-        {"code": "U21", "position": "u3-1"}, {"code": "U22", "position": "u3-2"},
-        {"code": "U23", "position": "u3-3"}, {"code": "U24", "position": "u3-4"},
-        {"code": "U25", "position": "u3-5"}, {"code": "U26", "position": "u3-6"},
-        {"code": "U27", "position": "u3-7"}, {"code": "U28", "position": "u3-8"},
-        {"code": "U29", "position": "u3-9"}, {"code": "U30", "position": "u3-10"},
-        # N row (N1-N10)
-        {"code": "N1", "position": "n-1"}, {"code": "N2", "position": "n-2"},
-        {"code": "N3", "position": "n-3"}, {"code": "N4", "position": "n-4"},
-        {"code": "N5", "position": "n-5"}, {"code": "N6", "position": "n-6"},
-        {"code": "N7", "position": "n-7"}, {"code": "N8", "position": "n-8"},
-        {"code": "N9", "position": "n-9"}, {"code": "N10", "position": "n-10"},
-        # Additional U machines from image (U31-U33)
-        {"code": "U31", "position": "u4-1"}, {"code": "U32", "position": "u4-2"},
-        {"code": "U33", "position": "u4-3"}
-    ]
-
-    # Create 32 fusos machines
-    for i, machine_data in enumerate(layout_32_machines):
-        machine = Machine(
-            code=machine_data["code"],
-            position=machine_data["position"],
-            layout_type="32_fusos"
-        )
-        machine_dict = machine.dict()
-        machine_dict["id"] = f"32_fusos_{machine_data['code']}_{str(uuid.uuid4())[:8]}"
-        await db.machines.insert_one(machine_dict)
+    # Create the machines of every layout
+    for layout_type, layout_machines in MACHINE_LAYOUTS.items():
+        for machine_data in layout_machines:
+            machine = Machine(
+                code=machine_data["code"],
+                position=machine_data["position"],
+                layout_type=layout_type
+            )
+            machine_dict = machine.dict()
+            machine_dict["id"] = f"{layout_type}_{machine_data['code']}_{str(uuid.uuid4())[:8]}"
+            await db.machines.insert_one(machine_dict)
+
+    # Initial state of every machine in the status timeline
+    machines = await db.machines.find({}, {"_id": 0, "code": 1, "layout_type": 1, "status": 1}).to_list(None)
+    await db[MACHINE_STATUS_TS].insert_many([
+        status_sample(machine, machine["status"], changed_by="system") for machine in machines
+    ])
+    # New machine ids mean a new layout version
+    layout_cache.clear()
 
 @api_router.post("/reset-database")
 async def reset_database(current_user: User = Depends(get_current_user)):
@@ -534,6 +890,7 @@ async def reset_database(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await init_data()
+    article_catalog.invalidate()
     return {"message": "Database reset successfully, keeping only users"}
 
 # Auth routes
@@ -546,13 +903,18 @@ async def login(login_data: UserLogin):
     if not user["active"]:
         raise HTTPException(status_code=401, detail="User inactive")
     
-    token = create_access_token(user["id"], user["username"], user["role"])
+    token = create_access_token(user)
+    cache_user_version(user)
     user_obj = User(**user)
     return LoginResponse(token=token, user=user_obj)
 
 @api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
-    return current_user
+    # The token only has the claims; the profile (created_at, ...) comes from the database
+    user = await db.users.find_one({"id": current_user.id})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return User(**user)
 
 # User management routes (admin only)
 @api_router.post("/users", response_model=User)
@@ -634,7 +996,18 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: User =
     if user_data.active is not None:
         update_data["active"] = user_data.active
     
-    await db.users.update_one({"id": user_id}, {"$set": update_data})
+    # Tokens carry username, email, role and permissions: those issued before
+    # a change of any of them or of the active flag stop being accepted (see
+    # get_current_user), so a renamed user never writes records under the old name
+    update = {"$set": update_data}
+    claims = (("username", None), ("email", ""), ("role", None), ("permissions", None), ("active", True))
+    if any(field in update_data and update_data[field] != existing_user.get(field, default)
+           for field, default in claims):
+        update["$inc"] = {"permissions_version": 1}
+    await db.users.update_one({"id": user_id}, update)
+    user_versions.pop(user_id, None)
+    if user_data.active is False:
+        token_cache.revoke_user(user_id)
     
     # Return updated user
     updated_user = await db.users.find_one({"id": user_id})
@@ -652,24 +1025,171 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    token_cache.revoke_user(user_id)
+    user_versions.pop(user_id, None)
     
     return {"message": "User deleted successfully"}
 
 # Machine routes
 @api_router.get("/machines", response_model=List[Machine])
-async def get_all_machines(current_user: User = Depends(get_current_user)):
+async def get_all_machines(request: Request, current_user: User = Depends(get_current_user)):
     """Get all machines (all layout types)"""
-    machines = await db.machines.find({}).to_list(1000)
-    return [Machine(**machine) for machine in machines]
+    async def load():
+        machines = await db.machines.find({}).to_list(1000)
+        return render_json([Machine(**machine) for machine in machines])
+    return await coalesced_read(request, current_user, load)
 
 @api_router.get("/machines/{layout_type}", response_model=List[Machine])
-async def get_machines(layout_type: str, current_user: User = Depends(get_current_user)):
-    machines = await db.machines.find({"layout_type": layout_type}).to_list(1000)
-    return [Machine(**machine) for machine in machines]
+async def get_machines(layout_type: str, request: Request, current_user: User = Depends(get_current_user)):
+    async def load():
+        machines = await db.machines.find({"layout_type": layout_type}).to_list(1000)
+        return render_json([Machine(**machine) for machine in machines])
+    return await coalesced_read(request, current_user, load)
+
+# Static layout: ids, codes and positions only change on reset-database, so they
+# are served once under a content-hash version and the dashboard polls status only.
+# A reset on another worker only clears that worker's cache, so each process
+# rebuilds its copy at most LAYOUT_CACHE_SECONDS after loading it.
+LAYOUT_FIELDS = {"_id": 0, "id": 1, "code": 1, "position": 1, "layout_type": 1}
+LAYOUT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+LAYOUT_CACHE_SECONDS = float(os.getenv("LAYOUT_CACHE_SECONDS", "30"))
+layout_cache = {}  # layout_type -> ((version, JSON bytes), monotonic time loaded)
+
+async def get_layout(layout_type: str):
+    cached = layout_cache.get(layout_type)
+    if cached is not None and time.monotonic() - cached[1] < LAYOUT_CACHE_SECONDS:
+        return cached[0]
+    machines = await db.machines.find({"layout_type": layout_type}, LAYOUT_FIELDS).sort("code", 1).to_list(1000)
+    if not machines:
+        raise HTTPException(status_code=404, detail="Layout not found")
+    version = hashlib.sha256(render_json(machines)).hexdigest()[:16]
+    layout = (version, render_json({"layout_type": layout_type, "version": version, "machines": machines}))
+    layout_cache[layout_type] = (layout, time.monotonic())
+    return layout
+
+@api_router.get("/layouts/{layout_type}")
+async def get_machine_layout(
+    layout_type: str,
+    request: Request,
+    v: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Static part of a layout (id, code, position); `v` is the version from the status poll"""
+    version, body = await get_layout(layout_type)
+    etag = f'"{version}"'
+    # Only a URL carrying the current version may be cached for good
+    headers = {"ETag": etag, "Cache-Control": LAYOUT_CACHE_CONTROL if v == version else "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.get("/machines/{layout_type}/status")
+async def get_machines_status(layout_type: str, request: Request, current_user: User = Depends(get_current_user)):
+    """Volatile machine state for the dashboard poll; merge with /layouts/{layout_type} by code"""
+    async def load():
+        version, _ = await get_layout(layout_type)
+        machines = await db.machines.find(
+            {"layout_type": layout_type}, {"_id": 0, "code": 1, "status": 1, "active": 1}
+        ).to_list(1000)
+        return render_json({"layout_version": version, "machines": machines})
+    return await coalesced_read(request, current_user, load)
+
+TIMELINE_RESOLUTION_UNITS = {"m": ("minute", timedelta(minutes=1)), "h": ("hour", timedelta(hours=1)), "d": ("day", timedelta(days=1))}
+TIMELINE_MAX_BUCKETS = 5000
+
+@api_router.get("/machines/{machine_code}/timeline")
+async def get_machine_timeline(
+    machine_code: str,
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    resolution: str = "1h",
+    current_user: User = Depends(get_current_user)
+):
+    """Status intervals of a machine, downsampled to `resolution` (e.g. 15m, 1h, 1d).
+
+    Buckets are aggregated in MongoDB; a bucket with transitions is reported
+    with the status the machine ended it in, consecutive equal buckets merged.
+    """
+    match = re.fullmatch(r"(\d+)([mhd])", resolution)
+    if not match or int(match.group(1)) < 1:
+        raise HTTPException(status_code=400, detail="Invalid resolution, use e.g. 15m, 1h or 1d")
+    bin_size = int(match.group(1))
+    unit, unit_delta = TIMELINE_RESOLUTION_UNITS[match.group(2)]
+    step = unit_delta * bin_size
+
+    end = parse_period_param(to, "to") or get_utc_now()
+    start = parse_period_param(from_, "from") or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) / step > TIMELINE_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail="Resolution too fine for this period")
+
+    samples = db[MACHINE_STATUS_TS]
+    before, buckets = await asyncio.gather(
+        samples.find(
+            {"meta.machine_code": machine_code, "ts": {"$lt": start}}, {"_id": 0, "status": 1}
+        ).sort("ts", -1).limit(1).to_list(1),
+        samples.aggregate([
+            {"$match": {"meta.machine_code": machine_code, "ts": {"$gte": start, "$lt": end}}},
+            {"$sort": {"ts": 1}},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$ts", "unit": unit, "binSize": bin_size, "timezone": "America/Sao_Paulo"}},
+                "status": {"$last": "$status"},
+                "statuses": {"$addToSet": "$status"},
+                "transitions": {"$sum": 1},
+            }},
+            {"$sort": {"_id": 1}},
+        ]).to_list(None),
+    )
+
+    intervals = []
+
+    def add_interval(interval_start, interval_end, status, transitions=0, statuses=None):
+        interval_start, interval_end = max(interval_start, start), min(interval_end, end)
+        if interval_start >= interval_end or status is None:
+            return
+        if intervals and intervals[-1]["status"] == status and intervals[-1]["end"] == interval_start:
+            intervals[-1]["end"] = interval_end
+            intervals[-1]["transitions"] += transitions
+            intervals[-1]["statuses"] = sorted(set(intervals[-1]["statuses"]) | set(statuses or [status]))
+            return
+        intervals.append({
+            "start": interval_start,
+            "end": interval_end,
+            "status": status,
+            "transitions": transitions,
+            "statuses": sorted(set(statuses or [status])),
+        })
+
+    current_status = before[0]["status"] if before else None
+    cursor = start
+    for bucket in buckets:
+        bucket_start = bucket["_id"]
+        if bucket_start.tzinfo is None:
+            bucket_start = bucket_start.replace(tzinfo=timezone.utc)
+        # Gap without samples: the machine kept its status
+        add_interval(cursor, bucket_start, current_status)
+        add_interval(bucket_start, bucket_start + step, bucket["status"], bucket["transitions"], bucket["statuses"])
+        current_status = bucket["status"]
+        cursor = bucket_start + step
+    add_interval(cursor, end, current_status)
+
+    return {
+        "machine_code": machine_code,
+        "from": start,
+        "to": end,
+        "resolution": resolution,
+        "intervals": intervals,
+    }
 
 # Maintenance routes
 @api_router.post("/maintenance", response_model=Maintenance)
 async def create_maintenance(maintenance_data: MaintenanceCreate, current_user: User = Depends(get_current_user)):
+    return await open_maintenance_action(maintenance_data, current_user)
+
+async def open_maintenance_action(maintenance_data: MaintenanceCreate, current_user: User,
+                                  at: Optional[datetime] = None) -> Maintenance:
+    """Put a machine in maintenance (azul); `at` is when the operator did it (batch replays)"""
     # Find machine by ID
     machine = await db.machines.find_one({"id": maintenance_data.machine_id})
     if not machine:
@@ -686,7 +1206,8 @@ async def create_maintenance(maintenance_data: MaintenanceCreate, current_user:
         machine_id=maintenance_data.machine_id,
         machine_code=machine["code"],
         motivo=maintenance_data.motivo,
-        created_by=current_user.username
+        created_by=current_user.username,
+        created_at=at or get_utc_now()
     )
     
     maintenance_dict = maintenance.dict()
@@ -695,20 +1216,24 @@ async def create_maintenance(maintenance_data: MaintenanceCreate, current_user:
     await db.maintenance.insert_one(maintenance_dict)
     
     # Update machine status to azul (maintenance)
-    await db.machines.update_one(
-        {"id": maintenance_data.machine_id},
-        {"$set": {"status": "azul", "updated_at": get_utc_now()}}
-    )
+    await set_machine_status({"id": maintenance_data.machine_id}, "azul", current_user.username, maintenance_id=maintenance.id)
+    invalidate_machine_etas(machine["code"])
     
     return maintenance
 
 @api_router.get("/maintenance", response_model=List[Maintenance])
-async def get_maintenance(current_user: User = Depends(get_current_user)):
-    maintenances = await db.maintenance.find().sort("created_at", -1).to_list(1000)
-    return [Maintenance(**m) for m in maintenances]
+async def get_maintenance(request: Request, current_user: User = Depends(get_current_user)):
+    async def load():
+        maintenances = await db.maintenance.find().sort("created_at", -1).to_list(1000)
+        return render_json([Maintenance(**m) for m in maintenances])
+    return await coalesced_read(request, current_user, load)
 
 @api_router.put("/maintenance/{maintenance_id}/finish")
 async def finish_maintenance(maintenance_id: str, current_user: User = Depends(get_current_user)):
+    await finish_maintenance_action(maintenance_id, current_user)
+    return {"message": "Maintenance finished successfully"}
+
+async def finish_maintenance_action(maintenance_id: str, current_user: User, at: Optional[datetime] = None):
     maintenance = await db.maintenance.find_one({"id": maintenance_id})
     if not maintenance:
         raise HTTPException(status_code=404, detail="Maintenance not found")
@@ -716,49 +1241,25 @@ async def finish_maintenance(maintenance_id: str, current_user: User = Depends(g
     if maintenance["status"] == "finalizada":
         raise HTTPException(status_code=400, detail="Maintenance already finished")
     
-    # Update maintenance status
-    await db.maintenance.update_one(
-        {"id": maintenance_id},
+    # Update maintenance status (only one of two concurrent finishes wins)
+    finished = await db.maintenance.find_one_and_update(
+        {"id": maintenance_id, "status": {"$ne": "finalizada"}},
         {
             "$set": {
                 "status": "finalizada",
-                "finished_at": get_utc_now(),
+                "finished_at": at or get_utc_now(),
                 "finished_by": current_user.username
             }
         }
     )
+    if finished is None:
+        raise HTTPException(status_code=400, detail="Maintenance already finished")
     
-    # Restore previous status or default to verde
-    previous_status = maintenance.get("previous_status", "verde")
-    
-    # Check if there are pending orders for this machine - if so, set to amarelo
-    pending_orders = await db.orders.find({
-        "machine_id": maintenance["machine_id"],
-        "status": "pendente"
-    }).to_list(1)
-    
-    # Check if there's an order in production for this machine
-    in_production = await db.orders.find_one({
-        "machine_id": maintenance["machine_id"],
-        "status": "em_producao"
-    })
-    
-    if in_production:
-        # If there was an order in production, return to vermelho
-        restore_status = "vermelho"
-    elif pending_orders:
-        # If there are pending orders, set to amarelo
-        restore_status = "amarelo"
-    else:
-        # Otherwise, return to verde
-        restore_status = "verde"
-    
-    await db.machines.update_one(
-        {"id": maintenance["machine_id"]},
-        {"$set": {"status": restore_status, "updated_at": get_utc_now()}}
+    # Back from azul to the colour of its orders: vermelho, amarelo or verde
+    await refresh_machine_status_after_write(
+        maintenance["machine_code"], current_user.username,
+        maintenance_id=maintenance_id, keep_statuses=("desativada",)
     )
-    
-    return {"message": "Maintenance finished successfully"}
 
 # Admin-only endpoint to activate/deactivate machines
 @api_router.put("/machines/{machine_id}/toggle-active")
@@ -775,16 +1276,13 @@ async def toggle_machine_active(machine_id: str, current_user: User = Depends(ge
     new_active_status = not machine.get("active", True)
     new_status = "desativada" if not new_active_status else "verde"
     
-    await db.machines.update_one(
+    await set_machine_status(
         {"id": machine_id},
-        {
-            "$set": {
-                "active": new_active_status,
-                "status": new_status,
-                "updated_at": get_utc_now()
-            }
-        }
+        new_status,
+        current_user.username,
+        extra={"active": new_active_status}
     )
+    invalidate_machine_etas(machine["code"])
     
     return {
         "message": f"Machine {'deactivated' if not new_active_status else 'activated'} successfully",
@@ -816,23 +1314,23 @@ async def create_order(order_data: OrderCreate, current_user: User = Depends(get
         cor=order_data.cor,
         quantidade=order_data.quantidade,
         observacao=order_data.observacao,
-        created_by=current_user.username
+        created_by=current_user.username,
+        queue_position=await next_queue_position(machine["code"])
     )
     
-    await db.orders.insert_one(order.dict())
+    await db.orders.insert_one(with_shadow_fields("orders", order.dict()))
     
-    # Update machine status to amarelo (pending)
-    await db.machines.update_one(
-        {"id": order_data.machine_id},
-        {"$set": {"status": "amarelo", "updated_at": get_utc_now()}}
-    )
+    # Machine turns amarelo (pending)
+    await refresh_machine_status_after_write(machine["code"], current_user.username, order_id=order.id)
     
     return order
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(current_user: User = Depends(get_current_user)):
-    orders = await db.orders.find().sort("created_at", -1).to_list(1000)
-    return [Order(**order) for order in orders]
+@api_router.get("/orders", response_model=List[QueuedOrder])
+async def get_orders(request: Request, current_user: User = Depends(get_current_user)):
+    async def load():
+        orders = await db.orders.find().sort("created_at", -1).to_list(1000)
+        return render_json(await orders_with_etas(orders))
+    return await coalesced_read(request, current_user, load)
 
 @api_router.put("/orders/{order_id}")
 async def update_order(
@@ -851,42 +1349,41 @@ async def update_order(
         "observacao_liberacao": order_update.observacao_liberacao,
         "laudo_final": order_update.laudo_final
     }
-    machine_status = "amarelo"
-    
     if order_update.status == "em_producao":
+        if order["status"] != "pendente":
+            raise HTTPException(status_code=400, detail="Order is not pending")
         update_data["status"] = "em_producao"
         update_data["started_at"] = get_utc_now()
-        machine_status = "vermelho"
     elif order_update.status == "finalizado":
+        if order["status"] != "em_producao":
+            raise HTTPException(status_code=400, detail="Order is not in production")
         update_data["status"] = "finalizado"
         update_data["finished_at"] = get_utc_now()
-        
-        # Check if there are other pending orders for this machine
-        pending_orders = await db.orders.find({
-            "machine_id": order["machine_id"],
-            "status": "pendente",
-            "id": {"$ne": order_id}
-        }).to_list(1)
-        
-        # If there are pending orders, keep machine yellow, otherwise green
-        machine_status = "amarelo" if pending_orders else "verde"
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    # Only if nobody started, finished or edited the order since it was read
+    try:
+        updated = await db.orders.find_one_and_update(
+            {"id": order_id, "status": order["status"], "version": order.get("version", 0)},
+            {"$set": update_data, "$inc": {"version": 1}}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Machine already has an order in production")
+    if updated is None:
+        raise HTTPException(status_code=409, detail="Order was changed concurrently, please retry")
     
     # Update machine status
-    await db.machines.update_one(
-        {"id": order["machine_id"]},
-        {"$set": {"status": machine_status, "updated_at": get_utc_now()}}
-    )
+    await refresh_machine_status_after_write(order["machine_code"], current_user.username, order_id=order_id)
     
     return {"message": "Order updated successfully"}
 
 # Machine-specific order routes
-@api_router.get("/machines/{machine_code}/orders", response_model=List[Order])
-async def get_machine_orders(machine_code: str, current_user: User = Depends(get_current_user)):
-    """Get all orders for a specific machine, sorted by most recent first"""
-    orders = await db.orders.find({"machine_code": machine_code}).sort("created_at", -1).to_list(1000)
-    return [Order(**order) for order in orders]
+@api_router.get("/machines/{machine_code}/orders", response_model=List[QueuedOrder])
+async def get_machine_orders(machine_code: str, request: Request, current_user: User = Depends(get_current_user)):
+    """Get all orders for a specific machine, last in queue (most recent) first"""
+    async def load():
+        orders = await db.orders.find({"machine_code": machine_code}).sort([("queue_position", -1), ("created_at", -1)]).to_list(1000)
+        return render_json(await orders_with_etas(orders, wait=True))
+    return await coalesced_read(request, current_user, load)
 
 @api_router.post("/machines/{machine_code}/orders", response_model=Order)
 async def create_machine_order(
@@ -904,8 +1401,7 @@ async def create_machine_order(
         raise HTTPException(status_code=404, detail="Machine not found")
     
     # Get next queue position for this machine
-    existing_orders = await db.orders.find({"machine_code": machine_code}).sort("queue_position", -1).limit(1).to_list(1)
-    next_position = (existing_orders[0]["queue_position"] + 1) if existing_orders else 1
+    next_position = await next_queue_position(machine_code)
     
     order = Order(
         machine_id=machine["id"],
@@ -921,13 +1417,10 @@ async def create_machine_order(
         queue_position=next_position
     )
     
-    await db.orders.insert_one(order.dict())
+    await db.orders.insert_one(with_shadow_fields("orders", order.dict()))
     
-    # Update machine status to amarelo (has pending order)
-    await db.machines.update_one(
-        {"id": machine["id"]},
-        {"$set": {"status": "amarelo", "updated_at": get_utc_now()}}
-    )
+    # Machine turns amarelo (has pending order) unless it is already producing
+    await refresh_machine_status_after_write(machine_code, current_user.username, order_id=order.id)
     
     return order
 
@@ -938,42 +1431,33 @@ async def start_machine_order(
     current_user: User = Depends(get_current_user)
 ):
     """Start production of a specific order in machine queue"""
+    await start_order_action(machine_code, order_id, current_user)
+    return {"message": "Order production started successfully"}
+
+async def start_order_action(machine_code: str, order_id: str, current_user: User, at: Optional[datetime] = None):
     if current_user.role not in ["admin", "operador_externo", "operador_interno"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Check if machine already has an order in production
-    existing_production = await db.orders.find_one({
-        "machine_code": machine_code,
-        "status": "em_producao"
-    })
-    
-    if existing_production:
+    # pendente -> em_producao in one conditional write; the partial unique index
+    # on orders rejects a second order in production on the same machine
+    try:
+        order = await db.orders.find_one_and_update(
+            {"id": order_id, "machine_code": machine_code, "status": "pendente"},
+            {"$set": {
+                "status": "em_producao",
+                "started_at": at or get_utc_now()
+            }, "$inc": {"version": 1}}
+        )
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Machine already has an order in production")
     
-    # Get the order
-    order = await db.orders.find_one({"id": order_id, "machine_code": machine_code})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if order["status"] != "pendente":
+    if order is None:
+        if not await db.orders.find_one({"id": order_id, "machine_code": machine_code}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Order not found")
         raise HTTPException(status_code=400, detail="Order is not pending")
     
-    # Update order to em_producao
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {
-            "status": "em_producao",
-            "started_at": get_utc_now()
-        }}
-    )
-    
-    # Update machine status to vermelho (in production)
-    await db.machines.update_one(
-        {"code": machine_code},
-        {"$set": {"status": "vermelho", "updated_at": get_utc_now()}}
-    )
-    
-    return {"message": "Order production started successfully"}
+    # Machine turns vermelho (in production)
+    await refresh_machine_status_after_write(machine_code, current_user.username, order_id=order_id)
 
 @api_router.put("/machines/{machine_code}/orders/{order_id}/finish")
 async def finish_machine_order(
@@ -982,56 +1466,90 @@ async def finish_machine_order(
     current_user: User = Depends(get_current_user)
 ):
     """Finish order production and update machine status"""
-    # Find the order
-    order = await db.orders.find_one({"id": order_id, "machine_code": machine_code})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if order["status"] != "em_producao":
-        raise HTTPException(status_code=400, detail="Order is not in production")
-    
-    # Update order status to finalizado
-    await db.orders.update_one(
-        {"id": order_id},
+    await finish_order_action(machine_code, order_id, current_user)
+    return {"message": "Order finished successfully"}
+
+async def finish_order_action(machine_code: str, order_id: str, current_user: User, at: Optional[datetime] = None):
+    # em_producao -> finalizado in one conditional write
+    order = await db.orders.find_one_and_update(
+        {"id": order_id, "machine_code": machine_code, "status": "em_producao"},
         {
             "$set": {
                 "status": "finalizado",
-                "finished_at": get_utc_now(),
+                "finished_at": at or get_utc_now(),
                 "finished_by": current_user.username,
                 "updated_at": get_utc_now()
-            }
+            },
+            "$inc": {"version": 1}
         }
     )
+    if order is None:
+        if not await db.orders.find_one({"id": order_id, "machine_code": machine_code}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Order not found")
+        raise HTTPException(status_code=400, detail="Order is not in production")
     
-    # Check for remaining pending orders for this machine
-    pending_orders = await db.orders.find({
-        "machine_code": machine_code,
-        "status": "pendente"
-    }).to_list(100)
-    
-    # Check for any order still in production
-    in_production = await db.orders.find_one({
-        "machine_code": machine_code,
-        "status": "em_producao"
-    })
-    
-    # Update machine status
-    if in_production:
-        # Still has orders in production
-        new_status = "vermelho"
-    elif pending_orders:
-        # Has pending orders
-        new_status = "amarelo"
-    else:
-        # No more orders
-        new_status = "verde"
-    
-    await db.machines.update_one(
-        {"code": machine_code},
-        {"$set": {"status": new_status, "updated_at": get_utc_now()}}
+    # Machine turns vermelho, amarelo or verde depending on what is left
+    await refresh_machine_status_after_write(machine_code, current_user.username, order_id=order_id)
+
+@api_router.put("/orders/{order_id}/move", response_model=Order)
+async def move_order(order_id: str, move: OrderMove, current_user: User = Depends(get_current_user)):
+    """Move a pending order to another position in its queue or to another machine's queue"""
+    if current_user.role not in ["admin", "operador_interno"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    order = await db.orders.find_one({"id": order_id})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    if order["status"] != "pendente":
+        raise HTTPException(status_code=400, detail="Only pending orders can be moved")
+
+    update_data = {}
+    target_code = move.machine_code or order["machine_code"]
+    if target_code != order["machine_code"]:
+        machine = await db.machines.find_one({"code": target_code})
+        if not machine:
+            raise HTTPException(status_code=404, detail="Machine not found")
+        if not machine.get("active", True):
+            raise HTTPException(status_code=400, detail="Machine not available")
+        if machine.get("status") == "azul":
+            # Like the planner: no new work for a machine in maintenance
+            raise HTTPException(status_code=400, detail="Machine is under maintenance")
+        update_data.update({
+            "machine_code": target_code,
+            "machine_id": machine["id"],
+            "layout_type": machine["layout_type"],
+        })
+
+    new_position, needs_compaction = await queue_position_for_move(target_code, order_id, move.position)
+    if new_position is None:
+        # Neighbours are adjacent: renumber now and place the order again
+        await compact_machine_queue(target_code)
+        new_position, needs_compaction = await queue_position_for_move(target_code, order_id, move.position)
+        if new_position is None:
+            # Concurrent inserts filled the gap again
+            raise HTTPException(status_code=409, detail="Queue was changed concurrently, please retry")
+    update_data["queue_position"] = new_position
+
+    # Only if nobody started or moved the order since it was read
+    moved = await db.orders.find_one_and_update(
+        {"id": order_id, "status": "pendente", "version": order.get("version", 0)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER
     )
-    
-    return {"message": "Order finished successfully"}
+    if moved is None:
+        raise HTTPException(status_code=409, detail="Order was changed concurrently, please retry")
+
+    if needs_compaction:
+        await schedule_queue_compaction(target_code)
+
+    if target_code != order["machine_code"]:
+        await refresh_machine_status_after_write(order["machine_code"], current_user.username)
+        await refresh_machine_status_after_write(target_code, current_user.username)
+    else:
+        invalidate_machine_etas(target_code)
+
+    return Order(**moved)
 
 @api_router.delete("/orders/{order_id}")
 async def delete_order(order_id: str, current_user: User = Depends(get_current_user)):
@@ -1044,21 +1562,8 @@ async def delete_order(order_id: str, current_user: User = Depends(get_current_u
         # Deletar ordem
         await db.orders.delete_one({"id": order_id})
         
-        # Atualizar status da máquina se não tiver mais pedidos
-        remaining_orders = await db.orders.find({"machine_code": order["machine_code"]}).to_list(100)
-        
-        if len(remaining_orders) == 0:
-            # Sem pedidos - voltar para verde
-            await db.machines.update_one(
-                {"code": order["machine_code"]},
-                {"$set": {"status": "verde", "updated_at": get_utc_now()}}
-            )
-        elif not any(o["status"] == "em_producao" for o in remaining_orders):
-            # Tem pedidos mas nenhum em produção - amarelo
-            await db.machines.update_one(
-                {"code": order["machine_code"]},
-                {"$set": {"status": "amarelo", "updated_at": get_utc_now()}}
-            )
+        # Atualizar status da máquina conforme os pedidos restantes
+        await refresh_machine_status_after_write(order["machine_code"], current_user.username, order_id=order_id)
         
         return {"message": "Order deleted successfully"}
     except HTTPException:
@@ -1071,13 +1576,17 @@ async def delete_order(order_id: str, current_user: User = Depends(get_current_u
 async def get_next_ordem_number(current_user: User = Depends(get_current_user)):
     """Get the next sequential OS number"""
     try:
-        # Find the highest numero_os
-        ordens = await db.ordens_producao.find().sort("numero_os", -1).limit(1).to_list(1)
+        # Find the highest numero_os (archived ordens keep their numbers reserved)
+        hot, archived = await asyncio.gather(
+            db.ordens_producao.find({}, {"_id": 0, "numero_os": 1}).sort("numero_os", -1).limit(1).to_list(1),
+            db.ordens_producao_archive.find({}, {"_id": 0, "numero_os": 1}).sort("numero_os", -1).limit(1).to_list(1),
+        )
+        ordens = hot + archived
         
         if not ordens:
             return {"numero_os": "0001"}
         
-        last_number = int(ordens[0]["numero_os"])
+        last_number = max(int(ordem["numero_os"]) for ordem in ordens)
         next_number = last_number + 1
         
         # Format with leading zeros (minimum 4 digits)
@@ -1108,25 +1617,46 @@ async def create_ordem_producao(ordem_data: OrdemProducaoCreate, current_user: U
             criado_por=current_user.username
         )
         
-        await db.ordens_producao.insert_one(ordem.dict())
+        await db.ordens_producao.insert_one(with_shadow_fields("ordens_producao", ordem.dict()))
         return ordem
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error creating ordem de producao: {str(e)}")
 
 @api_router.get("/ordens-producao", response_model=List[OrdemProducao])
-async def get_ordens_producao(current_user: User = Depends(get_current_user)):
-    ordens = await db.ordens_producao.find().sort("criado_em", -1).to_list(1000)
-    return [OrdemProducao(**ordem) for ordem in ordens]
+async def get_ordens_producao(request: Request, current_user: User = Depends(get_current_user)):
+    async def load():
+        ordens = await db.ordens_producao.find().sort("criado_em", -1).to_list(1000)
+        return render_json([OrdemProducao(**ordem) for ordem in ordens])
+    return await coalesced_read(request, current_user, load)
 
 @api_router.get("/ordens-producao/pendentes", response_model=List[OrdemProducao])
-async def get_ordens_producao_pendentes(current_user: User = Depends(get_current_user)):
+async def get_ordens_producao_pendentes(request: Request, current_user: User = Depends(get_current_user)):
     """Get only pending ordens de producao for Relatorios tab"""
-    ordens = await db.ordens_producao.find({"status": "pendente"}).sort("criado_em", -1).to_list(1000)
-    return [OrdemProducao(**ordem) for ordem in ordens]
+    async def load():
+        ordens = await db.ordens_producao.find({"status": "pendente"}).sort("criado_em", -1).to_list(1000)
+        return render_json([OrdemProducao(**ordem) for ordem in ordens])
+    return await coalesced_read(request, current_user, load)
+
+@api_router.get("/ordens-producao/due", response_model=List[OrdemProducao])
+async def get_ordens_producao_due(
+    request: Request,
+    within: int = Query(7, ge=0, le=365),
+    current_user: User = Depends(get_current_user)
+):
+    """Unfinished ordens due in the next `within` days (overdue ones included), earliest first"""
+    async def load():
+        ordens = await db.ordens_producao.find({
+            "status": {"$ne": "finalizado"},
+            "data_entrega_dt": {"$lt": start_of_brazil_day() + timedelta(days=within + 1)},
+        }).sort("data_entrega_dt", 1).to_list(1000)
+        return render_json([OrdemProducao(**ordem) for ordem in ordens])
+    return await coalesced_read(request, current_user, load)
 
 @api_router.get("/ordens-producao/{ordem_id}", response_model=OrdemProducao)
 async def get_ordem_producao(ordem_id: str, current_user: User = Depends(get_current_user)):
     ordem = await db.ordens_producao.find_one({"id": ordem_id})
+    if not ordem:
+        ordem = await db.ordens_producao_archive.find_one({"id": ordem_id})
     if not ordem:
         raise HTTPException(status_code=404, detail="Ordem de producao not found")
     return OrdemProducao(**ordem)
@@ -1192,12 +1722,70 @@ async def delete_ordem_producao(ordem_id: str, current_user: User = Depends(get_
 
 
 # Banco de Dados - Artigos Routes
+async def ensure_artigo_unique(artigo: str, exclude_id: Optional[str] = None):
+    query = {"artigo_normalizado": normalize_artigo(artigo)}
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    if await db.banco_dados.find_one(query, {"_id": 1}):
+        raise HTTPException(status_code=400, detail=f"Artigo '{artigo}' já existe")
+
+# Artigo enrichment for reports
+ARTIGO_INFO_FIELDS = ["engrenagem", "fios", "maquinas", "ciclos", "carga"]
+
+# Writes on this process invalidate the catalogue at once; writes on other
+# workers are picked up within ARTICLE_CATALOG_SECONDS.
+ARTICLE_CATALOG_SECONDS = float(os.getenv("ARTICLE_CATALOG_SECONDS", "60"))
+
+class ArticleCatalog:
+    """In-process map normalized artigo -> banco_dados fields, reloaded lazily after banco-dados writes"""
+
+    def __init__(self):
+        self._by_name = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._loader = SingleFlight(window=0)
+
+    async def get(self) -> dict:
+        if self._by_name is not None and time.monotonic() - self._loaded_at < ARTICLE_CATALOG_SECONDS:
+            return self._by_name
+        generation = self._generation
+        by_name = await self._loader.run("banco_dados", self._load)
+        # A write during the load makes the result stale: serve it but don't keep it
+        if generation == self._generation:
+            self._by_name = by_name
+            self._loaded_at = time.monotonic()
+        return by_name
+
+    async def _load(self) -> dict:
+        projection = {"_id": 0, "artigo": 1, "artigo_normalizado": 1, **{field: 1 for field in ARTIGO_INFO_FIELDS}}
+        artigos = await db.banco_dados.find({}, projection).to_list(None)
+        return {
+            artigo.get("artigo_normalizado") or normalize_artigo(artigo.get("artigo", "")):
+                {field: artigo.get(field, "") for field in ARTIGO_INFO_FIELDS}
+            for artigo in artigos
+        }
+
+    def invalidate(self):
+        self._generation += 1
+        self._by_name = None
+        self._loader.clear()
+
+article_catalog = ArticleCatalog()
+
+async def enrich_with_artigo(docs: list) -> list:
+    """Add `artigo_info` (engrenagem, fios, maquinas, ciclos, carga) from banco_dados to each document"""
+    catalog = await article_catalog.get()
+    for doc in docs:
+        doc["artigo_info"] = catalog.get(normalize_artigo(doc.get("artigo", "")))
+    return docs
+
 @api_router.post("/banco-dados", response_model=ArtigoBancoDados)
 async def create_artigo_banco_dados(
     artigo_data: ArtigoBancoDadosCreate,
     current_user: User = Depends(get_current_user)
 ):
     """Create new artigo in banco de dados"""
+    await ensure_artigo_unique(artigo_data.artigo)
     try:
         artigo = ArtigoBancoDados(
             artigo=artigo_data.artigo,
@@ -1208,16 +1796,21 @@ async def create_artigo_banco_dados(
             carga=artigo_data.carga
         )
         
-        await db.banco_dados.insert_one(artigo.dict())
+        artigo_dict = artigo.dict()
+        artigo_dict["artigo_normalizado"] = normalize_artigo(artigo.artigo)
+        await db.banco_dados.insert_one(with_shadow_fields("banco_dados", artigo_dict))
+        article_catalog.invalidate()
         return artigo
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error creating artigo: {str(e)}")
 
 @api_router.get("/banco-dados", response_model=List[ArtigoBancoDados])
-async def get_artigos_banco_dados(current_user: User = Depends(get_current_user)):
+async def get_artigos_banco_dados(request: Request, current_user: User = Depends(get_current_user)):
     """Get all artigos from banco de dados"""
-    artigos = await db.banco_dados.find().sort("created_at", -1).to_list(1000)
-    return [ArtigoBancoDados(**artigo) for artigo in artigos]
+    async def load():
+        artigos = await db.banco_dados.find().sort("created_at", -1).to_list(1000)
+        return render_json([ArtigoBancoDados(**artigo) for artigo in artigos])
+    return await coalesced_read(request, current_user, load)
 
 @api_router.get("/banco-dados/search")
 async def search_artigos_banco_dados(
@@ -1235,6 +1828,152 @@ async def search_artigos_banco_dados(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error searching artigos: {str(e)}")
 
+# Bulk import of artigos (CSV or XLSX)
+IMPORT_CHUNK_SIZE = 1000
+ARTIGO_IMPORT_FIELDS = ["artigo", "engrenagem", "fios", "maquinas", "ciclos", "carga"]
+ARTIGO_REQUIRED_FIELDS = ["artigo", "ciclos", "carga"]
+
+def _header_key(value) -> str:
+    """'Máquinas ' -> 'maquinas'"""
+    text = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return text.strip().lower()
+
+def _cell_to_str(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def _decode_csv(raw: bytes) -> str:
+    """UTF-8 (with or without BOM) first, then Windows-1252 as saved by Excel in pt-BR"""
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        pass
+    try:
+        return raw.decode("cp1252")
+    except UnicodeDecodeError as e:
+        row_number = raw.count(b"\n", 0, e.start) + 1
+        raise HTTPException(status_code=400, detail=f"Linha {row_number}: codificação não reconhecida, salve o arquivo em UTF-8")
+
+def read_import_rows(upload: UploadFile) -> list:
+    """(row_number, values) of every row of an uploaded CSV or XLSX file.
+
+    Blocking (openpyxl/csv), so it runs in a worker thread. The whole file is
+    parsed before anything is written: a broken file is rejected with a 400
+    and its row number instead of failing after earlier chunks were stored.
+    """
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise HTTPException(status_code=400, detail="Importação XLSX indisponível: openpyxl não está instalado")
+        try:
+            workbook = load_workbook(upload.file, read_only=True, data_only=True)
+        except Exception as e:
+            # BadZipFile, InvalidFileException, KeyError on a broken package...
+            raise HTTPException(status_code=400, detail=f"Arquivo XLSX inválido: {str(e) or type(e).__name__}")
+        rows = workbook.active.iter_rows(values_only=True)
+    elif filename.endswith(".csv") or upload.content_type in ("text/csv", "application/csv"):
+        text = io.StringIO(_decode_csv(upload.file.read()), newline="")
+        header_line = text.readline()
+        # Excel in pt-BR exports CSV with ";"
+        delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+        rows = itertools.chain(csv.reader([header_line], delimiter=delimiter), csv.reader(text, delimiter=delimiter))
+    else:
+        raise HTTPException(status_code=400, detail="Formato não suportado: envie um arquivo .csv ou .xlsx")
+
+    row_number, parsed = 0, []  # row_number: last row read
+    try:
+        header = [_header_key(cell) for cell in next(rows, None) or []]
+        row_number = 1
+        missing = [field for field in ARTIGO_REQUIRED_FIELDS if field not in header]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+
+        for row in rows:
+            row_number += 1
+            values = {}
+            for key, cell in zip(header, row):
+                if key in ARTIGO_IMPORT_FIELDS:
+                    values[key] = _cell_to_str(cell)
+            if any(values.values()):
+                parsed.append((row_number, values))
+    except HTTPException:
+        raise
+    except Exception as e:
+        # csv.Error, or a sheet openpyxl cannot read: the row after the last one read is broken
+        raise HTTPException(status_code=400, detail=f"Linha {row_number + 1}: arquivo ilegível ({str(e) or type(e).__name__})")
+    finally:
+        if filename.endswith(".xlsx"):
+            workbook.close()
+    return parsed
+
+async def _flush_artigo_import(operations: dict, report: dict):
+    if not operations:
+        return
+    result = await db.banco_dados.bulk_write(list(operations.values()), ordered=False)
+    report["inserted"] += result.upserted_count
+    report["updated"] += result.matched_count
+    operations.clear()
+
+@api_router.post("/banco-dados/import")
+async def import_artigos_banco_dados(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Bulk create/update artigos from a CSV or XLSX file, matched by normalized artigo name"""
+    report = {"total_rows": 0, "inserted": 0, "updated": 0, "duplicated_in_file": 0, "errors": []}
+    operations = {}  # artigo_normalizado -> UpdateOne, last row wins inside a chunk
+
+    for row_number, values in await asyncio.to_thread(read_import_rows, file):
+        report["total_rows"] += 1
+        try:
+            artigo_data = ArtigoBancoDadosCreate(**values)
+        except ValidationError as e:
+            report["errors"].append({
+                "row": row_number,
+                "artigo": values.get("artigo", ""),
+                "errors": [f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()]
+            })
+            continue
+
+        empty = [field for field in ARTIGO_REQUIRED_FIELDS if not getattr(artigo_data, field).strip()]
+        if empty:
+            report["errors"].append({
+                "row": row_number,
+                "artigo": artigo_data.artigo,
+                "errors": [f"{field}: campo obrigatório" for field in empty]
+            })
+            continue
+
+        normalized = normalize_artigo(artigo_data.artigo)
+        if normalized in operations:
+            report["duplicated_in_file"] += 1
+
+        now = get_utc_now()
+        operations[normalized] = UpdateOne(
+            {"artigo_normalizado": normalized},
+            {
+                "$set": {**with_shadow_fields("banco_dados", artigo_data.dict()),
+                         "artigo_normalizado": normalized, "updated_at": now},
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}
+            },
+            upsert=True
+        )
+        if len(operations) >= IMPORT_CHUNK_SIZE:
+            await _flush_artigo_import(operations, report)
+
+    await _flush_artigo_import(operations, report)
+    article_catalog.invalidate()
+    logger.info(
+        f"Artigos import by {current_user.username}: {report['total_rows']} rows, "
+        f"{report['inserted']} inserted, {report['updated']} updated, {len(report['errors'])} errors"
+    )
+    return report
+
 @api_router.put("/banco-dados/{artigo_id}", response_model=ArtigoBancoDados)
 async def update_artigo_banco_dados(
     artigo_id: str,
@@ -1248,7 +1987,9 @@ async def update_artigo_banco_dados(
     
     update_data = {}
     if artigo_update.artigo is not None:
+        await ensure_artigo_unique(artigo_update.artigo, exclude_id=artigo_id)
         update_data["artigo"] = artigo_update.artigo
+        update_data["artigo_normalizado"] = normalize_artigo(artigo_update.artigo)
     if artigo_update.engrenagem is not None:
         update_data["engrenagem"] = artigo_update.engrenagem
     if artigo_update.fios is not None:
@@ -1261,8 +2002,10 @@ async def update_artigo_banco_dados(
         update_data["carga"] = artigo_update.carga
     
     update_data["updated_at"] = get_utc_now()
+    with_shadow_fields("banco_dados", update_data)
     
     await db.banco_dados.update_one({"id": artigo_id}, {"$set": update_data})
+    article_catalog.invalidate()
     
     updated_artigo = await db.banco_dados.find_one({"id": artigo_id})
     return ArtigoBancoDados(**updated_artigo)
@@ -1276,6 +2019,7 @@ async def delete_artigo_banco_dados(
     result = await db.banco_dados.delete_one({"id": artigo_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Artigo not found")
+    article_catalog.invalidate()
     
     return {"message": "Artigo deleted successfully"}
 
@@ -1299,7 +2043,7 @@ async def create_espula(espula_data: EspulaCreate, current_user: User = Depends(
                 iniciado_em=get_utc_now(),
                 criado_por=current_user.username
             )
-            await db.ordens_producao.insert_one(ordem.dict())
+            await db.ordens_producao.insert_one(with_shadow_fields("ordens_producao", ordem.dict()))
         
         espula = Espula(
             # New fields
@@ -1321,7 +2065,7 @@ async def create_espula(espula_data: EspulaCreate, current_user: User = Depends(
             created_by=current_user.username
         )
         
-        await db.espulas.insert_one(espula.dict())
+        await db.espulas.insert_one(with_shadow_fields("espulas", espula.dict()))
         
         # If espula is linked to an existing ordem de producao, update the ordem status
         if espula_data.ordem_producao_id:
@@ -1339,10 +2083,23 @@ async def create_espula(espula_data: EspulaCreate, current_user: User = Depends(
         raise HTTPException(status_code=400, detail=f"Error creating espula: {str(e)}")
 
 @api_router.get("/espulas", response_model=List[Espula])
-async def get_espulas(current_user: User = Depends(get_current_user)):
+async def get_espulas(request: Request, current_user: User = Depends(get_current_user)):
     # Get ALL espulas (including finished), sorted by delivery date
-    espulas = await db.espulas.find().sort("data_prevista_entrega", 1).to_list(1000)
-    return [Espula(**espula) for espula in espulas]
+    async def load():
+        espulas = await db.espulas.find().sort("data_prevista_entrega_dt", 1).to_list(1000)
+        return render_json([Espula(**espula) for espula in espulas])
+    return await coalesced_read(request, current_user, load)
+
+@api_router.get("/espulas/overdue", response_model=List[Espula])
+async def get_overdue_espulas(request: Request, current_user: User = Depends(get_current_user)):
+    """Unfinished espulas whose delivery date has passed, most late first"""
+    async def load():
+        espulas = await db.espulas.find({
+            "status": {"$ne": "finalizado"},
+            "data_prevista_entrega_dt": {"$lt": start_of_brazil_day()},
+        }).sort("data_prevista_entrega_dt", 1).to_list(1000)
+        return render_json([Espula(**espula) for espula in espulas])
+    return await coalesced_read(request, current_user, load)
 
 @api_router.put("/espulas/{espula_id}")
 async def update_espula(
@@ -1354,28 +2111,45 @@ async def update_espula(
     if not espula:
         raise HTTPException(status_code=404, detail="Espula not found")
     
-    update_data = {"status": espula_update.status, "updated_at": get_utc_now()}
-    
-    if espula_update.status == "em_producao_aguardando" and not espula.get("iniciado_em"):
-        update_data["iniciado_em"] = get_utc_now()
-    elif espula_update.status == "finalizado":
-        update_data["finalizado_em"] = get_utc_now()
-        
-        # If espula is linked to an ordem de producao, update the ordem status to finalizado
-        if espula.get("ordem_producao_id"):
-            await db.ordens_producao.update_one(
-                {"id": espula["ordem_producao_id"]},
-                {"$set": {
-                    "status": "finalizado",
-                    "finalizado_em": get_utc_now(),
-                    "updated_at": get_utc_now()
-                }}
-            )
+    update_data, ordem_update = espula_status_update(espula, espula_update.status)
     
     await db.espulas.update_one({"id": espula_id}, {"$set": update_data})
     
+    # If espula is linked to an ordem de producao, update the ordem status to finalizado
+    if ordem_update:
+        await db.ordens_producao.update_one({"id": espula["ordem_producao_id"]}, {"$set": ordem_update})
+    
     return {"message": "Espula updated successfully"}
 
+@api_router.delete("/espulas/{espula_id}")
+async def delete_espula(espula_id: str, current_user: User = Depends(get_current_user)):
+    """Delete espula, hot or archived (its ordem de producao, if any, is left as it is)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    result = await db.espulas.delete_one({"id": espula_id})
+    if result.deleted_count == 0:
+        result = await db.espulas_archive.delete_one({"id": espula_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Espula not found")
+
+    return {"message": "Espula deleted successfully"}
+
+def espula_status_update(espula: dict, status: str, at: Optional[datetime] = None):
+    """($set for the espula, $set for its ordem de producao or None) of a status change"""
+    now = get_utc_now()
+    at = at or now
+    update_data = {"status": status, "updated_at": now}
+    ordem_update = None
+    
+    if status == "em_producao_aguardando" and not espula.get("iniciado_em"):
+        update_data["iniciado_em"] = at
+    elif status == "finalizado":
+        update_data["finalizado_em"] = at
+        if espula.get("ordem_producao_id"):
+            ordem_update = {"status": "finalizado", "finalizado_em": at, "updated_at": now}
+    return update_data, ordem_update
+
 
 class MachineAllocationsUpdate(BaseModel):
     machine_allocations: List[MachineAllocation]
@@ -1394,6 +2168,7 @@ async def update_espula_machine_allocations(
     
     # Convert machine allocations to dict format
     allocations_dict = [alloc.dict() for alloc in update_data.machine_allocations]
+    with_shadow_fields("espulas", {"machine_allocations": allocations_dict})
     
     await db.espulas.update_one(
         {"id": espula_id}, 
@@ -1429,8 +2204,7 @@ async def finalize_espula_with_machines(
     created_orders = []
     for allocation in machine_allocations:
         # Get next queue position for this machine
-        existing_orders = await db.orders.find({"machine_code": allocation["machine_code"]}).sort("queue_position", -1).limit(1).to_list(1)
-        next_position = (existing_orders[0]["queue_position"] + 1) if existing_orders else 1
+        next_position = await next_queue_position(allocation["machine_code"])
         
         order = Order(
             machine_id=allocation["machine_id"],
@@ -1449,16 +2223,11 @@ async def finalize_espula_with_machines(
             queue_position=next_position
         )
         
-        await db.orders.insert_one(order.dict())
+        await db.orders.insert_one(with_shadow_fields("orders", order.dict()))
         created_orders.append(order.id)
         
-        # Update machine status to amarelo ONLY if not already in production (vermelho)
-        machine = await db.machines.find_one({"id": allocation["machine_id"]})
-        if machine and machine.get("status") != "vermelho":
-            await db.machines.update_one(
-                {"id": allocation["machine_id"]},
-                {"$set": {"status": "amarelo", "updated_at": get_utc_now()}}
-            )
+        # Machine turns amarelo ONLY if not already in production (vermelho)
+        await refresh_machine_status_after_write(allocation["machine_code"], current_user.username, order_id=order.id)
     
     # Update espula status to finalizado
     await db.espulas.update_one(
@@ -1487,19 +2256,454 @@ async def finalize_espula_with_machines(
         "order_ids": created_orders
     }
 
+# Batch actions
+# A tablet that was offline replays its actions in one request. Actions on
+# the same machine run in the order sent, different machines run concurrently,
+# and espula status changes (independent of machines) go in one bulk write.
+BATCH_MAX_ACTIONS = 500
+MACHINE_ACTIONS = {"start_order", "finish_order", "open_maintenance", "finish_maintenance"}
+
+class BatchAction(BaseModel):
+    type: str  # start_order, finish_order, open_maintenance, finish_maintenance, espula_status
+    client_id: Optional[str] = None  # echoed back in the result
+    client_timestamp: Optional[datetime] = None  # when the operator acted
+    machine_code: Optional[str] = None  # start_order, finish_order, open_maintenance
+    machine_id: Optional[str] = None  # open_maintenance (instead of machine_code)
+    order_id: Optional[str] = None
+    maintenance_id: Optional[str] = None
+    motivo: Optional[str] = None
+    espula_id: Optional[str] = None
+    status: Optional[str] = None  # espula_status
+
+class BatchActions(BaseModel):
+    actions: List[BatchAction] = Field(..., max_length=BATCH_MAX_ACTIONS)
+
+def action_time(client_timestamp: Optional[datetime]) -> datetime:
+    """Client time of an action (naive = Brazil local time), never in the future"""
+    now = get_utc_now()
+    if client_timestamp is None:
+        return now
+    if client_timestamp.tzinfo is None:
+        client_timestamp = client_timestamp.replace(tzinfo=BRAZIL_TZ)
+    return min(client_timestamp.astimezone(timezone.utc), now)
+
+def require_fields(action: BatchAction, *fields):
+    missing = [field for field in fields if not getattr(action, field)]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing fields for {action.type}: {', '.join(missing)}")
+
+async def apply_machine_action(action: BatchAction, machine: dict, current_user: User):
+    at = action_time(action.client_timestamp)
+    if action.type == "start_order":
+        require_fields(action, "order_id")
+        await start_order_action(machine["code"], action.order_id, current_user, at)
+        return {"message": "Order production started successfully"}
+    if action.type == "finish_order":
+        require_fields(action, "order_id")
+        await finish_order_action(machine["code"], action.order_id, current_user, at)
+        return {"message": "Order finished successfully"}
+    if action.type == "open_maintenance":
+        require_fields(action, "motivo")
+        maintenance = await open_maintenance_action(
+            MaintenanceCreate(machine_id=machine["id"], motivo=action.motivo), current_user, at
+        )
+        return {"maintenance_id": maintenance.id}
+    await finish_maintenance_action(action.maintenance_id, current_user, at)
+    return {"message": "Maintenance finished successfully"}
+
+async def resolve_action_machines(actions: List[BatchAction]):
+    """Machine of each machine action, looked up with one query per collection"""
+    maintenance_ids = {a.maintenance_id for a in actions if a.type == "finish_maintenance" and a.maintenance_id}
+    maintenances = await db.maintenance.find(
+        {"id": {"$in": list(maintenance_ids)}}, {"_id": 0, "id": 1, "machine_code": 1}
+    ).to_list(None) if maintenance_ids else []
+    code_by_maintenance = {m["id"]: m["machine_code"] for m in maintenances}
+
+    machines = await db.machines.find({}, {"_id": 0, "id": 1, "code": 1}).to_list(None)
+    by_code = {m["code"]: m for m in machines}
+    by_id = {m["id"]: m for m in machines}
+
+    resolved = {}
+    for index, action in enumerate(actions):
+        if action.type not in MACHINE_ACTIONS:
+            continue
+        if action.type == "finish_maintenance":
+            if not action.maintenance_id:
+                resolved[index] = HTTPException(status_code=422, detail="Missing fields for finish_maintenance: maintenance_id")
+                continue
+            code = code_by_maintenance.get(action.maintenance_id)
+            machine = by_code.get(code) if code else None
+            if machine is None:
+                resolved[index] = HTTPException(status_code=404, detail="Maintenance not found")
+                continue
+        else:
+            machine = by_id.get(action.machine_id) if action.machine_id else by_code.get(action.machine_code)
+            if machine is None:
+                resolved[index] = HTTPException(status_code=404, detail="Machine not found")
+                continue
+        resolved[index] = machine
+    return resolved
+
+async def ordered_bulk_write(collection, operations: list, target: str) -> list:
+    """Outcome of each operation of an ordered bulk write: None if applied, else an HTTPException.
+
+    An ordered bulk write stops at the first failing operation: the ones
+    before it are applied, that one and the ones after it are not.
+    """
+    outcomes = [None] * len(operations)
+    if not operations:
+        return outcomes
+    try:
+        await collection.bulk_write(operations, ordered=True)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        # Without writeErrors (write concern failure) nothing is known to be applied
+        failed_at = write_errors[0]["index"] if write_errors else 0
+        detail = write_errors[0].get("errmsg", str(e)) if write_errors else str(e)
+        outcomes[failed_at] = HTTPException(status_code=500, detail=f"Error updating {target}: {detail}")
+        for position in range(failed_at + 1, len(operations)):
+            outcomes[position] = HTTPException(status_code=500, detail=f"Not applied: an earlier {target} update failed")
+    except Exception as e:
+        logger.error(f"Error updating {target} in batch: {str(e)}")
+        outcomes = [HTTPException(status_code=500, detail=f"Error updating {target}: {str(e)}")] * len(operations)
+    return outcomes
+
+async def apply_espula_actions(items: list, current_user: User) -> dict:
+    """Espula status changes of a batch as one bulk write per collection.
+
+    The result of each item comes from the outcome of its own writes; an
+    ordem cascade is only sent for espula updates that were applied.
+    """
+    ids = list({action.espula_id for _, action in items if action.espula_id})
+    espulas = {
+        espula["id"]: espula for espula in await db.espulas.find(
+            {"id": {"$in": ids}}, {"_id": 0, "id": 1, "iniciado_em": 1, "ordem_producao_id": 1}
+        ).to_list(None)
+    }
+    results, writes = {}, []  # writes: (index, espula update, ordem update or None)
+    for index, action in items:
+        try:
+            require_fields(action, "espula_id", "status")
+            espula = espulas.get(action.espula_id)
+            if espula is None:
+                raise HTTPException(status_code=404, detail="Espula not found")
+        except HTTPException as e:
+            results[index] = e
+            continue
+        update_data, ordem_update = espula_status_update(espula, action.status, action_time(action.client_timestamp))
+        espula.update(update_data)  # a later action on the same espula sees this one
+        writes.append((
+            index,
+            UpdateOne({"id": espula["id"]}, {"$set": update_data}),
+            UpdateOne({"id": espula["ordem_producao_id"]}, {"$set": ordem_update}) if ordem_update else None,
+        ))
+
+    espula_outcomes = await ordered_bulk_write(db.espulas, [op for _, op, _ in writes], "espula")
+    cascades = [
+        (index, ordem_op) for (index, _, ordem_op), outcome in zip(writes, espula_outcomes)
+        if outcome is None and ordem_op is not None
+    ]
+    ordem_outcomes = await ordered_bulk_write(db.ordens_producao, [op for _, op in cascades], "ordem de producao")
+    for (index, _, _), outcome in zip(writes, espula_outcomes):
+        results[index] = outcome or {"message": "Espula updated successfully"}
+    for (index, _), outcome in zip(cascades, ordem_outcomes):
+        if outcome is not None:
+            results[index] = HTTPException(status_code=500, detail=f"Espula updated, but: {outcome.detail}")
+    return results
+
+@api_router.post("/actions/batch")
+async def apply_batch_actions(batch: BatchActions, current_user: User = Depends(get_current_user)):
+    """Apply operator actions in order, one result per action (failures do not stop the batch)"""
+    actions = batch.actions
+    results = {}
+    machines = await resolve_action_machines(actions)
+
+    per_machine = {}
+    espula_items = []
+    for index, action in enumerate(actions):
+        if action.type == "espula_status":
+            espula_items.append((index, action))
+        elif action.type not in MACHINE_ACTIONS:
+            results[index] = HTTPException(status_code=422, detail=f"Unknown action type: {action.type}")
+        elif isinstance(machines[index], HTTPException):
+            results[index] = machines[index]
+        else:
+            per_machine.setdefault(machines[index]["code"], []).append(index)
+
+    def unexpected(action, e: Exception) -> HTTPException:
+        logger.error(f"Error applying batch action {action.type}: {str(e)}")
+        return HTTPException(status_code=500, detail=f"Error applying {action.type}: {str(e)}")
+
+    async def run_machine(indexes):
+        for index in indexes:
+            try:
+                results[index] = await apply_machine_action(actions[index], machines[index], current_user)
+            except HTTPException as e:
+                results[index] = e
+            except Exception as e:
+                # The actions already applied keep their results
+                results[index] = unexpected(actions[index], e)
+
+    async def run_espulas():
+        if not espula_items:
+            return
+        try:
+            results.update(await apply_espula_actions(espula_items, current_user))
+        except Exception as e:
+            # Only the espula lookup runs before the writes, whose failures are per item
+            for index, action in espula_items:
+                results[index] = unexpected(action, e)
+
+    await asyncio.gather(run_espulas(), *(run_machine(indexes) for indexes in per_machine.values()))
+
+    items = []
+    for index, action in enumerate(actions):
+        result = results[index]
+        item = {"index": index, "client_id": action.client_id, "type": action.type}
+        if isinstance(result, HTTPException):
+            item.update({"ok": False, "status_code": result.status_code, "detail": result.detail})
+        else:
+            item.update({"ok": True, "status_code": 200, "result": result})
+        items.append(item)
+    applied = sum(1 for item in items if item["ok"])
+    return {"applied": applied, "failed": len(items) - applied, "results": items}
+
+# Planning routes
+PLANNER_METROS_HORA = float(os.getenv("PLANNER_METROS_HORA", "100"))
+
+async def get_machine_backlog() -> dict:
+    """Meters still to produce per machine: pending orders plus what is left of the order in production"""
+    active = {"status": {"$in": ["pendente", "em_producao"]}}
+    in_production = {"$eq": ["$status", "em_producao"]}
+    groups, unparsed = await asyncio.gather(
+        db.orders.aggregate([
+            {"$match": {**active, "quantidade_num": {"$exists": True}}},
+            {"$group": {
+                "_id": "$machine_code",
+                "pending": {"$sum": {"$cond": [in_production, 0, "$quantidade_num"]}},
+                "in_production": {"$sum": {"$cond": [in_production, "$quantidade_num", 0]}},
+                "started_at": {"$max": {"$cond": [in_production, "$started_at", None]}},
+            }},
+        ]).to_list(None),
+        # Orders the numeric backfill has not reached yet
+        db.orders.find(
+            {**active, "quantidade_num": {"$exists": False}},
+            {"_id": 0, "machine_code": 1, "quantidade": 1, "status": 1, "started_at": 1}
+        ).to_list(None),
+    )
+    for order in unparsed:
+        metros = parse_quantity(order.get("quantidade")) or 0.0
+        production = order["status"] == "em_producao"
+        groups.append({
+            "_id": order["machine_code"],
+            "pending": 0.0 if production else metros,
+            "in_production": metros if production else 0.0,
+            "started_at": order.get("started_at") if production else None,
+        })
+
+    now = get_utc_now()
+    backlog = {}
+    for group in groups:
+        metros = group["pending"] or 0.0
+        remaining = group["in_production"] or 0.0
+        started_at = group.get("started_at")
+        if started_at:
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            elapsed_hours = (now - started_at).total_seconds() / 3600
+            remaining = max(0.0, remaining - elapsed_hours * PLANNER_METROS_HORA)
+        backlog[group["_id"]] = backlog.get(group["_id"], 0.0) + metros + remaining
+    return backlog
+
+@api_router.get("/planning/allocations")
+async def plan_machine_allocations(
+    ordem_id: Optional[str] = None,
+    espula_id: Optional[str] = None,
+    quantidade: Optional[str] = None,
+    layout_type: Optional[str] = None,
+    max_machines: int = MAX_ALLOCATIONS,
+    current_user: User = Depends(get_current_user)
+):
+    """Propose machine allocations for an ordem de producao or espula"""
+    if espula_id:
+        source = await db.espulas.find_one({"id": espula_id})
+        if not source:
+            raise HTTPException(status_code=404, detail="Espula not found")
+        source_quantidade = source.get("quantidade_metros")
+        data_entrega = source.get("data_prevista_entrega")
+    elif ordem_id:
+        source = await db.ordens_producao.find_one({"id": ordem_id})
+        if not source:
+            raise HTTPException(status_code=404, detail="Ordem de producao not found")
+        source_quantidade = source.get("metragem")
+        data_entrega = source.get("data_entrega")
+    else:
+        raise HTTPException(status_code=400, detail="ordem_id or espula_id is required")
+
+    metros = parse_quantity(quantidade if quantidade is not None else source_quantidade)
+    if not metros or metros <= 0:
+        raise HTTPException(status_code=400, detail="Quantidade inválida para planejamento")
+
+    max_machines = max(1, min(max_machines, MAX_ALLOCATIONS))
+
+    artigo_query = {"artigo": {"$regex": f"^{re.escape(source['artigo'])}$", "$options": "i"}}
+    artigo, machines, backlog = await asyncio.gather(
+        db.banco_dados.find_one(artigo_query),
+        db.machines.find({}, {"_id": 0, "id": 1, "code": 1, "layout_type": 1, "status": 1, "active": 1}).to_list(1000),
+        get_machine_backlog(),
+    )
+    maquinas = artigo.get("maquinas", "") if artigo else ""
+    recommended_codes, recommended_families = parse_recommended_machines(maquinas)
+
+    plan = plan_allocations(
+        metros,
+        machines,
+        backlog,
+        recommended_codes=recommended_codes,
+        recommended_families=recommended_families,
+        layout_type=layout_type,
+        delivery_date=parse_delivery_date(data_entrega),
+        meters_per_hour=PLANNER_METROS_HORA,
+        max_machines=max_machines,
+    )
+    plan.update({
+        "artigo": source["artigo"],
+        "quantidade_metros": metros,
+        "maquinas_recomendadas": maquinas,
+        "data_entrega": data_entrega,
+    })
+    return plan
+
+# Archival (hot/cold tiering)
+# Finished documents older than ARCHIVE_AFTER_DAYS are moved to <collection>_archive
+# so the collections the live dashboards poll only hold the working set.
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# collection -> field holding the moment the document was finished
+ARCHIVED_COLLECTIONS = {
+    "orders": "finished_at",
+    "espulas": "finalizado_em",
+    "ordens_producao": "finalizado_em",
+}
+
+def archive_cutoff() -> datetime:
+    """Everything finished before this moment may already be in the archive"""
+    return get_utc_now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+async def archive_finished(collection_name: str, cutoff: datetime) -> int:
+    """Move finished documents older than cutoff to the archive collection in batches"""
+    finished_field = ARCHIVED_COLLECTIONS[collection_name]
+    hot = db[collection_name]
+    cold = db[f"{collection_name}_archive"]
+    query = {"status": "finalizado", finished_field: {"$lt": cutoff}}
+
+    moved = 0
+    while True:
+        batch = await hot.find(query).sort(finished_field, 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+
+        archived_at = get_utc_now()
+        for doc in batch:
+            doc["archived_at"] = archived_at
+        try:
+            await cold.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Duplicates come from a batch copied by a run interrupted before the delete
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+        await hot.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        moved += len(batch)
+        if len(batch) < ARCHIVE_BATCH_SIZE:
+            break
+    return moved
+
+async def run_archival() -> dict:
+    cutoff = archive_cutoff()
+    moved = {}
+    for collection_name in ARCHIVED_COLLECTIONS:
+        moved[collection_name] = await archive_finished(collection_name, cutoff)
+    if any(moved.values()):
+        logger.info(f"Archival moved {moved} (finished before {cutoff.isoformat()})")
+    return moved
+
+async def archival_loop():
+    while True:
+        try:
+            await run_archival()
+        except Exception as e:
+            logger.error(f"Error archiving finished documents: {str(e)}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+async def find_with_archive(
+    collection_name: str,
+    query: dict,
+    date_field: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> list:
+    """Find in the hot collection, adding the archive only when the period reaches back into it.
+
+    `date_field` must never be later than the collection's finished field
+    (created_at, finished_at, ...), so a period starting after the archive
+    cutoff cannot match archived documents.
+    """
+    query = dict(query)
+    if start or end:
+        period = {}
+        if start:
+            period["$gte"] = start
+        if end:
+            period["$lt"] = end
+        query[date_field] = period
+
+    reads = [db[collection_name].find(query).to_list(None)]
+    if start is None or start < archive_cutoff():
+        reads.append(db[f"{collection_name}_archive"].find(query).to_list(None))
+    results = await asyncio.gather(*reads)
+    return [doc for docs in results for doc in docs]
+
+def parse_period_param(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = parse_delivery_date(value)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail=f"Invalid date for '{name}': {value}")
+    return parsed
+
+@api_router.post("/archive/run")
+async def run_archive_now(current_user: User = Depends(get_current_user)):
+    """Run the archival job immediately (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    moved = await run_archival()
+    return {"moved": moved, "archive_after_days": ARCHIVE_AFTER_DAYS}
+
 # Reports routes
 @api_router.get("/reports/export")
-async def export_report(layout_type: str, current_user: User = Depends(get_current_user)):
+async def export_report(
+    layout_type: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Orders and status history of a layout; start/end filter on order creation date"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    start_dt = parse_period_param(start, "start")
+    end_dt = parse_period_param(end, "end")
     try:
         # Get all data for the report
-        orders = await db.orders.find({"layout_type": layout_type}).to_list(1000)
+        orders = await find_with_archive("orders", {"layout_type": layout_type}, "created_at", start_dt, end_dt)
         history = await db.status_history.find({"layout_type": layout_type}).to_list(1000)
         
         # Serialize the data to make it JSON compatible
-        serialized_orders = serialize_docs(orders)
+        serialized_orders = serialize_docs(await enrich_with_artigo(orders))
         serialized_history = serialize_docs(history)
         
         return {
@@ -1513,13 +2717,20 @@ async def export_report(layout_type: str, current_user: User = Depends(get_curre
         raise HTTPException(status_code=500, detail=f"Error generating report: {str(e)}")
 
 @api_router.get("/espulas/report")
-async def get_espulas_report(current_user: User = Depends(get_current_user)):
+async def get_espulas_report(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Finished espulas; start/end filter on finalization date"""
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    start_dt = parse_period_param(start, "start")
+    end_dt = parse_period_param(end, "end")
     try:
-        espulas = await db.espulas.find({"status": "finalizado"}).to_list(1000)
-        serialized_espulas = serialize_docs(espulas)
+        espulas = await find_with_archive("espulas", {"status": "finalizado"}, "finalizado_em", start_dt, end_dt)
+        serialized_espulas = serialize_docs(await enrich_with_artigo(espulas))
         
         return {
             "espulas": serialized_espulas,
@@ -1529,9 +2740,840 @@ async def get_espulas_report(current_user: User = Depends(get_current_user)):
         logger.error(f"Error exporting espulas report: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating espulas report: {str(e)}")
 
+@api_router.get("/reports/complete")
+async def get_complete_report(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Orders, ordens de producao, espulas and maintenance enriched with banco_dados; start/end filter on creation date"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    start_dt = parse_period_param(start, "start")
+    end_dt = parse_period_param(end, "end")
+    maintenance_query = {}
+    if start_dt or end_dt:
+        maintenance_query["created_at"] = {
+            **({"$gte": start_dt} if start_dt else {}),
+            **({"$lt": end_dt} if end_dt else {}),
+        }
+    try:
+        orders, ordens, espulas, maintenances = await asyncio.gather(
+            find_with_archive("orders", {}, "created_at", start_dt, end_dt),
+            find_with_archive("ordens_producao", {}, "criado_em", start_dt, end_dt),
+            find_with_archive("espulas", {}, "created_at", start_dt, end_dt),
+            db.maintenance.find(maintenance_query).sort("created_at", -1).to_list(None),
+        )
+        orders.sort(key=lambda doc: doc["created_at"], reverse=True)
+        ordens.sort(key=lambda doc: doc["criado_em"], reverse=True)
+        # By parsed delivery date like /espulas and /reports/espulas, espulas without one last
+        espulas.sort(key=lambda doc: (doc.get("data_prevista_entrega_dt") is None,
+                                      doc.get("data_prevista_entrega_dt") or datetime.min))
+
+        return {
+            "orders": serialize_docs(await enrich_with_artigo(orders)),
+            "ordens_producao": serialize_docs(await enrich_with_artigo(ordens)),
+            "espulas": serialize_docs(await enrich_with_artigo(espulas)),
+            "maintenance": serialize_docs(maintenances),
+            "generated_at": get_brazil_time().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error exporting complete report: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating complete report: {str(e)}")
+
+@api_router.get("/reports/espulas")
+async def get_enriched_espulas_report(status: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Espulas (optionally by status) enriched with banco_dados, sorted by delivery date"""
+    query = {"status": status} if status else {}
+    espulas = await db.espulas.find(query).sort("data_prevista_entrega_dt", 1).to_list(None)
+    return {
+        "espulas": serialize_docs(await enrich_with_artigo(espulas)),
+        "generated_at": get_brazil_time().isoformat()
+    }
+
+# Search routes
+# One text index per collection and per archive (name SEARCH_INDEX_NAME);
+# every collection and its <collection>_archive are queried concurrently and
+# the hits are merged by text score, so archived work stays findable.
+SEARCH_INDEX_NAME = "search_text"
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_SOURCES = {
+    "order": {
+        "collection": "orders",
+        "fields": {"numero_os": 10, "cliente": 5, "artigo": 5, "cor": 3, "observacao": 1},
+        "projection": ["machine_code", "layout_type", "quantidade", "created_at"],
+    },
+    "espula": {
+        "collection": "espulas",
+        "fields": {"numero_os": 10, "cliente": 5, "artigo": 5, "cor": 3, "observacoes": 1},
+        "projection": ["quantidade_metros", "data_prevista_entrega", "created_at"],
+    },
+    "ordem_producao": {
+        "collection": "ordens_producao",
+        "fields": {"numero_os": 10, "cliente": 5, "artigo": 5, "cor": 3, "observacao": 1},
+        "projection": ["metragem", "data_entrega", "criado_em"],
+    },
+}
+SEARCH_COMMON_FIELDS = ["id", "numero_os", "cliente", "artigo", "cor", "status"]
+
+async def ensure_search_indexes():
+    for source in SEARCH_SOURCES.values():
+        for collection_name in (source["collection"], f"{source['collection']}_archive"):
+            await db[collection_name].create_index(
+                [(field, "text") for field in source["fields"]],
+                weights=source["fields"],
+                name=SEARCH_INDEX_NAME,
+                default_language="portuguese",
+            )
+
+async def search_collection(collection_name: str, query: dict, projection: dict, limit: int):
+    collection = db[collection_name]
+    return await asyncio.gather(
+        collection.find(query, projection).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit),
+        collection.count_documents(query),
+    )
+
+async def search_source(result_type: str, q: str, limit: int):
+    """Best `limit` hits of the hot collection and its archive together, and their total"""
+    source = SEARCH_SOURCES[result_type]
+    query = {"$text": {"$search": q}}
+    projection = {"_id": 0, "score": {"$meta": "textScore"}}
+    projection.update({field: 1 for field in SEARCH_COMMON_FIELDS + source["projection"]})
+    (hot, hot_total), (cold, cold_total) = await asyncio.gather(
+        search_collection(source["collection"], query, projection, limit),
+        search_collection(f"{source['collection']}_archive", query, projection, limit),
+    )
+    hits = sorted(hot + cold, key=lambda hit: hit["score"], reverse=True)[:limit]
+    for hit in hits:
+        hit["type"] = result_type
+    return hits, hot_total + cold_total
+
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    """Orders, espulas and ordens de producao matching `q` (cliente, artigo, cor, OS, observação), best first.
+
+    `types` is a comma-separated subset of order, espula, ordem_producao.
+    """
+    result_types = [t.strip() for t in types.split(",") if t.strip()] if types else list(SEARCH_SOURCES)
+    unknown = [t for t in result_types if t not in SEARCH_SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+
+    # Any page of the merged list is within the first page*page_size hits of each collection
+    limit = page * page_size
+    per_source = await asyncio.gather(*(search_source(t, q, limit) for t in result_types))
+
+    hits = [hit for source_hits, _ in per_source for hit in source_hits]
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    start = (page - 1) * page_size
+    return {
+        "query": q,
+        "page": page,
+        "page_size": page_size,
+        "total": sum(total for _, total in per_source),
+        "totals": {t: total for t, (_, total) in zip(result_types, per_source)},
+        "results": serialize_docs(hits[start:start + page_size]),
+    }
+
+# KPI routes
+# Headline counts are grouped by MongoDB; the result is shared for a few seconds
+# and dropped by the write-invalidation middleware like the coalesced reads.
+KPI_CACHE_SECONDS = float(os.getenv("KPI_CACHE_SECONDS", "5"))
+kpi_cache = SingleFlight(KPI_CACHE_SECONDS, max_entries=8)
+
+def _status_counts(groups: list) -> dict:
+    return {group["_id"]: group["count"] for group in groups if group["_id"] is not None}
+
+def _layout_status_counts(groups: list) -> dict:
+    counts = {}
+    for group in groups:
+        layout, status = group["_id"].get("layout_type"), group["_id"].get("status")
+        if layout is None or status is None:
+            continue
+        counts.setdefault(layout, {})[status] = group["count"]
+    return counts
+
+def _first_count(groups: list) -> int:
+    return groups[0]["count"] if groups else 0
+
+async def compute_kpis() -> dict:
+    now = get_brazil_time()
+    start_of_day = start_of_brazil_day()
+    by_status = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    by_layout_status = [{"$group": {
+        "_id": {"layout_type": "$layout_type", "status": "$status"},
+        "count": {"$sum": 1},
+    }}]
+
+    def overdue(date_field: str) -> list:
+        return [
+            {"$match": {"status": {"$ne": "finalizado"}, f"{date_field}_dt": {"$lt": start_of_day}}},
+            {"$count": "count"},
+        ]
+
+    machines, orders, espulas, ordens = await asyncio.gather(
+        db.machines.aggregate([{"$facet": {
+            "by_status": by_status,
+            "by_layout": by_layout_status,
+        }}]).to_list(1),
+        db.orders.aggregate([{"$facet": {
+            "by_status": by_status,
+            "by_layout": by_layout_status,
+            "finished_today": [
+                {"$match": {"status": "finalizado", "finished_at": {"$gte": start_of_day}}},
+                {"$count": "count"},
+            ],
+            "metros_by_status": [{"$group": {"_id": "$status", "metros": {"$sum": "$quantidade_num"}}}],
+        }}]).to_list(1),
+        db.espulas.aggregate([{"$facet": {
+            "by_status": by_status,
+            "overdue": overdue("data_prevista_entrega"),
+        }}]).to_list(1),
+        db.ordens_producao.aggregate([{"$facet": {
+            "by_status": by_status,
+            "overdue": overdue("data_entrega"),
+        }}]).to_list(1),
+    )
+    machines, orders, espulas, ordens = machines[0], orders[0], espulas[0], ordens[0]
+
+    machine_status = _status_counts(machines["by_status"])
+    return {
+        "machines": {
+            "total": sum(machine_status.values()),
+            "by_status": machine_status,
+            "by_layout": _layout_status_counts(machines["by_layout"]),
+        },
+        "orders": {
+            "by_status": _status_counts(orders["by_status"]),
+            "by_layout": _layout_status_counts(orders["by_layout"]),
+            "finished_today": _first_count(orders["finished_today"]),
+            "metros_by_status": {
+                group["_id"]: group["metros"] for group in orders["metros_by_status"] if group["_id"] is not None
+            },
+        },
+        "espulas": {
+            "by_status": _status_counts(espulas["by_status"]),
+            "overdue": _first_count(espulas["overdue"]),
+        },
+        "ordens_producao": {
+            "by_status": _status_counts(ordens["by_status"]),
+            "overdue": _first_count(ordens["overdue"]),
+        },
+        "generated_at": now.isoformat(),
+    }
+
+@api_router.get("/kpis")
+async def get_kpis(current_user: User = Depends(get_current_user)):
+    """Plant-wide counts (machines per colour, orders per layout/status, overdue espulas and ordens)"""
+    async def load():
+        return render_json(await compute_kpis())
+    body = await kpi_cache.run("kpis", load)
+    return Response(content=body, media_type="application/json")
+
+# Production analytics routes
+# Finished orders/espulas of a period are pulled as projected columns and
+# aggregated with pandas (see analytics.py). Periods that ended before now
+# are kept for ANALYTICS_CACHE_SECONDS (edits to old documents show up when
+# the entry expires); periods reaching now are cached briefly and dropped on
+# writes like the KPIs.
+ANALYTICS_CACHE_SECONDS = float(os.getenv("ANALYTICS_CACHE_SECONDS", "3600"))
+ANALYTICS_OPEN_CACHE_SECONDS = float(os.getenv("ANALYTICS_OPEN_CACHE_SECONDS", "60"))
+analytics_cache = SingleFlight(ANALYTICS_CACHE_SECONDS, max_entries=64)
+analytics_open_cache = SingleFlight(ANALYTICS_OPEN_CACHE_SECONDS, max_entries=64)
+
+async def production_columns(source: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Projected columns of the documents of `source` finished in [start, end), archive included"""
+    finished_field = analytics.SOURCES[source]["finished"]
+    query = {"status": "finalizado", finished_field: {"$ne": None}}
+    if start:
+        query[finished_field]["$gte"] = start
+    if end:
+        query[finished_field]["$lt"] = end
+    projection = analytics.projection(source)
+    collections = [source]
+    if start is None or start < archive_cutoff():
+        collections.append(f"{source}_archive")
+    cursors = [
+        db[name].find(query, projection).batch_size(analytics.BATCH_SIZE)
+        for name in collections
+    ]
+    fields = sorted({field.split(".")[0] for field in projection if field != "_id"})
+    return await analytics.collect_columns(cursors, fields)
+
+def production_report(columns: dict, group_by: list) -> dict:
+    return {
+        source: analytics.production_stats(analytics.production_frame(source, source_columns), group_by)
+        for source, source_columns in columns.items()
+    }
+
+@api_router.get("/analytics/production")
+async def get_production_analytics(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    group_by: str = "cliente",
+    current_user: User = Depends(get_current_user)
+):
+    """Metros, finished count and average wait/production hours per cliente/artigo/cor/layout_type.
+
+    start/end filter on the finish date; group_by is a comma-separated list of fields.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    start_dt = parse_period_param(start, "start")
+    end_dt = parse_period_param(end, "end")
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in analytics.GROUP_FIELDS]
+    if not fields or invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be a comma-separated list of: {', '.join(analytics.GROUP_FIELDS)}",
+        )
+
+    async def load():
+        orders, espulas = await asyncio.gather(
+            production_columns("orders", start_dt, end_dt),
+            production_columns("espulas", start_dt, end_dt),
+        )
+        # pandas work runs off the event loop
+        report = await asyncio.to_thread(production_report, {"orders": orders, "espulas": espulas}, fields)
+        return render_json({
+            "start": start_dt,
+            "end": end_dt,
+            "group_by": fields,
+            **report,
+            "generated_at": get_brazil_time().isoformat(),
+        })
+
+    closed = end_dt is not None and end_dt <= get_utc_now()
+    cache = analytics_cache if closed else analytics_open_cache
+    body = await cache.run((start_dt, end_dt, tuple(fields)), load)
+    return Response(content=body, media_type="application/json")
+
+# Completion forecast routes
+# Every machine queue is simulated on demand (see simulation.py) with
+# durations learned from the orders finished in the last
+# SIMULATION_HISTORY_DAYS. Only the fitted model is cached: it moves slowly,
+# while the queues change with every write.
+SIMULATION_HISTORY_DAYS = int(os.getenv("SIMULATION_HISTORY_DAYS", "180"))
+SIMULATION_MODEL_CACHE_SECONDS = float(os.getenv("SIMULATION_MODEL_CACHE_SECONDS", "900"))
+SIMULATION_MIN_SAMPLES = int(os.getenv("SIMULATION_MIN_SAMPLES", "3"))
+SIMULATION_CHANGEOVER_HOURS = float(os.getenv("SIMULATION_CHANGEOVER_HOURS", "0"))
+# Longer runs are orders somebody forgot to finish, not production time
+SIMULATION_MAX_ORDER_HOURS = float(os.getenv("SIMULATION_MAX_ORDER_HOURS", "720"))
+SIMULATION_DEFAULT_MAINTENANCE_HOURS = float(os.getenv("SIMULATION_DEFAULT_MAINTENANCE_HOURS", "8"))
+simulation_model_cache = SingleFlight(SIMULATION_MODEL_CACHE_SECONDS, max_entries=4)
+
+def duration_pipeline(since: datetime, start_field: str, finished_field: str, match: dict, group: dict) -> list:
+    hours = {"$divide": [{"$subtract": [f"${finished_field}", f"${start_field}"]}, 3600 * 1000]}
+    return [
+        {"$match": {**match, start_field: {"$ne": None}, finished_field: {"$gte": since}}},
+        {"$project": {**{field: 1 for field in group}, "quantidade_num": 1, "hours": hours}},
+        {"$match": {"hours": {"$gt": 0, "$lte": SIMULATION_MAX_ORDER_HOURS}}},
+        {"$group": {
+            "_id": {field: f"${field}" for field in group},
+            "metros": {"$sum": {"$ifNull": ["$quantidade_num", 0]}},
+            "hours": {"$sum": "$hours"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+def history_collections(collection_name: str, since: datetime) -> list:
+    names = [collection_name]
+    if since < archive_cutoff():
+        names.append(f"{collection_name}_archive")
+    return names
+
+async def load_duration_model() -> dict:
+    """Throughput per artigo/layout/machine and the mean maintenance time, from recent history"""
+    since = get_utc_now() - timedelta(days=SIMULATION_HISTORY_DAYS)
+    order_pipeline = duration_pipeline(
+        since, "started_at", "finished_at",
+        {"status": "finalizado", "quantidade_num": {"$gt": 0}},
+        ("artigo", "layout_type", "machine_code"),
+    )
+    maintenance_pipeline = duration_pipeline(since, "created_at", "finished_at", {"status": "finalizada"}, ())
+    results = await asyncio.gather(
+        *(db[name].aggregate(order_pipeline).to_list(None)
+          for name in history_collections("orders", since)),
+        db.maintenance.aggregate(maintenance_pipeline).to_list(None),
+    )
+    rows = [{**row["_id"], "metros": row["metros"], "hours": row["hours"], "count": row["count"]}
+            for group in results[:-1] for row in group]
+    maintenance = results[-1]
+    maintenance_hours = (
+        maintenance[0]["hours"] / maintenance[0]["count"]
+        if maintenance and maintenance[0]["count"] else SIMULATION_DEFAULT_MAINTENANCE_HOURS
+    )
+    model = simulation.DurationModel(rows, default_rate=PLANNER_METROS_HORA, min_samples=SIMULATION_MIN_SAMPLES)
+    return {"model": model, "maintenance_hours": maintenance_hours}
+
+async def simulate_queues(machine_code: Optional[str] = None) -> dict:
+    """Projected start/finish of every pending and in-production order (of one machine), keyed by order id"""
+    machine_query = {"code": machine_code} if machine_code else {}
+    order_query = {"machine_code": machine_code} if machine_code else {}
+    fitted, machines, orders, maintenances = await asyncio.gather(
+        simulation_model_cache.run("model", load_duration_model),
+        db.machines.find(machine_query, {"_id": 0, "code": 1, "status": 1, "active": 1}).to_list(None),
+        db.orders.find(
+            {**order_query, "status": {"$in": ["pendente", "em_producao"]}},
+            {"_id": 0, "id": 1, "machine_code": 1, "layout_type": 1, "artigo": 1, "status": 1, "numero_os": 1,
+             "queue_position": 1, "created_at": 1, "started_at": 1, "quantidade": 1, "quantidade_num": 1},
+        ).to_list(None),
+        db.maintenance.find(
+            {**order_query, "status": "em_manutencao"}, {"_id": 0, "machine_code": 1, "created_at": 1}
+        ).to_list(None),
+    )
+    for order in orders:
+        if "quantidade_num" not in order:  # not reached by the shadow-field backfill yet
+            order["quantidade_num"] = parse_quantity(order.get("quantidade"))
+    expected = timedelta(hours=fitted["maintenance_hours"])
+    unavailable_until = {}
+    for maintenance in maintenances:
+        created_at = maintenance.get("created_at")
+        if isinstance(created_at, datetime):
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            code, until = maintenance["machine_code"], created_at + expected
+            unavailable_until[code] = max(unavailable_until.get(code, until), until)
+    now = get_utc_now()
+    # Machines still flagged azul without an open maintenance are given the expected time from now
+    for machine in machines:
+        if machine.get("status") == "azul" and machine["code"] not in unavailable_until:
+            unavailable_until[machine["code"]] = now + expected
+    return simulation.simulate_plant(
+        machines, orders, fitted["model"], now,
+        unavailable_until=unavailable_until, changeover_hours=SIMULATION_CHANGEOVER_HOURS,
+    )
+
+def localize_forecast(forecast: dict) -> dict:
+    return {
+        **forecast,
+        "projected_start": convert_utc_to_brazil(forecast["projected_start"]) if forecast["projected_start"] else None,
+        "projected_finish": convert_utc_to_brazil(forecast["projected_finish"]) if forecast["projected_finish"] else None,
+    }
+
+@api_router.get("/forecast")
+async def get_completion_forecast(
+    numero_os: Optional[str] = None,
+    machine_code: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Projected start/finish of the queued orders, per order and per numero_os"""
+    forecasts = list((await simulate_queues()).values())
+    if machine_code:
+        forecasts = [f for f in forecasts if f["machine_code"] == machine_code]
+    if numero_os:
+        forecasts = [f for f in forecasts if f["numero_os"] == numero_os]
+    forecasts.sort(key=lambda f: (f["machine_code"], f["queue_index"]))
+
+    by_os = simulation.forecast_by_numero_os(forecasts)
+    ordens = await db.ordens_producao.find(
+        {"numero_os": {"$in": list(by_os)}},
+        {"_id": 0, "numero_os": 1, "data_entrega": 1, "data_entrega_dt": 1},
+    ).to_list(None) if by_os else []
+    for ordem in ordens:
+        summary = by_os[ordem["numero_os"]]
+        due = ordem.get("data_entrega_dt")
+        if isinstance(due, datetime) and due.tzinfo is None:
+            due = due.replace(tzinfo=timezone.utc)
+        summary["data_entrega"] = ordem.get("data_entrega")
+        # data_entrega_dt is the start of the delivery day; finishing on that day is on time
+        # (same rule as the overdue queries)
+        summary["late"] = bool(due and summary["projected_finish"] and summary["projected_finish"] >= due + timedelta(days=1))
+
+    return Response(content=render_json({
+        "orders": [localize_forecast(f) for f in forecasts],
+        "numero_os": [localize_forecast(s) for s in sorted(by_os.values(), key=lambda s: s["numero_os"])],
+        "generated_at": get_brazil_time().isoformat(),
+    }), media_type="application/json")
+
+# Per-order ETAs
+# Queue reads carry the ETA of every active order. The ETAs of a machine are
+# its simulated queue (simulate_queues) kept in memory. A write that can move
+# them (order created/started/finished/deleted/moved, machine status change)
+# only bumps the generation of that machine, which marks its entry stale;
+# nothing is simulated at write time. A machine queue read recomputes a stale
+# machine inline (one simulation, shared by concurrent readers), while the
+# plant-wide order list serves what is cached and refreshes the stale machines
+# in one coalesced plant-wide simulation in the background. A result is only
+# stored if no write bumped the generation meanwhile. ETA_MAX_AGE_SECONDS
+# bounds how long an entry stays current, for elapsed production time and
+# other workers' writes.
+ETA_MAX_AGE_SECONDS = float(os.getenv("ETA_MAX_AGE_SECONDS", "300"))
+ETA_FIELDS = ("projected_start", "projected_finish", "duration_hours", "basis", "overrun")
+machine_etas = {}  # machine code -> (computed at, generation, {order id: eta})
+eta_generations = {}  # machine code -> invalidation count
+eta_loader = SingleFlight(window=0)
+
+def order_eta(forecast: dict) -> dict:
+    eta = {field: forecast[field] for field in ETA_FIELDS}
+    # Naive UTC like the other datetimes of an Order (the dashboard appends the Z)
+    for field in ("projected_start", "projected_finish"):
+        if eta[field] is not None:
+            eta[field] = eta[field].astimezone(timezone.utc).replace(tzinfo=None)
+    return eta
+
+def invalidate_machine_etas(machine_code: str):
+    eta_generations[machine_code] = eta_generations.get(machine_code, 0) + 1
+
+def cached_machine_etas(machine_code: str):
+    """(cached {order id: eta} or None, whether they are current)"""
+    entry = machine_etas.get(machine_code)
+    if entry is None:
+        return None, False
+    computed_at, generation, etas = entry
+    current = generation == eta_generations.get(machine_code, 0) and \
+        time.monotonic() - computed_at < ETA_MAX_AGE_SECONDS
+    return etas, current
+
+def store_machine_etas(machine_code: str, generation: int, computed_at: float, etas: dict):
+    if eta_generations.get(machine_code, 0) == generation:
+        machine_etas[machine_code] = (computed_at, generation, etas)
+
+async def get_machine_etas(machine_code: str) -> dict:
+    """{order id: eta} of the active orders of a machine, recomputed if stale"""
+    cached, current = cached_machine_etas(machine_code)
+    if current:
+        return cached
+
+    generation = eta_generations.get(machine_code, 0)
+    async def load():
+        forecasts = await simulate_queues(machine_code)
+        etas = {order_id: order_eta(forecast) for order_id, forecast in forecasts.items()}
+        store_machine_etas(machine_code, generation, time.monotonic(), etas)
+        return etas
+    try:
+        return await eta_loader.run((machine_code, generation), load)
+    except Exception as e:
+        # Queue reads must not fail because of the ETAs
+        logger.error(f"Error computing ETAs of {machine_code}: {str(e)}")
+        return cached or {}
+
+async def refresh_plant_etas(machine_codes=()):
+    """One plant-wide simulation refreshes the ETAs of every machine (and of machine_codes, even if idle)"""
+    generations = dict(eta_generations)
+    try:
+        forecasts = await simulate_queues()
+    except Exception as e:
+        logger.error(f"Error computing plant ETAs: {str(e)}")
+        return
+    computed_at, by_machine = time.monotonic(), {code: {} for code in machine_codes}
+    for order_id, forecast in forecasts.items():
+        by_machine.setdefault(forecast["machine_code"], {})[order_id] = order_eta(forecast)
+    for machine_code, etas in by_machine.items():
+        store_machine_etas(machine_code, generations.get(machine_code, 0), computed_at, etas)
+
+async def orders_with_etas(orders: list, wait: bool = False) -> list:
+    """Orders with the ETAs of their machine.
+
+    With wait, stale machines are recomputed before answering; otherwise the
+    cached (possibly stale, possibly missing) ETAs are served and the stale
+    machines are refreshed in the background.
+    """
+    machine_codes = sorted({
+        order["machine_code"] for order in orders if order.get("status") in ("pendente", "em_producao")
+    })
+    if wait:
+        etas = dict(zip(machine_codes, await asyncio.gather(*(get_machine_etas(code) for code in machine_codes))))
+    else:
+        etas, stale = {}, []
+        for code in machine_codes:
+            etas[code], current = cached_machine_etas(code)
+            if not current:
+                stale.append(code)
+        if stale:
+            run_in_background(eta_loader.run("plant", lambda: refresh_plant_etas(stale)))
+    return [QueuedOrder(**order, eta=(etas.get(order["machine_code"]) or {}).get(order["id"])) for order in orders]
+
+# Health routes
+startup_state = {"ready": False, "phases": {}}  # filled by startup_event/warm_caches
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Load balancer gate: 503 until the startup warm-up is finished"""
+    status_code = 200 if startup_state["ready"] else 503
+    return JSONResponse(status_code=status_code, content=startup_state)
+
+# Audit journal: who did what on every mutating /api request. Entries go to a
+# bounded in-memory ring buffer and a background task writes them with
+# insert_many, so requests never wait for the audit write. When the buffer is
+# full the oldest entries are dropped and counted in audit_stats.
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "2"))
+AUDIT_FLUSH_BATCH = int(os.getenv("AUDIT_FLUSH_BATCH", "500"))
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "180"))
+AUDIT_SKIPPED_PATHS = {"/api/auth/login"}
+AUDIT_MAX_CAPTURED_BODY = 64 * 1024  # response bodies read for the id of created documents
+TARGET_PATH_PARAMS = ("user_id", "order_id", "espula_id", "ordem_id", "artigo_id", "maintenance_id",
+                      "machine_code", "machine_id", "layout_type")
+
+audit_buffer = deque(maxlen=AUDIT_BUFFER_SIZE)
+audit_wakeup = asyncio.Event()
+audit_flush_lock = asyncio.Lock()  # a reader's flush waits for the batch the flusher is writing
+audit_stats = {"recorded": 0, "flushed": 0, "dropped": 0, "flush_errors": 0}
+
+def record_audit(entry: dict):
+    if len(audit_buffer) == audit_buffer.maxlen:
+        audit_stats["dropped"] += 1  # deque drops the oldest entry
+    audit_buffer.append(entry)
+    audit_stats["recorded"] += 1
+    if len(audit_buffer) >= AUDIT_FLUSH_BATCH:
+        audit_wakeup.set()
+
+def audit_target(scope: dict, body: bytes) -> Optional[str]:
+    # Creates and updates that return the document: its id
+    if body.startswith(b"{"):
+        try:
+            target = json.loads(body).get("id")
+        except ValueError:
+            target = None
+        if target:
+            return str(target)
+    params = scope.get("path_params") or {}
+    for name in TARGET_PATH_PARAMS:
+        if params.get(name):
+            return str(params[name])
+    return None
+
+def audit_user(scope: dict) -> dict:
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    try:
+        claims = verify_token(authorization.removeprefix("Bearer "))
+    except HTTPException:
+        return {"user_id": None, "username": None}
+    return {"user_id": claims.get("user_id"), "username": claims.get("username")}
+
+class AuditMiddleware:
+    """Pure ASGI middleware: status is read from the response start, nothing is buffered but small bodies"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS")
+                or not scope["path"].startswith("/api/") or scope["path"] in AUDIT_SKIPPED_PATHS):
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        response = {"status_code": None, "replayed": False, "recorded": False}
+        body = bytearray()
+
+        def record(outcome: Optional[str] = None):
+            if response["recorded"]:
+                return
+            response["recorded"] = True
+            status_code = response["status_code"] or 500
+            route = scope.get("route")
+            record_audit({
+                "ts": get_utc_now(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "action": getattr(getattr(route, "endpoint", None), "__name__", None),
+                **audit_user(scope),
+                "target_id": audit_target(scope, bytes(body) if status_code < 400 else b""),
+                "status_code": status_code,
+                "outcome": outcome or ("ok" if status_code < 400 else "rejected" if status_code < 500 else "error"),
+                "replayed": response["replayed"],
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            })
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status_code"] = message["status"]
+                response["replayed"] = (b"idempotent-replayed", b"true") in message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                if len(body) < AUDIT_MAX_CAPTURED_BODY:
+                    body.extend(message.get("body", b""))
+                if not message.get("more_body", False):
+                    # Before the last chunk goes out, so the client's next request already sees the entry
+                    record()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            record("exception")
+            raise
+        finally:
+            record()
+
+async def flush_audit():
+    """Write everything buffered so far"""
+    async with audit_flush_lock:
+        while audit_buffer:
+            batch = [audit_buffer.popleft() for _ in range(min(AUDIT_FLUSH_BATCH, len(audit_buffer)))]
+            try:
+                await db.audit_log.insert_many(batch, ordered=False)
+                audit_stats["flushed"] += len(batch)
+            except Exception as e:
+                audit_stats["flush_errors"] += 1
+                # Put the batch back in front; what no longer fits is dropped
+                room = audit_buffer.maxlen - len(audit_buffer)
+                audit_stats["dropped"] += max(0, len(batch) - room)
+                audit_buffer.extendleft(reversed(batch[:room]))
+                logger.error(f"Error writing audit entries: {str(e)}")
+                return
+
+async def audit_flusher():
+    while True:
+        try:
+            await asyncio.wait_for(audit_wakeup.wait(), timeout=AUDIT_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        audit_wakeup.clear()
+        await flush_audit()
+
+@api_router.get("/audit")
+async def get_audit_log(
+    username: Optional[str] = None,
+    action: Optional[str] = None,
+    target_id: Optional[str] = None,
+    outcome: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """Audit entries, newest first (admin only)"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    await flush_audit()  # include what is still buffered
+
+    query = {}
+    for field, value in (("username", username), ("action", action), ("target_id", target_id), ("outcome", outcome)):
+        if value:
+            query[field] = value
+    start_dt = parse_period_param(start, "start")
+    end_dt = parse_period_param(end, "end")
+    if start_dt or end_dt:
+        query["ts"] = {**({"$gte": start_dt} if start_dt else {}), **({"$lt": end_dt} if end_dt else {})}
+    entries = await db.audit_log.find(query, {"_id": 0}).sort([("ts", -1), ("_id", -1)]).limit(limit).to_list(limit)
+    return {
+        "entries": serialize_docs(entries),
+        "stats": {**audit_stats, "buffered": len(audit_buffer), "buffer_size": audit_buffer.maxlen},
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
 
+def clear_read_caches():
+    read_coalescer.clear()
+    kpi_cache.clear()
+    analytics_open_cache.clear()
+
+@app.middleware("http")
+async def invalidate_read_caches(request: Request, call_next):
+    """Drop coalesced reads around every write so nobody reads their own write stale"""
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return await call_next(request)
+    clear_read_caches()
+    response = await call_next(request)
+    clear_read_caches()
+    return response
+
+# Idempotency keys: a retried create with the same Idempotency-Key header gets
+# the stored first response instead of creating a duplicate.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENT_ROUTES = [re.compile(pattern) for pattern in (
+    r"^/api/orders$",
+    r"^/api/machines/[^/]+/orders$",
+    r"^/api/espulas$",
+    r"^/api/ordens-producao$",
+    r"^/api/espulas/[^/]+/finalize-with-machines$",
+    r"^/api/actions/batch$",
+)]
+
+async def claim_idempotency_key(key_id: str, fingerprint: str):
+    """Stored response of a completed request, or None once the key is ours to execute"""
+    now = get_utc_now()
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": key_id, "fingerprint": fingerprint, "status": "in_progress", "created_at": now
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    existing = await db.idempotency_keys.find_one({"_id": key_id})
+    if existing is None:
+        # Expired between insert and read; take it
+        return await claim_idempotency_key(key_id, fingerprint)
+    if existing["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+    if existing["status"] == "completed":
+        return existing
+
+    # Still running; a claim left behind by a crashed worker can be taken over
+    stale = await db.idempotency_keys.find_one_and_update(
+        {"_id": key_id, "status": "in_progress",
+         "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}},
+        {"$set": {"created_at": now}},
+    )
+    if stale is None:
+        raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still in progress")
+    return None
+
+@app.middleware("http")
+async def idempotency_keys(request: Request, call_next):
+    key = request.headers.get("idempotency-key")
+    if request.method != "POST" or not key or not any(route.match(request.url.path) for route in IDEMPOTENT_ROUTES):
+        return await call_next(request)
+
+    try:
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        user_id = verify_token(token)["user_id"]
+    except HTTPException:
+        return await call_next(request)  # the endpoint answers 401
+
+    body = await request.body()
+    key_id = hashlib.sha256(f"{user_id}|{request.url.path}|{key}".encode()).hexdigest()
+    fingerprint = hashlib.sha256(body).hexdigest()
+    try:
+        stored = await claim_idempotency_key(key_id, fingerprint)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail},
+                            headers={"Retry-After": "1"} if e.status_code == 409 else None)
+    if stored is not None:
+        return Response(content=stored["body"], status_code=stored["status_code"],
+                        media_type=stored["media_type"], headers={"Idempotent-Replayed": "true"})
+
+    try:
+        response = await call_next(request)
+        content = b"".join([chunk async for chunk in response.body_iterator])
+    except BaseException:
+        await db.idempotency_keys.delete_one({"_id": key_id})
+        raise
+
+    if 200 <= response.status_code < 300:
+        await db.idempotency_keys.update_one({"_id": key_id}, {"$set": {
+            "status": "completed",
+            "status_code": response.status_code,
+            "media_type": response.media_type or "application/json",
+            "body": content,
+            "completed_at": get_utc_now(),
+        }})
+    else:
+        # Nothing was created: let the client retry (e.g. after fixing the payload)
+        await db.idempotency_keys.delete_one({"_id": key_id})
+    # Copy raw_headers as a list: a dict would keep only one of repeated headers such as Set-Cookie
+    replay = Response(content=content, status_code=response.status_code)
+    replay.raw_headers = [
+        (name, value) for name, value in response.raw_headers if name != b"content-length"
+    ] + [(b"content-length", str(len(content)).encode("latin-1"))]
+    return replay
+
+app.add_middleware(AuditMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1547,12 +3589,172 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def backfill_artigo_normalizado():
+    """Artigos created before duplicate detection have no normalized name yet"""
+    artigos = await db.banco_dados.find(
+        {"artigo_normalizado": {"$exists": False}}, {"_id": 0, "id": 1, "artigo": 1}
+    ).to_list(None)
+    if artigos:
+        await db.banco_dados.bulk_write([
+            UpdateOne({"id": a["id"]}, {"$set": {"artigo_normalizado": normalize_artigo(a.get("artigo", ""))}})
+            for a in artigos
+        ], ordered=False)
+
+SHADOW_BACKFILL_BATCH_SIZE = int(os.getenv("SHADOW_BACKFILL_BATCH_SIZE", "1000"))
+
+@job_handler("backfill_shadow_fields")
+async def backfill_shadow_fields(collection_name: str):
+    """Add the _num/_dt shadow fields to one batch of older documents, then requeue itself"""
+    source = collection_name.removesuffix("_archive")
+    fields = shadowed_fields(source)
+    shadows = [f"{field}_num" for field in NUMERIC_FIELDS[source]]
+    shadows += [f"{field}_dt" for field in DATE_FIELDS.get(source, ())]
+    extra = ("machine_allocations",) if source == "espulas" else ()
+    docs = await db[collection_name].find(
+        {"$or": [{shadow: {"$exists": False}} for shadow in shadows]},
+        {"_id": 1, **{field: 1 for field in fields + extra}}
+    ).limit(SHADOW_BACKFILL_BATCH_SIZE).to_list(None)
+    if not docs:
+        return
+    operations = []
+    for doc in docs:
+        # Missing fields get a None shadow too, so the document is not selected again
+        update = with_shadow_fields(source, {field: doc.get(field) for field in fields})
+        if isinstance(doc.get("machine_allocations"), list):
+            update["machine_allocations"] = with_shadow_fields(
+                source, {"machine_allocations": doc["machine_allocations"]}
+            )["machine_allocations"]
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+            key: value for key, value in update.items() if key in shadows or key == "machine_allocations"
+        }}))
+    await db[collection_name].bulk_write(operations, ordered=False)
+    if len(docs) == SHADOW_BACKFILL_BATCH_SIZE:
+        await enqueue_job("backfill_shadow_fields", {"collection_name": collection_name}, dedupe=True)
+    else:
+        logger.info(f"Shadow fields backfilled on {collection_name}")
+
+async def ensure_indexes():
+    await ensure_status_timeline_collection()
+
+    await db.orders.create_index([("machine_code", 1), ("queue_position", 1)])
+    for collection in (db.machines, db.orders):
+        await collection.update_many({"version": {"$exists": False}}, {"$set": {"version": 0}})
+    try:
+        await db.orders.create_index(
+            "machine_code", unique=True, name="one_in_production_per_machine",
+            partialFilterExpression={"status": "em_producao"}
+        )
+    except OperationFailure as e:
+        # Machines with two orders in production must be fixed by hand first
+        logger.warning(f"Could not create one_in_production_per_machine index on orders: {str(e)}")
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+    await db.jobs.create_index([("status", 1), ("run_at", 1)])
+    await db.jobs.create_index(
+        [("name", 1), ("dedupe_key", 1)], unique=True, name="pending_dedupe",
+        partialFilterExpression={"status": "pending", "dedupe_key": {"$exists": True}},
+    )
+    await db.jobs.create_index("id")
+    await db.jobs.create_index("expire_at", expireAfterSeconds=0)
+    await db.audit_log.create_index("ts", expireAfterSeconds=AUDIT_RETENTION_DAYS * 24 * 60 * 60)
+    for field in ("username", "action", "target_id"):
+        await db.audit_log.create_index([(field, 1), ("ts", -1)])
+
+    for collection_name, finished_field in ARCHIVED_COLLECTIONS.items():
+        await db[collection_name].create_index([("status", 1), (finished_field, 1)])
+        await db[f"{collection_name}_archive"].create_index("id")
+        await db[f"{collection_name}_archive"].create_index(finished_field)
+    await db.ordens_producao_archive.create_index("numero_os")
+
+    # Range filters on the main quantities; older documents get their
+    # shadow fields from a batched background job
+    for collection_name, field in (("orders", "quantidade"), ("espulas", "quantidade_metros"),
+                                   ("ordens_producao", "metragem")):
+        await db[collection_name].create_index(f"{field}_num")
+    # Delivery dates: sorted espula list, overdue espulas and due ordens
+    await db.espulas.create_index("data_prevista_entrega_dt")
+    await db.espulas.create_index([("status", 1), ("data_prevista_entrega_dt", 1)])
+    await db.ordens_producao.create_index([("status", 1), ("data_entrega_dt", 1)])
+    for collection_name in list(NUMERIC_FIELDS) + [f"{name}_archive" for name in ARCHIVED_COLLECTIONS]:
+        await enqueue_job("backfill_shadow_fields", {"collection_name": collection_name}, dedupe=True)
+
+    try:
+        await ensure_search_indexes()
+    except OperationFailure as e:
+        # Another text index already exists on one of the collections
+        logger.warning(f"Could not create search text indexes: {str(e)}")
+
+    await backfill_artigo_normalizado()
+    try:
+        await db.banco_dados.create_index("artigo_normalizado", unique=True)
+    except OperationFailure as e:
+        # Existing duplicates must be cleaned up by hand; keep a plain index meanwhile
+        logger.warning(f"Could not create unique index on banco_dados.artigo_normalizado: {str(e)}")
+        await db.banco_dados.create_index("artigo_normalizado", name="artigo_normalizado_lookup")
+
+# Startup: indexes and the first seed run before the app accepts requests;
+# the caches are then warmed concurrently (see /api/health/ready).
+async def timed_phase(name: str, coro):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        startup_state["phases"][name] = round(elapsed_ms, 1)
+        logger.info(f"Startup phase {name}: {elapsed_ms:.1f} ms")
+
+async def warm_layouts():
+    for layout_type in MACHINE_LAYOUTS:
+        try:
+            await get_layout(layout_type)
+        except HTTPException:
+            pass  # layout without machines
+
+async def warm_queues():
+    # No in-process queue cache: pull the active orders and the queue index
+    # into MongoDB's cache so the first queue polls are not cold
+    await db.orders.find(
+        {"status": {"$in": ["pendente", "em_producao"]}}, {"_id": 0, "id": 1}
+    ).sort(QUEUE_SORT).to_list(None)
+
+async def warm_etas():
+    await eta_loader.run("plant", refresh_plant_etas)
+
+async def warm_users():
+    users = await db.users.find({}, {"_id": 0, "id": 1, "active": 1, "permissions_version": 1}).to_list(None)
+    for user in users:
+        cache_user_version(user)
+
+async def warm_caches():
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            timed_phase("warm_machines", warm_layouts()),
+            timed_phase("warm_queues", warm_queues()),
+            timed_phase("warm_etas", warm_etas()),
+            timed_phase("warm_article_catalog", article_catalog.get()),
+            timed_phase("warm_users", warm_users()),
+        )
+    except Exception as e:
+        # Cold caches are slower, not broken: report ready anyway
+        logger.error(f"Cache warm-up failed: {str(e)}")
+    startup_state["phases"]["warm_total"] = round((time.perf_counter() - start) * 1000, 1)
+    startup_state["ready"] = True
+    logger.info(f"Ready after warm-up: {startup_state['phases']}")
+
 @app.on_event("startup")
 async def startup_event():
+    await timed_phase("indexes", ensure_indexes())
     machines_count = await db.machines.count_documents({})
     if machines_count == 0:
-        await init_data()
+        await timed_phase("seed", init_data())
+    run_in_background(warm_caches())
+    for _ in range(JOB_WORKERS):
+        run_in_background(job_worker())
+    if ARCHIVE_ENABLED:
+        run_in_background(archival_loop())
+    run_in_background(audit_flusher())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await flush_audit()
     client.close()
@@ -0,0 +1,185 @@
+"""
+Discrete-event simulation of the machine queues for completion forecasts.
+
+Every machine works its queue in order: the order in production first (with
+what is left of it), then the pending orders by queue_position. Events are
+"machine becomes free" times kept in a heap; popping one starts the next
+order of that machine and schedules its finish. Machines in maintenance
+become free when the maintenance is expected to end; deactivated machines
+never do, so their orders stay unscheduled.
+
+Durations come from a DurationModel fitted on finished orders: meters per
+hour (and hours per order, for quantities that do not parse) bucketed from
+the most specific level with enough samples down to a plant-wide default.
+A whole plant (thousands of queued orders) simulates in milliseconds.
+"""
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+UNAVAILABLE_STATUSES = {"desativada"}
+
+# Bucket levels, most specific first: the artigo on the same machine, the
+# artigo on the same layout, whatever the machine runs, then the layout
+LEVELS = (("artigo", "machine_code"), ("artigo", "layout_type"), ("machine_code",), ("layout_type",))
+
+
+def artigo_key(artigo) -> str:
+    return " ".join(str(artigo or "").upper().split())
+
+
+def _utc(value: datetime) -> datetime:
+    # pymongo hands back naive UTC datetimes
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _level_key(level: Tuple[str, ...], doc: dict) -> tuple:
+    return tuple(artigo_key(doc.get(field)) if field == "artigo" else doc.get(field) for field in level)
+
+
+class DurationModel:
+    """Expected production hours of an order from historical throughput"""
+
+    def __init__(self, rows: Iterable[dict] = (), default_rate: float = 100.0, min_samples: int = 3,
+                 levels: Tuple[Tuple[str, ...], ...] = LEVELS):
+        """`rows` are {artigo, layout_type, machine_code, metros, hours, count} sums of finished orders"""
+        self.default_rate = default_rate
+        self.min_samples = min_samples
+        self.levels = levels
+        self.buckets: List[Dict[tuple, list]] = [{} for _ in levels]  # key -> [metros, hours, count]
+        totals = [0.0, 0.0, 0]
+        for row in rows:
+            for level, buckets in zip(levels, self.buckets):
+                bucket = buckets.setdefault(_level_key(level, row), [0.0, 0.0, 0])
+                bucket[0] += row["metros"]
+                bucket[1] += row["hours"]
+                bucket[2] += row["count"]
+            totals[0] += row["metros"]
+            totals[1] += row["hours"]
+            totals[2] += row["count"]
+        self.default_hours = totals[1] / totals[2] if totals[2] else None
+
+    def estimate(self, order: dict, quantity: Optional[float]) -> Tuple[float, str]:
+        """(hours, level used) for an order of `quantity` meters"""
+        for level, buckets in zip(self.levels, self.buckets):
+            bucket = buckets.get(_level_key(level, order))
+            if bucket is None or bucket[2] < self.min_samples or bucket[1] <= 0:
+                continue
+            if quantity and quantity > 0:
+                return quantity / (bucket[0] / bucket[1]), "+".join(level)
+            return bucket[1] / bucket[2], "+".join(level)
+        if quantity and quantity > 0:
+            return quantity / self.default_rate, "default"
+        return self.default_hours or 0.0, "default"
+
+
+def simulate_plant(
+    machines: Iterable[dict],
+    orders: Iterable[dict],
+    model: DurationModel,
+    now: datetime,
+    unavailable_until: Optional[Dict[str, datetime]] = None,
+    changeover_hours: float = 0.0,
+) -> Dict[str, dict]:
+    """Projected start/finish of every active order, keyed by order id.
+
+    `orders` are pendente/em_producao orders with id, machine_code,
+    layout_type, artigo, status, queue_position, started_at and quantidade_num.
+    `unavailable_until` maps machine code to the expected end of its
+    maintenance. A change of artigo between consecutive orders costs
+    `changeover_hours`.
+    """
+    unavailable_until = unavailable_until or {}
+    machine_docs = {machine["code"]: machine for machine in machines}
+
+    queues: Dict[str, List[dict]] = {}
+    for order in orders:
+        queues.setdefault(order["machine_code"], []).append(order)
+
+    forecasts: Dict[str, dict] = {}
+    events: List[Tuple[datetime, str]] = []  # (machine free at, machine code)
+    cursors: Dict[str, int] = {}
+    previous_artigo: Dict[str, str] = {}
+
+    for code, queue in queues.items():
+        queue.sort(key=lambda o: (o["status"] != "em_producao", o.get("queue_position") or 0,
+                                  str(o.get("created_at") or "")))
+        machine = machine_docs.get(code, {})
+        if not machine.get("active", True) or machine.get("status") in UNAVAILABLE_STATUSES:
+            for position, order in enumerate(queue, start=1):
+                forecasts[order["id"]] = _forecast(order, code, position, None, None, None, "machine_unavailable")
+            continue
+
+        free_at = max(now, _utc(unavailable_until.get(code, now)))
+        cursors[code] = 0
+        head = queue[0]
+        if head["status"] == "em_producao":
+            hours, level = model.estimate(head, head.get("quantidade_num"))
+            started_at = _utc(head.get("started_at") or now)
+            elapsed = max(0.0, (now - started_at).total_seconds() / 3600)
+            # An order past its estimate is assumed to be about to finish
+            remaining = max(0.0, hours - elapsed)
+            finish = free_at + timedelta(hours=remaining)
+            forecasts[head["id"]] = _forecast(head, code, 1, started_at, finish, hours, level,
+                                              overrun=elapsed > hours)
+            previous_artigo[code] = artigo_key(head.get("artigo"))
+            cursors[code] = 1
+            free_at = finish
+        heapq.heappush(events, (free_at, code))
+
+    while events:
+        free_at, code = heapq.heappop(events)
+        queue, index = queues[code], cursors[code]
+        if index >= len(queue):
+            continue
+        order = queue[index]
+        cursors[code] = index + 1
+        start = free_at
+        artigo = artigo_key(order.get("artigo"))
+        if changeover_hours and code in previous_artigo and previous_artigo[code] != artigo:
+            start += timedelta(hours=changeover_hours)
+        previous_artigo[code] = artigo
+        hours, level = model.estimate(order, order.get("quantidade_num"))
+        finish = start + timedelta(hours=hours)
+        forecasts[order["id"]] = _forecast(order, code, index + 1, start, finish, hours, level)
+        heapq.heappush(events, (finish, code))
+
+    return forecasts
+
+
+def _forecast(order: dict, code: str, position: int, start, finish, hours, basis: str, overrun: bool = False) -> dict:
+    return {
+        "order_id": order["id"],
+        "machine_code": code,
+        "numero_os": order.get("numero_os"),
+        "status": order["status"],
+        "queue_index": position,
+        "projected_start": start,
+        "projected_finish": finish,
+        "duration_hours": round(hours, 2) if hours is not None else None,
+        "basis": basis,
+        "overrun": overrun,
+    }
+
+
+def forecast_by_numero_os(forecasts: Iterable[dict]) -> Dict[str, dict]:
+    """An OS is finished when the last of its orders (one per allocated machine) is"""
+    by_os: Dict[str, dict] = {}
+    for forecast in forecasts:
+        numero_os = forecast.get("numero_os")
+        if not numero_os:
+            continue
+        summary = by_os.setdefault(numero_os, {
+            "numero_os": numero_os, "orders": 0, "machines": [],
+            "projected_start": None, "projected_finish": None, "unscheduled": 0,
+        })
+        summary["orders"] += 1
+        summary["machines"].append(forecast["machine_code"])
+        if forecast["projected_finish"] is None:
+            summary["unscheduled"] += 1
+            continue
+        if summary["projected_start"] is None or forecast["projected_start"] < summary["projected_start"]:
+            summary["projected_start"] = forecast["projected_start"]
+        if summary["projected_finish"] is None or forecast["projected_finish"] > summary["projected_finish"]:
+            summary["projected_finish"] = forecast["projected_finish"]
+    return by_os
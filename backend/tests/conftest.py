@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Make the backend modules importable from the test suite
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
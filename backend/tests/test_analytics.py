@@ -0,0 +1,55 @@
+"""
+Test suite for MercoTêxtil system - Analytics de produção:
+1. Vectorized quantity parsing agrees with the free-form rules
+2. Grouped metros, counts and durations
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from analytics import parse_quantities, production_frame, production_stats
+
+
+def test_parse_quantities():
+    values = ["1.500", "1500 m", "2,5", "1.234,56", "1.5", "abc", None, "", 12, "10.000.000"]
+    expected = [1500, 1500, 2.5, 1234.56, 1.5, np.nan, np.nan, np.nan, 12, 10_000_000]
+    np.testing.assert_array_equal(parse_quantities(values), np.array(expected, dtype=float))
+
+
+def test_production_stats_by_cliente_and_layout():
+    t0 = datetime(2025, 3, 1, 8)
+    columns = {
+        "cliente": ["A", "A", "B", None],
+        "artigo": ["X", "Y", "X", "X"],
+        "cor": ["Azul"] * 4,
+        "layout_type": ["16_fusos", "16_fusos", "32_fusos", "32_fusos"],
+        "quantidade": ["1.000", "500", "2,5", "abc"],
+        "created_at": [t0] * 4,
+        "started_at": [t0 + timedelta(hours=2), t0 + timedelta(hours=4), None, t0],
+        "finished_at": [t0 + timedelta(hours=12), t0 + timedelta(hours=6), t0 + timedelta(hours=1), t0],
+    }
+    stats = production_stats(production_frame("orders", columns), ["cliente", "layout_type"])
+
+    assert stats["totals"]["finished"] == 4
+    assert stats["totals"]["metros"] == 1502.5
+    first = stats["groups"][0]
+    assert (first["cliente"], first["layout_type"], first["metros"], first["finished"]) == ("A", "16_fusos", 1500, 2)
+    assert first["avg_wait_hours"] == 3
+    assert first["avg_production_hours"] == 6
+    # No started_at: no durations for the group, but it is still counted
+    b = [g for g in stats["groups"] if g["cliente"] == "B"][0]
+    assert b["avg_wait_hours"] is None and b["finished"] == 1
+    # Missing cliente is grouped under ""
+    assert [g for g in stats["groups"] if g["cliente"] == ""][0]["metros"] == 0
+
+
+def test_espulas_layout_from_allocations():
+    t0 = datetime(2025, 3, 1, 8)
+    columns = {
+        "cliente": ["A"], "artigo": ["X"], "cor": ["Azul"], "quantidade_metros": ["300"],
+        "machine_allocations": [[{"layout_type": "32_fusos"}, {"layout_type": "16_fusos"}]],
+        "created_at": [t0], "iniciado_em": [t0], "finalizado_em": [t0 + timedelta(hours=3)],
+    }
+    stats = production_stats(production_frame("espulas", columns), ["layout_type"])
+    assert stats["groups"] == [{"layout_type": "32_fusos", "metros": 300.0, "finished": 1,
+                                "avg_wait_hours": 0.0, "avg_production_hours": 3.0}]
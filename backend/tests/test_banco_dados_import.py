@@ -0,0 +1,157 @@
+"""
+Test suite for MercoTêxtil system - Banco de Dados bulk import:
+1. CSV import creates and updates artigos by normalized name
+2. Per-row error report for invalid rows
+3. Duplicate artigo names are rejected on create
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="module")
+def auth_token():
+    """Get auth token for tests"""
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "username": "admin",
+        "password": "admin123"
+    })
+    if response.status_code != 200:
+        pytest.skip("Authentication failed - skipping tests")
+    return response.json()["token"]
+
+
+@pytest.fixture
+def auth_headers(auth_token):
+    """Auth headers fixture"""
+    return {"Authorization": f"Bearer {auth_token}"}
+
+
+def cleanup_artigos(auth_headers, prefix):
+    artigos = requests.get(f"{BASE_URL}/api/banco-dados", headers=auth_headers).json()
+    for artigo in artigos:
+        if artigo.get("artigo", "").upper().startswith(prefix):
+            requests.delete(f"{BASE_URL}/api/banco-dados/{artigo['id']}", headers=auth_headers)
+
+
+class TestBancoDadosImport:
+    """Tests for POST /api/banco-dados/import"""
+
+    def test_import_csv_upserts_by_normalized_name(self, auth_headers):
+        """CSV with ';' separator - second import updates instead of duplicating"""
+        prefix = f"TEST_IMPORT_{uuid.uuid4().hex[:6].upper()}"
+        csv_content = (
+            "Artigo;Engrenagem;Fios;Máquinas;Ciclos;Carga\n"
+            f"{prefix}_A;ENG-1;24;CD1, CD2;5;100\n"
+            f"{prefix}_B;ENG-2;32;CT1;3;50\n"
+        )
+        response = requests.post(
+            f"{BASE_URL}/api/banco-dados/import",
+            files={"file": ("artigos.csv", csv_content.encode("utf-8"), "text/csv")},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Import failed: {response.text}"
+        report = response.json()
+        assert report["total_rows"] == 2
+        assert report["inserted"] == 2
+        assert report["errors"] == []
+
+        # Same artigo with different case/spaces updates the existing one
+        csv_update = (
+            "artigo,ciclos,carga\n"
+            f"  {prefix.lower()}_a ,7,200\n"
+        )
+        response = requests.post(
+            f"{BASE_URL}/api/banco-dados/import",
+            files={"file": ("artigos.csv", csv_update.encode("utf-8"), "text/csv")},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Import failed: {response.text}"
+        report = response.json()
+        assert report["inserted"] == 0
+        assert report["updated"] == 1
+
+        artigos = requests.get(f"{BASE_URL}/api/banco-dados", headers=auth_headers).json()
+        matching = [a for a in artigos if a["artigo"].strip().upper() == f"{prefix}_A"]
+        assert len(matching) == 1, "Import should not duplicate artigos"
+        assert matching[0]["ciclos"] == "7"
+
+        cleanup_artigos(auth_headers, prefix)
+
+    def test_import_reports_row_errors(self, auth_headers):
+        """Rows without mandatory fields are reported with their line number"""
+        prefix = f"TEST_IMPORT_{uuid.uuid4().hex[:6].upper()}"
+        csv_content = (
+            "artigo;ciclos;carga\n"
+            f"{prefix}_OK;1;2\n"
+            f"{prefix}_SEM_CARGA;1;\n"
+        )
+        response = requests.post(
+            f"{BASE_URL}/api/banco-dados/import",
+            files={"file": ("artigos.csv", csv_content.encode("utf-8"), "text/csv")},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Import failed: {response.text}"
+        report = response.json()
+        assert report["inserted"] == 1
+        assert len(report["errors"]) == 1
+        assert report["errors"][0]["row"] == 3
+
+        cleanup_artigos(auth_headers, prefix)
+
+    def test_import_rejects_missing_columns(self, auth_headers):
+        """File without the mandatory columns is rejected"""
+        response = requests.post(
+            f"{BASE_URL}/api/banco-dados/import",
+            files={"file": ("artigos.csv", b"artigo;fios\nX;1\n", "text/csv")},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+
+    def test_import_windows_1252_csv(self, auth_headers):
+        """CSV saved by Excel in pt-BR (Windows-1252) is decoded after UTF-8 fails"""
+        prefix = f"TEST_IMPORT_{uuid.uuid4().hex[:6].upper()}"
+        csv_content = (
+            "Artigo;Máquinas;Ciclos;Carga\n"
+            f"{prefix}_ALGODÃO;CD1;5;100\n"
+        )
+        response = requests.post(
+            f"{BASE_URL}/api/banco-dados/import",
+            files={"file": ("artigos.csv", csv_content.encode("cp1252"), "text/csv")},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Import failed: {response.text}"
+        assert response.json()["inserted"] == 1
+
+        artigos = requests.get(f"{BASE_URL}/api/banco-dados", headers=auth_headers).json()
+        matching = [a for a in artigos if a["artigo"] == f"{prefix}_ALGODÃO"]
+        assert len(matching) == 1 and matching[0]["maquinas"] == "CD1"
+
+        cleanup_artigos(auth_headers, prefix)
+
+    def test_import_rejects_corrupt_xlsx(self, auth_headers):
+        """A file that is not a valid workbook is a 400, not a 500"""
+        response = requests.post(
+            f"{BASE_URL}/api/banco-dados/import",
+            files={"file": ("artigos.xlsx", b"PK\x03\x04 not really a zip", "application/octet-stream")},
+            headers=auth_headers
+        )
+        assert response.status_code == 400, f"Unexpected response: {response.text}"
+
+    def test_create_duplicate_artigo_rejected(self, auth_headers):
+        """POST /api/banco-dados - same normalized name cannot be created twice"""
+        name = f"TEST_DUP_{uuid.uuid4().hex[:6].upper()}"
+        first = requests.post(f"{BASE_URL}/api/banco-dados", json={
+            "artigo": name, "ciclos": "1", "carga": "1"
+        }, headers=auth_headers)
+        assert first.status_code == 200
+
+        second = requests.post(f"{BASE_URL}/api/banco-dados", json={
+            "artigo": f" {name.lower()} ", "ciclos": "1", "carga": "1"
+        }, headers=auth_headers)
+        assert second.status_code == 400
+
+        requests.delete(f"{BASE_URL}/api/banco-dados/{first.json()['id']}", headers=auth_headers)
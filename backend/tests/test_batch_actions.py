@@ -0,0 +1,75 @@
+"""
+Test suite for MercoTêxtil system - Ações em lote (espulas):
+1. ordered_bulk_write reports which operations were applied
+2. Espula results follow the outcome of their own writes
+Runs against mongomock-motor, no MongoDB server needed.
+"""
+import asyncio
+import os
+
+import pytest
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+# server.py reads the connection settings at import; the client never connects here
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "batch_test")
+
+import server  # noqa: E402
+
+
+class FailingCollection:
+    """bulk_write fails at operation `failed_at` like an ordered MongoDB bulk write"""
+
+    def __init__(self, failed_at):
+        self.failed_at = failed_at
+
+    async def bulk_write(self, operations, ordered=True):
+        raise BulkWriteError({"writeErrors": [{"index": self.failed_at, "errmsg": "boom"}], "nInserted": 0})
+
+
+class FailingOrdens:
+    """Database whose ordens_producao writes fail"""
+
+    def __init__(self, database):
+        self.database = database
+        self.ordens_producao = FailingCollection(failed_at=0)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def action(espula_id, client_id):
+    return server.BatchAction(type="espula_status", espula_id=espula_id, status="finalizado", client_id=client_id)
+
+
+class TestEspulaBatch:
+    def test_ordered_bulk_write_outcomes(self):
+        operations = [UpdateOne({"id": str(n)}, {"$set": {"n": n}}) for n in range(3)]
+        outcomes = run(server.ordered_bulk_write(FailingCollection(failed_at=1), operations, "espula"))
+        assert outcomes[0] is None
+        assert (outcomes[1].status_code, outcomes[1].detail) == (500, "Error updating espula: boom")
+        assert outcomes[2].detail.startswith("Not applied")
+
+    def test_results_follow_the_writes(self, monkeypatch):
+        database = mongomock_motor.AsyncMongoMockClient()["batch_test"]
+        run(database.espulas.insert_many([
+            {"id": "linked", "status": "pendente", "ordem_producao_id": "ordem"},
+            {"id": "plain", "status": "pendente"},
+        ]))
+        monkeypatch.setattr(server, "db", FailingOrdens(database))
+
+        results = run(server.apply_espula_actions(
+            [(0, action("linked", "1")), (1, action("plain", "2")), (2, action("missing", "3"))], None
+        ))
+        assert results[0].status_code == 500 and results[0].detail.startswith("Espula updated, but")
+        assert results[1] == {"message": "Espula updated successfully"}
+        assert results[2].status_code == 404
+        statuses = {e["id"]: e["status"] for e in run(database.espulas.find({}, {"_id": 0}).to_list(None))}
+        assert statuses == {"linked": "finalizado", "plain": "finalizado"}
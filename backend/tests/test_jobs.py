@@ -0,0 +1,116 @@
+"""
+Test suite for MercoTêxtil system - Fila de jobs:
+1. Claim and complete
+2. Retry with exponential backoff, then failed
+3. Lease expiry: another worker takes the job over, the stale run is ignored
+4. Dedupe of pending jobs (unique partial index)
+Runs against mongomock-motor, no MongoDB server needed.
+"""
+import asyncio
+import os
+from datetime import timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+# server.py reads the connection settings at import; the client never connects here
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "jobs_test")
+
+import server  # noqa: E402
+
+calls = []
+
+
+@server.job_handler("test_ok")
+async def ok_job(value: int):
+    calls.append(value)
+
+
+@server.job_handler("test_fail")
+async def failing_job():
+    raise RuntimeError("boom")
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["jobs_test"]
+    monkeypatch.setattr(server, "db", database)
+    calls.clear()
+    asyncio.run(database.jobs.create_index(
+        [("name", 1), ("dedupe_key", 1)], unique=True,
+        partialFilterExpression={"status": "pending", "dedupe_key": {"$exists": True}},
+    ))
+    return database
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def stored(db, job_id):
+    return run(db.jobs.find_one({"id": job_id}))
+
+
+class TestJobQueue:
+    def test_claim_and_complete(self, db):
+        run(server.enqueue_job("test_ok", {"value": 7}))
+        job = run(server.claim_job())
+        assert (job["status"], job["attempts"]) == ("running", 1)
+        assert run(server.claim_job()) is None  # leased
+
+        run(server.run_job(job))
+        assert calls == [7]
+        done = stored(db, job["id"])
+        assert done["status"] == "done"
+        assert done["expire_at"] > done["finished_at"]
+
+    def test_backoff_then_failed(self, db, monkeypatch):
+        monkeypatch.setattr(server, "JOB_MAX_ATTEMPTS", 2)
+        run(server.enqueue_job("test_fail"))
+        job = run(server.claim_job())
+        before = server.get_utc_now()
+        run(server.run_job(job))
+        retry = stored(db, job["id"])
+        assert (retry["status"], retry["error"]) == ("pending", "boom")
+        assert retry["run_at"].replace(tzinfo=before.tzinfo) >= before + timedelta(seconds=server.JOB_BACKOFF_SECONDS * 0.9)
+        assert run(server.claim_job()) is None  # not due yet
+
+        run(db.jobs.update_one({"id": job["id"]}, {"$set": {"run_at": before}}))
+        job = run(server.claim_job())
+        run(server.run_job(job))
+        assert stored(db, job["id"])["status"] == "failed"
+
+    def test_lease_expiry(self, db):
+        run(server.enqueue_job("test_ok", {"value": 1}))
+        first = run(server.claim_job())
+        # The first worker stalls past its lease: the job is claimed again
+        run(db.jobs.update_one({"id": first["id"]}, {"$set": {"run_at": server.get_utc_now() - timedelta(seconds=1)}}))
+        second = run(server.claim_job())
+        assert (second["id"], second["attempts"]) == (first["id"], 2)
+
+        run(server.run_job(second))
+        run(db.jobs.update_one({"id": first["id"]}, {"$set": {"note": "kept"}}))
+        run(server.finish_job(first, {"status": "pending"}))  # the stale run reports late
+        job = stored(db, first["id"])
+        assert (job["status"], job["attempts"], job["note"]) == ("done", 2, "kept")
+
+    def test_dedupe_pending(self, db):
+        for _ in range(3):
+            run(server.enqueue_job("test_ok", {"value": 1}, dedupe=True))
+        assert run(db.jobs.count_documents({"name": "test_ok"})) == 1
+
+        job = run(server.claim_job())
+        # Running jobs do not block a new one: it may have read the old state already
+        run(server.enqueue_job("test_ok", {"value": 1}, dedupe=True))
+        assert run(db.jobs.count_documents({"name": "test_ok", "status": "pending"})) == 1
+        assert job["status"] == "running"
+
+    def test_failed_run_superseded_by_pending_duplicate(self, db):
+        run(server.enqueue_job("test_fail", {}, dedupe=True))
+        job = run(server.claim_job())
+        run(server.enqueue_job("test_fail", {}, dedupe=True))
+        run(server.run_job(job))  # its retry would duplicate the pending job
+        assert stored(db, job["id"])["superseded"] is True
+        assert run(db.jobs.count_documents({"name": "test_fail", "status": "pending"})) == 1
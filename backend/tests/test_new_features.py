@@ -258,5 +258,600 @@ class TestDefaultUsersPermissions:
                 print(f"User {user['username']} has banco_dados permission: {user['permissions'].get('banco_dados')}")
 
 
+class TestKpis:
+    """Test aggregated KPI endpoint"""
+
+    def test_kpis_match_machine_list(self, auth_headers):
+        """GET /api/kpis - machine counts agree with GET /api/machines"""
+        response = requests.get(f"{BASE_URL}/api/kpis", headers=auth_headers)
+        assert response.status_code == 200, f"Get kpis failed: {response.text}"
+
+        kpis = response.json()
+        for section in ("machines", "orders", "espulas", "ordens_producao"):
+            assert section in kpis, f"Missing KPI section {section}"
+        assert isinstance(kpis["espulas"]["overdue"], int)
+
+        machines = requests.get(f"{BASE_URL}/api/machines", headers=auth_headers).json()
+        assert kpis["machines"]["total"] == len(machines)
+        verdes = len([m for m in machines if m["status"] == "verde"])
+        assert kpis["machines"]["by_status"].get("verde", 0) == verdes
+
+    def test_kpis_invalidated_on_write(self, auth_headers):
+        """POST /api/espulas - new espula is counted right away"""
+        before = requests.get(f"{BASE_URL}/api/kpis", headers=auth_headers).json()
+        response = requests.post(f"{BASE_URL}/api/espulas", json={
+            "cliente": "TEST_KPI", "artigo": "TEST_KPI", "cor": "Azul",
+            "quantidade_metros": "10", "carga": "1", "data_prevista_entrega": "2000-01-01"
+        }, headers=auth_headers)
+        assert response.status_code == 200, f"Create espula failed: {response.text}"
+
+        after = requests.get(f"{BASE_URL}/api/kpis", headers=auth_headers).json()
+        assert after["espulas"]["by_status"].get("pendente", 0) == before["espulas"]["by_status"].get("pendente", 0) + 1
+        assert after["espulas"]["overdue"] == before["espulas"]["overdue"] + 1
+
+        requests.delete(f"{BASE_URL}/api/espulas/{response.json()['id']}", headers=auth_headers)
+
+
+class TestMachineLayout:
+    """Test versioned static layout and slim status poll"""
+
+    def test_status_poll_and_versioned_layout(self, auth_headers):
+        """GET /api/machines/{layout}/status + GET /api/layouts/{layout}?v= - merge by code"""
+        response = requests.get(f"{BASE_URL}/api/machines/16_fusos/status", headers=auth_headers)
+        assert response.status_code == 200, f"Get status failed: {response.text}"
+        status = response.json()
+        assert set(status["machines"][0].keys()) == {"code", "status", "active"}
+
+        response = requests.get(f"{BASE_URL}/api/layouts/16_fusos", params={"v": status["layout_version"]}, headers=auth_headers)
+        assert response.status_code == 200, f"Get layout failed: {response.text}"
+        assert "immutable" in response.headers["Cache-Control"]
+        layout = response.json()
+        assert layout["version"] == status["layout_version"]
+        assert {m["code"] for m in layout["machines"]} == {m["code"] for m in status["machines"]}
+        assert all(m.get("position") for m in layout["machines"])
+
+        response = requests.get(f"{BASE_URL}/api/layouts/16_fusos", headers={
+            **auth_headers, "If-None-Match": response.headers["ETag"]
+        })
+        assert response.status_code == 304
+
+
+class TestIdempotencyKeys:
+    """Test Idempotency-Key replay on create endpoints"""
+
+    def test_retry_returns_first_response(self, auth_headers):
+        """POST /api/espulas twice with the same key - one espula, same response"""
+        import uuid
+        headers = {**auth_headers, "Idempotency-Key": str(uuid.uuid4())}
+        espula_data = {
+            "cliente": "TEST_IDEMPOTENCY", "artigo": "TEST_IDEMPOTENCY", "cor": "Azul",
+            "quantidade_metros": "10", "carga": "1", "data_prevista_entrega": "2030-01-01"
+        }
+        first = requests.post(f"{BASE_URL}/api/espulas", json=espula_data, headers=headers)
+        assert first.status_code == 200, f"Create espula failed: {first.text}"
+        retry = requests.post(f"{BASE_URL}/api/espulas", json=espula_data, headers=headers)
+        assert retry.status_code == 200
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        assert retry.json()["id"] == first.json()["id"]
+
+        espulas = requests.get(f"{BASE_URL}/api/espulas", headers=auth_headers).json()
+        assert len([e for e in espulas if e["id"] == first.json()["id"]]) == 1
+
+        # Same key with another payload is a client bug
+        other = requests.post(f"{BASE_URL}/api/espulas", json={**espula_data, "cor": "Verde"}, headers=headers)
+        assert other.status_code == 422
+
+        requests.delete(f"{BASE_URL}/api/espulas/{first.json()['id']}", headers=auth_headers)
+
+
+class TestOrderTransitions:
+    """Test conditional order transitions on a machine queue"""
+
+    def test_one_order_in_production_per_machine(self, auth_headers):
+        """PUT /api/machines/{code}/orders/{id}/start - second start is rejected, versions move"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        order_data = {"machine_id": "", "cliente": "TEST_OCC", "artigo": "TEST_OCC", "cor": "Azul", "quantidade": "100"}
+        orders = [
+            requests.post(f"{BASE_URL}/api/machines/N10/orders", json=order_data, headers=auth_headers).json()
+            for _ in range(2)
+        ]
+        assert all(order["version"] == 0 for order in orders)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            responses = list(pool.map(
+                lambda order: requests.put(
+                    f"{BASE_URL}/api/machines/N10/orders/{order['id']}/start", headers=auth_headers
+                ),
+                orders,
+            ))
+        assert sorted(r.status_code for r in responses) == [200, 400]
+
+        queue = requests.get(f"{BASE_URL}/api/machines/N10/orders", headers=auth_headers).json()
+        in_production = [o for o in queue if o["status"] == "em_producao"]
+        assert len(in_production) == 1
+        assert in_production[0]["version"] == 1
+
+        machines = requests.get(f"{BASE_URL}/api/machines/32_fusos", headers=auth_headers).json()
+        assert [m for m in machines if m["code"] == "N10"][0]["status"] == "vermelho"
+
+        for order in orders:
+            requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+    def test_update_order_checks_prior_status(self, auth_headers):
+        """PUT /api/orders/{id} - finish needs em_producao, a second start keeps started_at"""
+        order = requests.post(f"{BASE_URL}/api/machines/N9/orders", json={
+            "machine_id": "", "cliente": "TEST_OCC", "artigo": "TEST_OCC", "cor": "Azul", "quantidade": "100"
+        }, headers=auth_headers).json()
+        url = f"{BASE_URL}/api/orders/{order['id']}"
+
+        assert requests.put(url, json={"status": "finalizado"}, headers=auth_headers).status_code == 400
+        assert requests.put(url, json={"status": "em_producao"}, headers=auth_headers).status_code == 200
+        queue = requests.get(f"{BASE_URL}/api/machines/N9/orders", headers=auth_headers).json()
+        started_at = [o for o in queue if o["id"] == order["id"]][0]["started_at"]
+
+        assert requests.put(url, json={"status": "em_producao"}, headers=auth_headers).status_code == 400
+        queue = requests.get(f"{BASE_URL}/api/machines/N9/orders", headers=auth_headers).json()
+        assert [o for o in queue if o["id"] == order["id"]][0]["started_at"] == started_at
+        assert requests.put(url, json={"status": "finalizado"}, headers=auth_headers).status_code == 200
+
+        requests.delete(url, headers=auth_headers)
+
+
+class TestQueueMoves:
+    """Test moving pending orders between machine queues"""
+
+    def test_move_to_machine_in_maintenance_rejected(self, auth_headers):
+        """PUT /api/orders/{id}/move - a machine in maintenance (azul) takes no new work"""
+        order = requests.post(f"{BASE_URL}/api/machines/N3/orders", json={
+            "machine_id": "", "cliente": "TEST_MOVE", "artigo": "TEST_MOVE", "cor": "Azul", "quantidade": "10"
+        }, headers=auth_headers).json()
+        machines = requests.get(f"{BASE_URL}/api/machines/32_fusos", headers=auth_headers).json()
+        target = [m for m in machines if m["code"] == "N2"][0]
+        maintenance = requests.post(f"{BASE_URL}/api/maintenance", json={
+            "machine_id": target["id"], "motivo": "TEST_MOVE"
+        }, headers=auth_headers)
+        assert maintenance.status_code == 200, f"Open maintenance failed: {maintenance.text}"
+
+        response = requests.put(f"{BASE_URL}/api/orders/{order['id']}/move",
+                                json={"position": 1, "machine_code": "N2"}, headers=auth_headers)
+        assert response.status_code == 400
+
+        requests.put(f"{BASE_URL}/api/maintenance/{maintenance.json()['id']}/finish", headers=auth_headers)
+        requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+class TestSearch:
+    """Test unified search across orders, espulas and ordens de producao"""
+
+    def test_search_merges_collections(self, auth_headers):
+        """GET /api/search - one query finds the espula and the order of a cliente"""
+        import uuid
+        cliente = f"TESTSEARCH{uuid.uuid4().hex[:8].upper()}"
+        espula = requests.post(f"{BASE_URL}/api/espulas", json={
+            "cliente": cliente, "artigo": "TEST_SEARCH", "cor": "Azul",
+            "quantidade_metros": "10", "carga": "1", "data_prevista_entrega": "2030-01-01"
+        }, headers=auth_headers)
+        assert espula.status_code == 200
+        order = requests.post(f"{BASE_URL}/api/machines/N9/orders", json={
+            "machine_id": "", "cliente": cliente, "artigo": "TEST_SEARCH", "cor": "Azul", "quantidade": "10"
+        }, headers=auth_headers)
+        assert order.status_code == 200
+
+        response = requests.get(f"{BASE_URL}/api/search", params={"q": cliente}, headers=auth_headers)
+        assert response.status_code == 200, f"Search failed: {response.text}"
+        result = response.json()
+        assert result["totals"]["espula"] == 1
+        assert result["totals"]["order"] == 1
+        assert {r["type"] for r in result["results"]} == {"espula", "order"}
+        scores = [r["score"] for r in result["results"]]
+        assert scores == sorted(scores, reverse=True)
+
+        page = requests.get(f"{BASE_URL}/api/search", params={"q": cliente, "page_size": 1, "page": 2}, headers=auth_headers)
+        assert len(page.json()["results"]) == 1
+
+        requests.delete(f"{BASE_URL}/api/orders/{order.json()['id']}", headers=auth_headers)
+        requests.delete(f"{BASE_URL}/api/espulas/{espula.json()['id']}", headers=auth_headers)
+
+    def test_search_finds_archived(self, auth_headers):
+        """GET /api/search - finished work moved to the archive is still found"""
+        import uuid
+        cliente = f"TESTSEARCH{uuid.uuid4().hex[:8].upper()}"
+        espula = requests.post(f"{BASE_URL}/api/espulas", json={
+            "cliente": cliente, "artigo": "TEST_SEARCH", "cor": "Azul",
+            "quantidade_metros": "10", "carga": "1", "data_prevista_entrega": "2020-01-01"
+        }, headers=auth_headers).json()
+        requests.post(f"{BASE_URL}/api/actions/batch", json={"actions": [
+            {"type": "espula_status", "espula_id": espula["id"], "status": "finalizado",
+             "client_id": "1", "client_timestamp": "2020-01-02T10:00:00-03:00"},
+        ]}, headers=auth_headers)
+        assert requests.post(f"{BASE_URL}/api/archive/run", headers=auth_headers).json()["moved"]["espulas"] >= 1
+
+        response = requests.get(f"{BASE_URL}/api/search", params={"q": cliente}, headers=auth_headers)
+        assert response.status_code == 200, f"Search failed: {response.text}"
+        assert response.json()["totals"]["espula"] == 1
+        assert [r["id"] for r in response.json()["results"]] == [espula["id"]]
+
+        requests.delete(f"{BASE_URL}/api/espulas/{espula['id']}", headers=auth_headers)
+
+
+class TestBatchActions:
+    """Test batched operator actions"""
+
+    def test_batch_applies_in_order_with_per_item_results(self, auth_headers):
+        """POST /api/actions/batch - start then finish on one machine, bad items do not stop the batch"""
+        order = requests.post(f"{BASE_URL}/api/machines/N8/orders", json={
+            "machine_id": "", "cliente": "TEST_BATCH", "artigo": "TEST_BATCH", "cor": "Azul", "quantidade": "10"
+        }, headers=auth_headers).json()
+
+        response = requests.post(f"{BASE_URL}/api/actions/batch", json={"actions": [
+            {"type": "start_order", "machine_code": "N8", "order_id": order["id"],
+             "client_id": "1", "client_timestamp": "2024-01-10T08:00:00-03:00"},
+            {"type": "finish_order", "machine_code": "N8", "order_id": order["id"], "client_id": "2"},
+            {"type": "finish_order", "machine_code": "N8", "order_id": order["id"], "client_id": "3"},
+            {"type": "espula_status", "espula_id": "does-not-exist", "status": "finalizado", "client_id": "4"},
+        ]}, headers=auth_headers)
+        assert response.status_code == 200, f"Batch failed: {response.text}"
+        result = response.json()
+        assert [item["client_id"] for item in result["results"]] == ["1", "2", "3", "4"]
+        assert [item["ok"] for item in result["results"]] == [True, True, False, False]
+        assert result["results"][2]["status_code"] == 400
+        assert result["results"][3]["status_code"] == 404
+
+        orders = requests.get(f"{BASE_URL}/api/orders", headers=auth_headers).json()
+        finished = [o for o in orders if o["id"] == order["id"]][0]
+        assert finished["status"] == "finalizado"
+        assert finished["started_at"].startswith("2024-01-10T11:00:00")
+
+        requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+
+class TestProductionAnalytics:
+    """Test vectorized production analytics"""
+
+    def test_finished_order_is_counted(self, auth_headers):
+        """GET /api/analytics/production - a finished order shows up in its cliente/layout group"""
+        params = {"group_by": "cliente,layout_type"}
+        order = requests.post(f"{BASE_URL}/api/machines/N7/orders", json={
+            "machine_id": "", "cliente": "TEST_ANALYTICS", "artigo": "TEST_ANALYTICS", "cor": "Azul",
+            "quantidade": "1.500"
+        }, headers=auth_headers).json()
+        requests.put(f"{BASE_URL}/api/machines/N7/orders/{order['id']}/start", headers=auth_headers)
+        response = requests.put(f"{BASE_URL}/api/machines/N7/orders/{order['id']}/finish", headers=auth_headers)
+        assert response.status_code == 200, f"Finish failed: {response.text}"
+
+        response = requests.get(f"{BASE_URL}/api/analytics/production", params=params, headers=auth_headers)
+        assert response.status_code == 200, f"Analytics failed: {response.text}"
+        groups = [g for g in response.json()["orders"]["groups"] if g["cliente"] == "TEST_ANALYTICS"]
+        assert len(groups) == 1
+        assert groups[0]["layout_type"] == "32_fusos"
+        assert groups[0]["metros"] >= 1500
+        assert groups[0]["avg_production_hours"] >= 0
+
+        requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+    def test_invalid_group_by(self, auth_headers):
+        """GET /api/analytics/production?group_by=foo - 400"""
+        response = requests.get(f"{BASE_URL}/api/analytics/production", params={"group_by": "foo"},
+                                headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestNumericShadowFields:
+    """Test parsed numeric companions of quantity strings"""
+
+    def test_order_quantity_is_summed_by_the_database(self, auth_headers):
+        """GET /api/kpis - metros_by_status counts a new order with a Brazilian-format quantity"""
+        before = requests.get(f"{BASE_URL}/api/kpis", headers=auth_headers).json()
+        order = requests.post(f"{BASE_URL}/api/machines/N6/orders", json={
+            "machine_id": "", "cliente": "TEST_NUM", "artigo": "TEST_NUM", "cor": "Azul", "quantidade": "1.250,5 m"
+        }, headers=auth_headers).json()
+
+        after = requests.get(f"{BASE_URL}/api/kpis", headers=auth_headers).json()
+        pending_before = before["orders"]["metros_by_status"].get("pendente", 0)
+        assert after["orders"]["metros_by_status"]["pendente"] == pytest.approx(pending_before + 1250.5)
+
+        requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+
+class TestDeliveryDates:
+    """Test overdue espulas and due ordens on datetime delivery dates"""
+
+    def test_overdue_espulas(self, auth_headers):
+        """GET /api/espulas/overdue - past delivery dates only, most late first"""
+        from datetime import date, timedelta
+
+        created = []
+        for days in (-3, -10, 5):
+            response = requests.post(f"{BASE_URL}/api/espulas", json={
+                "cliente": "TEST_OVERDUE", "artigo": "TEST_OVERDUE", "cor": "Azul", "quantidade_metros": "10",
+                "carga": "1", "data_prevista_entrega": (date.today() + timedelta(days=days)).isoformat()
+            }, headers=auth_headers)
+            assert response.status_code == 200, f"Create espula failed: {response.text}"
+            created.append(response.json())
+
+        response = requests.get(f"{BASE_URL}/api/espulas/overdue", headers=auth_headers)
+        assert response.status_code == 200, f"Get overdue failed: {response.text}"
+        ids = [espula["id"] for espula in response.json()]
+        assert created[0]["id"] in ids and created[1]["id"] in ids
+        assert created[2]["id"] not in ids
+        assert ids.index(created[1]["id"]) < ids.index(created[0]["id"])
+
+        for espula in created:
+            requests.delete(f"{BASE_URL}/api/espulas/{espula['id']}", headers=auth_headers)
+
+    def test_ordens_due_within(self, auth_headers):
+        """GET /api/ordens-producao/due?within= - window in days from today"""
+        from datetime import date, timedelta
+
+        response = requests.post(f"{BASE_URL}/api/ordens-producao", json={
+            "cliente": "TEST_DUE", "artigo": "TEST_DUE", "cor": "Azul", "metragem": "100",
+            "data_entrega": (date.today() + timedelta(days=3)).isoformat()
+        }, headers=auth_headers)
+        assert response.status_code == 200, f"Create ordem failed: {response.text}"
+        ordem = response.json()
+
+        due = requests.get(f"{BASE_URL}/api/ordens-producao/due", params={"within": 7}, headers=auth_headers).json()
+        assert ordem["id"] in [o["id"] for o in due]
+        due = requests.get(f"{BASE_URL}/api/ordens-producao/due", params={"within": 1}, headers=auth_headers).json()
+        assert ordem["id"] not in [o["id"] for o in due]
+
+        requests.delete(f"{BASE_URL}/api/ordens-producao/{ordem['id']}", headers=auth_headers)
+
+
+class TestPermissionClaims:
+    """Test authorization from token claims and the permissions version"""
+
+    def test_edit_forces_new_login(self, auth_headers):
+        """PUT /api/users/{id} - tokens issued before the edit get 401, a new login carries the new permissions"""
+        username = "test_claims_user"
+        user = requests.post(f"{BASE_URL}/api/users", json={
+            "username": username, "email": "claims@test.com", "password": "claims123", "role": "operador_interno"
+        }, headers=auth_headers).json()
+
+        def login():
+            response = requests.post(f"{BASE_URL}/api/auth/login", json={"username": username, "password": "claims123"})
+            assert response.status_code == 200, f"Login failed: {response.text}"
+            return {"Authorization": f"Bearer {response.json()['token']}"}
+
+        old_headers = login()
+        assert requests.get(f"{BASE_URL}/api/machines", headers=old_headers).status_code == 200
+
+        # Edits that leave the token claims and active alone keep the tokens valid
+        response = requests.put(f"{BASE_URL}/api/users/{user['id']}", json={
+            "username": username, "email": user["email"], "role": user["role"],
+            "permissions": user["permissions"], "active": True
+        }, headers=auth_headers)
+        assert response.status_code == 200, f"Update user failed: {response.text}"
+        assert response.json()["permissions_version"] == user["permissions_version"]
+        assert requests.get(f"{BASE_URL}/api/machines", headers=old_headers).status_code == 200
+
+        permissions = {**user["permissions"], "relatorios": False}
+        response = requests.put(f"{BASE_URL}/api/users/{user['id']}", json={"permissions": permissions},
+                                headers=auth_headers)
+        assert response.status_code == 200, f"Update user failed: {response.text}"
+        assert response.json()["permissions_version"] == user["permissions_version"] + 1
+
+        assert requests.get(f"{BASE_URL}/api/machines", headers=old_headers).status_code == 401
+        new_headers = login()
+        me = requests.get(f"{BASE_URL}/api/auth/me", headers=new_headers).json()
+        assert me["permissions"]["relatorios"] is False
+
+        # The username is a claim too: records must not be written under the old name
+        response = requests.put(f"{BASE_URL}/api/users/{user['id']}", json={"username": f"{username}_renamed"},
+                                headers=auth_headers)
+        assert response.status_code == 200, f"Rename user failed: {response.text}"
+        assert requests.get(f"{BASE_URL}/api/machines", headers=new_headers).status_code == 401
+
+        requests.delete(f"{BASE_URL}/api/users/{user['id']}", headers=auth_headers)
+
+
+class TestAuditLog:
+    """Test the request audit journal"""
+
+    def test_mutations_are_journaled(self, auth_headers):
+        """GET /api/audit - create and delete of an order are recorded with user, action and outcome"""
+        order = requests.post(f"{BASE_URL}/api/machines/N5/orders", json={
+            "machine_id": "", "cliente": "TEST_AUDIT", "artigo": "TEST_AUDIT", "cor": "Azul", "quantidade": "1"
+        }, headers=auth_headers).json()
+        requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+        response = requests.get(f"{BASE_URL}/api/audit", params={"target_id": order["id"]}, headers=auth_headers)
+        assert response.status_code == 200, f"Get audit failed: {response.text}"
+        result = response.json()
+        actions = [(e["action"], e["method"], e["username"], e["outcome"]) for e in result["entries"]]
+        assert actions == [
+            ("delete_order", "DELETE", "admin", "ok"),
+            ("create_machine_order", "POST", "admin", "ok"),
+        ]
+        assert all(e["latency_ms"] >= 0 for e in result["entries"])
+        for counter in ("recorded", "flushed", "dropped", "buffered"):
+            assert counter in result["stats"]
+
+
+class TestCompletionForecast:
+    """Test the simulated completion forecast of the machine queues"""
+
+    def test_queue_is_projected_in_order(self, auth_headers):
+        """GET /api/forecast - each queued order starts when the previous one finishes"""
+        created = []
+        for quantidade in ("300", "150"):
+            response = requests.post(f"{BASE_URL}/api/machines/N6/orders", json={
+                "machine_id": "", "cliente": "TEST_FORECAST", "artigo": "TEST_FORECAST", "cor": "Azul",
+                "quantidade": quantidade
+            }, headers=auth_headers)
+            assert response.status_code == 200, f"Create order failed: {response.text}"
+            created.append(response.json()["id"])
+
+        response = requests.get(f"{BASE_URL}/api/forecast", params={"machine_code": "N6"}, headers=auth_headers)
+        assert response.status_code == 200, f"Get forecast failed: {response.text}"
+        forecasts = {f["order_id"]: f for f in response.json()["orders"]}
+        first, second = forecasts[created[0]], forecasts[created[1]]
+        assert first["projected_start"] <= first["projected_finish"] == second["projected_start"]
+        assert second["projected_start"] < second["projected_finish"]
+        assert first["queue_index"] < second["queue_index"]
+
+        for order_id in created:
+            requests.delete(f"{BASE_URL}/api/orders/{order_id}", headers=auth_headers)
+
+
+class TestOrderEtas:
+    """Test the cached per-order ETAs served with the machine queue"""
+
+    def test_etas_follow_queue_changes(self, auth_headers):
+        """GET /api/machines/{code}/orders - ETAs chain in queue order and follow a reorder"""
+        created = []
+        for quantidade in ("400", "200"):
+            response = requests.post(f"{BASE_URL}/api/machines/N7/orders", json={
+                "machine_id": "", "cliente": "TEST_ETA", "artigo": "TEST_ETA", "cor": "Azul", "quantidade": quantidade
+            }, headers=auth_headers)
+            assert response.status_code == 200, f"Create order failed: {response.text}"
+            created.append(response.json()["id"])
+
+        def etas():
+            response = requests.get(f"{BASE_URL}/api/machines/N7/orders", headers=auth_headers)
+            assert response.status_code == 200, f"Get queue failed: {response.text}"
+            return {order["id"]: order["eta"] for order in response.json() if order["id"] in created}
+
+        first, second = (etas()[order_id] for order_id in created)
+        assert first["projected_finish"] == second["projected_start"]
+
+        response = requests.put(f"{BASE_URL}/api/orders/{created[1]}/move", json={"position": 1}, headers=auth_headers)
+        assert response.status_code == 200, f"Move failed: {response.text}"
+        first, second = (etas()[order_id] for order_id in created)
+        assert second["projected_finish"] == first["projected_start"]
+
+        for order_id in created:
+            requests.delete(f"{BASE_URL}/api/orders/{order_id}", headers=auth_headers)
+
+
+
+class TestEnrichedReports:
+    """Test server-side artigo enrichment of report rows"""
+
+    def test_espulas_report_enriched_and_sorted_by_date(self, auth_headers):
+        """GET /api/reports/espulas - artigo_info from banco_dados, sorted by instant rather than by string"""
+        import uuid
+        name = f"TEST_REPORT_{uuid.uuid4().hex[:6].upper()}"
+        artigo = requests.post(f"{BASE_URL}/api/banco-dados", json={
+            "artigo": name, "engrenagem": "ENG-R", "fios": "24", "maquinas": "CD1", "ciclos": "5", "carga": "100"
+        }, headers=auth_headers).json()
+
+        created = []
+        # 2030-01-11T01:00Z, then 2030-01-10T20:00Z: their strings sort the other way round
+        for delivery in ("2030-01-10T22:00:00-03:00", "2030-01-11T01:00:00+05:00"):
+            response = requests.post(f"{BASE_URL}/api/espulas", json={
+                "cliente": "TEST_REPORT", "artigo": f" {name.lower()} ", "cor": "Azul",
+                "quantidade_metros": "10", "carga": "1", "data_prevista_entrega": delivery
+            }, headers=auth_headers)
+            assert response.status_code == 200, f"Create espula failed: {response.text}"
+            created.append(response.json()["id"])
+
+        response = requests.get(f"{BASE_URL}/api/reports/espulas", params={"status": "pendente"}, headers=auth_headers)
+        assert response.status_code == 200, f"Get report failed: {response.text}"
+        rows = [e for e in response.json()["espulas"] if e["id"] in created]
+        assert [e["id"] for e in rows] == created[::-1]
+        assert all(e["artigo_info"]["engrenagem"] == "ENG-R" for e in rows)
+
+        response = requests.get(f"{BASE_URL}/api/reports/complete", headers=auth_headers)
+        assert response.status_code == 200, f"Get complete report failed: {response.text}"
+        assert [e["id"] for e in response.json()["espulas"] if e["id"] in created] == created[::-1]
+
+        for espula_id in created:
+            requests.delete(f"{BASE_URL}/api/espulas/{espula_id}", headers=auth_headers)
+        requests.delete(f"{BASE_URL}/api/banco-dados/{artigo['id']}", headers=auth_headers)
+
+
+class TestArchive:
+    """Test hot/cold archival of finished documents"""
+
+    def test_finished_espula_moves_to_archive(self, auth_headers):
+        """POST /api/archive/run - old finished espula leaves /espulas, reports still find it by period"""
+        espula = requests.post(f"{BASE_URL}/api/espulas", json={
+            "cliente": "TEST_ARCHIVE", "artigo": "TEST_ARCHIVE", "cor": "Azul",
+            "quantidade_metros": "10", "carga": "1", "data_prevista_entrega": "2020-01-01"
+        }, headers=auth_headers).json()
+        response = requests.post(f"{BASE_URL}/api/actions/batch", json={"actions": [
+            {"type": "espula_status", "espula_id": espula["id"], "status": "finalizado",
+             "client_id": "1", "client_timestamp": "2020-01-02T10:00:00-03:00"},
+        ]}, headers=auth_headers)
+        assert response.json()["results"][0]["ok"], f"Finish failed: {response.text}"
+
+        response = requests.post(f"{BASE_URL}/api/archive/run", headers=auth_headers)
+        assert response.status_code == 200, f"Archive run failed: {response.text}"
+        assert response.json()["moved"]["espulas"] >= 1
+
+        espulas = requests.get(f"{BASE_URL}/api/espulas", headers=auth_headers).json()
+        assert espula["id"] not in [e["id"] for e in espulas]
+
+        def report_ids(start):
+            response = requests.get(f"{BASE_URL}/api/espulas/report", params={"start": start}, headers=auth_headers)
+            assert response.status_code == 200, f"Get report failed: {response.text}"
+            return [e["id"] for e in response.json()["espulas"]]
+
+        assert espula["id"] in report_ids("2020-01-01")
+        assert espula["id"] not in report_ids("2020-01-03")
+
+        requests.delete(f"{BASE_URL}/api/espulas/{espula['id']}", headers=auth_headers)
+
+
+class TestMachineTimeline:
+    """Test the downsampled machine status timeline"""
+
+    def test_transitions_are_bucketed(self, auth_headers):
+        """GET /api/machines/{code}/timeline - an order created and deleted shows up as amarelo then verde"""
+        order = requests.post(f"{BASE_URL}/api/machines/N4/orders", json={
+            "machine_id": "", "cliente": "TEST_TIMELINE", "artigo": "TEST_TIMELINE", "cor": "Azul", "quantidade": "1"
+        }, headers=auth_headers).json()
+        requests.delete(f"{BASE_URL}/api/orders/{order['id']}", headers=auth_headers)
+
+        response = requests.get(f"{BASE_URL}/api/machines/N4/timeline", params={"resolution": "15m"},
+                                headers=auth_headers)
+        assert response.status_code == 200, f"Get timeline failed: {response.text}"
+        intervals = response.json()["intervals"]
+        assert intervals, "Timeline should not be empty"
+        assert intervals[-1]["status"] == "verde"
+        # Both transitions may fall in one bucket or straddle two
+        assert any("amarelo" in interval["statuses"] for interval in intervals[-2:])
+        assert sum(interval["transitions"] for interval in intervals[-2:]) >= 2
+        assert all(a["end"] == b["start"] and a["status"] != b["status"] for a, b in zip(intervals, intervals[1:]))
+
+    def test_invalid_resolution(self, auth_headers):
+        """GET /api/machines/{code}/timeline - bad resolution or too many buckets is a 400"""
+        url = f"{BASE_URL}/api/machines/N4/timeline"
+        assert requests.get(url, params={"resolution": "1w"}, headers=auth_headers).status_code == 400
+        response = requests.get(url, params={"resolution": "1m", "from": "2020-01-01"}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestStartupWarmup:
+    """Test readiness after the startup warm-up and the user cache"""
+
+    def test_ready_with_phase_timings(self):
+        """GET /api/health/ready - 200 once warmed, with the duration of every phase"""
+        import time
+        for _ in range(20):
+            response = requests.get(f"{BASE_URL}/api/health/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.5)
+        assert response.status_code == 200, f"Not ready: {response.text}"
+        state = response.json()
+        assert state["ready"] is True
+        for phase in ("warm_machines", "warm_queues", "warm_users"):
+            assert state["phases"][phase] >= 0
+
+    def test_deleted_user_rejected_right_away(self, auth_headers):
+        """DELETE /api/users/{id} - the cached user entry is dropped, the token stops working"""
+        username = "test_warm_user"
+        user = requests.post(f"{BASE_URL}/api/users", json={
+            "username": username, "email": "warm@test.com", "password": "warm123", "role": "operador_interno"
+        }, headers=auth_headers).json()
+        token = requests.post(f"{BASE_URL}/api/auth/login", json={"username": username, "password": "warm123"}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        assert requests.get(f"{BASE_URL}/api/machines", headers=headers).status_code == 200
+
+        requests.delete(f"{BASE_URL}/api/users/{user['id']}", headers=auth_headers)
+        assert requests.get(f"{BASE_URL}/api/machines", headers=headers).status_code == 401
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
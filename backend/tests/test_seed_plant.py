@@ -0,0 +1,59 @@
+"""
+Test suite for MercoTêxtil system - Gerador de planta sintética:
+1. Same seed, same documents
+2. Machine queues are consistent (one order in production, colours match)
+3. Espulas, ordens and orders reference each other
+4. Documents have the shape the API writes (artigo_normalizado, shadow fields)
+"""
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+from parsing import normalize_artigo, parse_quantity
+from seed_plant import generate_plant
+
+END = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def plant():
+    return generate_plant(orders=3000, years=1, artigos=50, seed=3, end=END)
+
+
+class TestSeedPlant:
+    def test_deterministic(self, plant):
+        assert generate_plant(orders=3000, years=1, artigos=50, seed=3, end=END) == plant
+        assert generate_plant(orders=3000, years=1, artigos=50, seed=4, end=END) != plant
+
+    def test_machine_queues(self, plant):
+        in_production = Counter(o["machine_code"] for o in plant["orders"] if o["status"] == "em_producao")
+        assert max(in_production.values()) == 1
+        open_maintenance = {m["machine_code"] for m in plant["maintenance"] if m["status"] == "em_manutencao"}
+        for machine in plant["machines"]:
+            if machine["code"] in open_maintenance:
+                assert machine["status"] == "azul"
+            elif machine["code"] in in_production:
+                assert machine["status"] == "vermelho"
+        assert all(o["created_at"] <= END for o in plant["orders"])
+        assert all(o["finished_at"] <= END for o in plant["orders"] if o["status"] == "finalizado")
+
+    def test_references(self, plant):
+        numeros = [o["numero_os"] for o in plant["ordens_producao"]]
+        assert numeros == [str(n).zfill(4) for n in range(1, len(numeros) + 1)]
+        espulas = {e["id"]: e for e in plant["espulas"]}
+        ordens = {o["id"] for o in plant["ordens_producao"]}
+        for order in plant["orders"]:
+            if order["origem"] == "espulagem":
+                espula = espulas[order["espulagem_id"]]
+                assert espula["status"] == "finalizado"
+                assert espula["ordem_producao_id"] in ordens
+                assert order["machine_code"] in {a["machine_code"] for a in espula["machine_allocations"]}
+
+    def test_api_document_shape(self, plant):
+        assert all(a["artigo_normalizado"] == normalize_artigo(a["artigo"]) for a in plant["banco_dados"])
+        assert all(o["quantidade_num"] == parse_quantity(o["quantidade"]) for o in plant["orders"])
+        assert all(o["data_entrega_dt"] is not None for o in plant["ordens_producao"])
+        for espula in plant["espulas"]:
+            assert espula["data_prevista_entrega_dt"] is not None
+            assert all(a["quantidade_num"] is not None for a in espula["machine_allocations"])
@@ -0,0 +1,119 @@
+"""
+Test suite for MercoTêxtil system - Microbenchmarks de serialização:
+1. serialize_doc / serialize_docs
+2. convert_utc_to_brazil (datetimes and ISO strings)
+3. Model constructors (Order, Espula, OrdemProducao) and .dict(), as the handlers call it
+4. Transform step of each list endpoint (documents -> models -> JSON bytes)
+each at 100, 1k and 10k documents from the synthetic plant (seed_plant).
+
+Baselines live in tests/benchmarks, one folder per machine/interpreter, so a
+comparison only runs against a baseline recorded on the same kind of machine:
+
+    # record a baseline
+    pytest tests/test_serialization_benchmark.py --benchmark-only \
+        --benchmark-storage=tests/benchmarks --benchmark-save=baseline
+    # compare against the latest baseline, failing on a >10% regression
+    pytest tests/test_serialization_benchmark.py --benchmark-only \
+        --benchmark-storage=tests/benchmarks --benchmark-compare \
+        --benchmark-compare-fail=median:10%
+"""
+import os
+from datetime import datetime, timezone
+from itertools import cycle, islice
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# server.py reads the connection settings at import; the client never connects here
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from seed_plant import generate_plant  # noqa: E402
+from server import (  # noqa: E402
+    ArtigoBancoDados, Espula, Machine, Maintenance, OrdemProducao, Order,
+    convert_utc_to_brazil, render_json, serialize_doc, serialize_docs,
+)
+
+SIZES = [100, 1_000, 10_000]
+PLANT = generate_plant(orders=10_000, years=1, artigos=400, seed=42, end=datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+# List endpoint -> (collection, response model)
+LIST_ENDPOINTS = {
+    "/machines": ("machines", Machine),
+    "/maintenance": ("maintenance", Maintenance),
+    "/orders": ("orders", Order),
+    "/ordens-producao": ("ordens_producao", OrdemProducao),
+    "/banco-dados": ("banco_dados", ArtigoBancoDados),
+    "/espulas": ("espulas", Espula),
+}
+MODELS = {"orders": Order, "espulas": Espula, "ordens_producao": OrdemProducao}
+
+
+def documents(collection: str, size: int) -> list:
+    """`size` documents of a collection, repeating the plant when it is smaller"""
+    return list(islice(cycle(PLANT[collection]), size))
+
+
+def run_on_copies(benchmark, function, docs: list):
+    """serialize_doc converts in place: every round gets untouched documents"""
+    return benchmark.pedantic(
+        function, setup=lambda: (([dict(doc) for doc in docs],), {}),
+        rounds=max(20, 200_000 // len(docs)), warmup_rounds=2,
+    )
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_serialize_doc(benchmark, size):
+    benchmark.group = f"serialize_doc-{size}"
+    docs = documents("orders", size)
+    run_on_copies(benchmark, lambda batch: [serialize_doc(doc) for doc in batch], docs)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_serialize_docs(benchmark, size):
+    benchmark.group = f"serialize_docs-{size}"
+    docs = documents("espulas", size)
+    result = run_on_copies(benchmark, serialize_docs, docs)
+    assert isinstance(result[0]["created_at"], str)
+
+
+@pytest.mark.parametrize("source", ["datetime", "isoformat"])
+@pytest.mark.parametrize("size", SIZES)
+def test_convert_utc_to_brazil(benchmark, size, source):
+    benchmark.group = f"convert_utc_to_brazil-{size}"
+    values = [order["created_at"] for order in documents("orders", size)]
+    if source == "isoformat":
+        values = [value.isoformat() for value in values]
+    result = benchmark(lambda: [convert_utc_to_brazil(value) for value in values])
+    assert result[0].utcoffset() is not None
+
+
+@pytest.mark.parametrize("collection", sorted(MODELS))
+@pytest.mark.parametrize("size", SIZES)
+def test_model_constructor(benchmark, size, collection):
+    benchmark.group = f"model-{size}"
+    model, docs = MODELS[collection], documents(collection, size)
+    result = benchmark(lambda: [model(**doc) for doc in docs])
+    assert len(result) == size
+
+
+@pytest.mark.parametrize("collection", sorted(MODELS))
+@pytest.mark.parametrize("size", SIZES)
+def test_model_dict(benchmark, size, collection):
+    benchmark.group = f"model.dict-{size}"
+    model = MODELS[collection]
+    instances = [model(**doc) for doc in documents(collection, size)]
+    result = benchmark(lambda: [instance.dict() for instance in instances])
+    assert len(result) == size
+
+
+@pytest.mark.parametrize("endpoint", sorted(LIST_ENDPOINTS))
+@pytest.mark.parametrize("size", SIZES)
+def test_list_endpoint_transform(benchmark, size, endpoint):
+    """What each list endpoint does between to_list() and the response body"""
+    benchmark.group = f"list-endpoint-{size}"
+    collection, model = LIST_ENDPOINTS[endpoint]
+    docs = documents(collection, size)
+    body = benchmark(lambda: render_json([model(**doc) for doc in docs]))
+    assert body.startswith(b"[{")
@@ -0,0 +1,140 @@
+"""
+Test suite for MercoTêxtil system - Simulação das filas de máquinas:
+1. DurationModel falls back from artigo+machine/layout to machine, layout and the default rate
+2. Queues run in order, in-production orders keep only what is left
+3. Maintenance delays a machine, deactivated machines leave orders unscheduled
+4. Forecast per numero_os ends with its last order
+5. Benchmark: thousands of queued orders simulated in well under a second
+"""
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from simulation import DurationModel, forecast_by_numero_os, simulate_plant
+
+NOW = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+HISTORY = [
+    {"artigo": "Art A", "layout_type": "16_fusos", "machine_code": "CD1", "metros": 2000.0, "hours": 10.0, "count": 5},
+    {"artigo": "ART B", "layout_type": "16_fusos", "machine_code": "CD2", "metros": 500.0, "hours": 10.0, "count": 1},
+]
+
+
+def order(order_id, machine_code="CD1", quantidade=200.0, status="pendente", position=1024, **extra):
+    return {"id": order_id, "machine_code": machine_code, "layout_type": "16_fusos", "artigo": "ART A",
+            "status": status, "queue_position": position, "quantidade_num": quantidade, **extra}
+
+
+class TestDurationModel:
+    """Throughput buckets"""
+
+    def test_artigo_layout_bucket(self):
+        model = DurationModel(HISTORY, default_rate=100)
+        hours, basis = model.estimate({"artigo": " art  a", "layout_type": "16_fusos"}, 400)
+        assert (hours, basis) == (2.0, "artigo+layout_type")
+
+    def test_machine_buckets(self):
+        model = DurationModel(HISTORY + [
+            {"artigo": "ART A", "layout_type": "16_fusos", "machine_code": "CD9", "metros": 300.0, "hours": 6.0,
+             "count": 3},
+        ], default_rate=100)
+        assert model.estimate({"artigo": "ART A", "layout_type": "16_fusos", "machine_code": "CD9"}, 100) == \
+            (2.0, "artigo+machine_code")
+        hours, basis = model.estimate({"artigo": "NEW", "layout_type": "16_fusos", "machine_code": "CD1"}, 600)
+        assert (hours, basis) == (3.0, "machine_code")
+
+    def test_sparse_bucket_falls_back_to_layout(self):
+        model = DurationModel(HISTORY, default_rate=100, min_samples=3)
+        hours, basis = model.estimate({"artigo": "ART B", "layout_type": "16_fusos"}, 250)
+        assert basis == "layout_type"
+        assert hours == 250 / (2500 / 20)
+
+    def test_default_rate_and_unparsed_quantity(self):
+        model = DurationModel(HISTORY, default_rate=100)
+        assert model.estimate({"artigo": "X", "layout_type": "32_fusos"}, 300) == (3.0, "default")
+        assert model.estimate({"artigo": "ART A", "layout_type": "16_fusos"}, None) == (2.0, "artigo+layout_type")
+
+
+class TestSimulatePlant:
+    """Event loop over the machine queues"""
+
+    def test_queue_order_and_remaining_production(self):
+        model = DurationModel(default_rate=100)
+        orders = [
+            order("b", position=2048),
+            order("a", status="em_producao", position=1024, started_at=NOW - timedelta(hours=1)),
+            order("c", position=1536),
+        ]
+        forecasts = simulate_plant([{"code": "CD1"}], orders, model, NOW)
+        assert forecasts["a"]["projected_finish"] == NOW + timedelta(hours=1)
+        assert forecasts["c"]["projected_start"] == forecasts["a"]["projected_finish"]
+        assert forecasts["b"]["projected_start"] == forecasts["c"]["projected_finish"]
+        assert [forecasts[i]["queue_index"] for i in "acb"] == [1, 2, 3]
+
+    def test_overrun_finishes_now(self):
+        forecasts = simulate_plant(
+            [{"code": "CD1"}],
+            [order("a", status="em_producao", started_at=NOW - timedelta(hours=5))],
+            DurationModel(default_rate=100), NOW,
+        )
+        assert forecasts["a"]["projected_finish"] == NOW
+        assert forecasts["a"]["overrun"] is True
+
+    def test_maintenance_and_deactivated_machines(self):
+        machines = [{"code": "CD1", "status": "azul"}, {"code": "CD2", "status": "desativada", "active": False}]
+        orders = [order("a"), order("b", machine_code="CD2")]
+        forecasts = simulate_plant(machines, orders, DurationModel(default_rate=100), NOW,
+                                   unavailable_until={"CD1": NOW + timedelta(hours=4)})
+        assert forecasts["a"]["projected_start"] == NOW + timedelta(hours=4)
+        assert forecasts["b"]["projected_finish"] is None
+        assert forecasts["b"]["basis"] == "machine_unavailable"
+
+    def test_changeover_between_artigos(self):
+        orders = [order("a"), order("b", position=2048, artigo="ART Z")]
+        forecasts = simulate_plant([{"code": "CD1"}], orders, DurationModel(default_rate=100), NOW,
+                                   changeover_hours=1.5)
+        assert forecasts["b"]["projected_start"] == forecasts["a"]["projected_finish"] + timedelta(hours=1.5)
+
+    def test_forecast_by_numero_os(self):
+        orders = [order("a", numero_os="0001"), order("b", machine_code="CD2", quantidade=600, numero_os="0001")]
+        forecasts = simulate_plant([{"code": "CD1"}, {"code": "CD2"}], orders, DurationModel(default_rate=100), NOW)
+        summary = forecast_by_numero_os(forecasts.values())["0001"]
+        assert summary["orders"] == 2
+        assert summary["projected_start"] == NOW
+        assert summary["projected_finish"] == NOW + timedelta(hours=6)
+
+
+class TestSimulationBenchmark:
+    """The forecast runs on demand, so the whole plant has to simulate fast"""
+
+    def test_simulates_thousands_of_orders_under_a_second(self):
+        rng = random.Random(42)
+        machines = [{"code": f"M{n}", "status": rng.choice(["verde", "amarelo", "azul"])} for n in range(340)]
+        history = [
+            {"artigo": f"ART {a}", "layout_type": layout, "machine_code": "M0",
+             "metros": rng.uniform(1000, 5000), "hours": rng.uniform(10, 50), "count": rng.randint(1, 20)}
+            for a in range(400) for layout in ("16_fusos", "32_fusos")
+        ]
+        model = DurationModel(history, default_rate=100)
+        orders = []
+        for n in range(20_000):
+            machine = rng.choice(machines)["code"]
+            orders.append({
+                "id": str(n), "machine_code": machine, "layout_type": rng.choice(["16_fusos", "32_fusos"]),
+                "artigo": f"ART {rng.randrange(450)}", "status": "pendente", "queue_position": n * 1024,
+                "quantidade_num": rng.choice([None, rng.uniform(100, 5000)]), "numero_os": str(n // 3).zfill(4),
+            })
+        unavailable = {m["code"]: NOW + timedelta(hours=8) for m in machines if m["status"] == "azul"}
+
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            forecasts = simulate_plant(machines, [dict(o) for o in orders], model, NOW,
+                                       unavailable_until=unavailable, changeover_hours=0.5)
+            forecast_by_numero_os(forecasts.values())
+            timings.append(time.perf_counter() - start)
+
+        assert len(forecasts) == len(orders)
+        median_ms = statistics.median(timings) * 1000
+        print(f"\nsimulate_plant over {len(orders)} orders: median {median_ms:.1f} ms")
+        assert median_ms < 1000
@@ -0,0 +1,104 @@
+"""
+Test suite for MercoTêxtil system - Cache de tokens verificados:
+1. Cached claims expire with the token
+2. Revoked users lose their cached and not yet cached tokens
+3. LRU stays bounded
+4. Benchmark: auth overhead per request with and without the cache
+"""
+import statistics
+import time
+
+import jwt
+
+from token_cache import TokenCache
+
+SECRET = "token_cache_benchmark_secret_key_32b"
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def claims(user_id="u1", iat=1_000_000.0, exp=1_086_400.0):
+    return {"user_id": user_id, "username": user_id, "role": "admin", "iat": iat, "exp": exp}
+
+
+class TestTokenCache:
+    """Entries are evicted on expiry, revocation and size"""
+
+    def test_hit_until_expiry(self):
+        clock = FakeClock()
+        cache = TokenCache(clock=clock)
+        cache.put("token-a", claims(exp=clock.now + 60))
+        assert cache.get("token-a")["user_id"] == "u1"
+
+        clock.now += 61
+        assert cache.get("token-a") is None
+        assert len(cache) == 0
+
+    def test_revoke_user(self):
+        clock = FakeClock()
+        cache = TokenCache(clock=clock)
+        cache.put("token-a", claims("u1"))
+        cache.put("token-b", claims("u2"))
+
+        clock.now += 10
+        cache.revoke_user("u1")
+        assert cache.get("token-a") is None
+        assert cache.get("token-b") is not None
+        # A token issued before the revocation is rejected even if it was never cached
+        assert cache.is_revoked(claims("u1"))
+        # A new login after reactivation is accepted
+        assert not cache.is_revoked(claims("u1", iat=clock.now + 1))
+
+    def test_lru_is_bounded(self):
+        cache = TokenCache(max_entries=3, clock=FakeClock())
+        for i in range(3):
+            cache.put(f"token-{i}", claims(f"u{i}"))
+        cache.get("token-0")  # most recently used now
+        cache.put("token-3", claims("u3"))
+
+        assert len(cache) == 3
+        assert cache.get("token-1") is None
+        assert cache.get("token-0") is not None
+
+
+class TestAuthBenchmark:
+    """Per-request token verification cost"""
+
+    def test_cached_verification_is_cheaper_than_decode(self):
+        now = time.time()
+        tokens = [
+            jwt.encode(claims(f"user{i}", iat=now, exp=now + 3600), SECRET, algorithm="HS256")
+            for i in range(50)
+        ]
+        cache = TokenCache()
+
+        def verify(token):
+            payload = cache.get(token)
+            if payload is None:
+                payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+                cache.put(token, payload)
+            return payload
+
+        rounds = 200
+        decode_timings, cached_timings = [], []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for token in tokens:
+                jwt.decode(token, SECRET, algorithms=["HS256"])
+            decode_timings.append((time.perf_counter() - start) / len(tokens))
+
+            start = time.perf_counter()
+            for token in tokens:
+                verify(token)
+            cached_timings.append((time.perf_counter() - start) / len(tokens))
+
+        decode_us = statistics.median(decode_timings) * 1e6
+        cached_us = statistics.median(cached_timings) * 1e6
+        print(f"\nauth overhead per request: jwt.decode {decode_us:.2f} us, cached {cached_us:.2f} us")
+        assert cached_us < decode_us
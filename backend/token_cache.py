@@ -0,0 +1,72 @@
+"""
+Cache of verified access tokens.
+
+Tablets on the floor send the same bearer token on every poll, so the HS256
+verification in get_current_user is repeated thousands of times a day for the
+same string. TokenCache keeps the decoded claims of recently verified tokens
+in a bounded LRU keyed by the SHA-256 digest of the token (the token itself is
+never stored). Entries die with the token's `exp`, and revoking a user drops
+its entries and rejects every token issued (`iat`) before the revocation.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+class TokenCache:
+    def __init__(self, max_entries: int = 4096, token_lifetime: float = 24 * 60 * 60,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.token_lifetime = token_lifetime
+        self.clock = clock
+        self._entries: "OrderedDict[bytes, dict]" = OrderedDict()  # digest -> claims
+        self._revoked: Dict[str, float] = {}  # user_id -> revoked at (epoch seconds)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Claims of a cached, unexpired and unrevoked token, else None"""
+        key = self._digest(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            return None
+        if claims["exp"] <= self.clock() or self.is_revoked(claims):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def put(self, token: str, claims: dict):
+        """Remember the claims of a token that was just verified"""
+        key = self._digest(token)
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, claims: dict) -> bool:
+        revoked_at = self._revoked.get(claims.get("user_id"))
+        # Tokens without iat predate revocation support
+        return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+    def revoke_user(self, user_id: str):
+        """Reject the user's tokens issued until now (deactivation/deletion)"""
+        now = self.clock()
+        self._revoked[user_id] = now
+        # Revocations older than a token lifetime only cover expired tokens
+        for revoked_id, revoked_at in list(self._revoked.items()):
+            if now - revoked_at > self.token_lifetime:
+                del self._revoked[revoked_id]
+        for key, claims in list(self._entries.items()):
+            if claims.get("user_id") == user_id:
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._revoked.clear()
+
+    def __len__(self):
+        return len(self._entries)
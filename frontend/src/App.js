@@ -19,6 +19,30 @@ import * as XLSX from 'xlsx';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Creates carry an Idempotency-Key, so a request lost on the plant Wi-Fi can be
+// retried without creating a duplicate: the server replays the first response.
+const CREATE_RETRIES = 3;
+
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID?.() ?? `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+const postIdempotent = async (url, data, config = {}) => {
+  const requestConfig = {
+    ...config,
+    headers: { ...config.headers, "Idempotency-Key": newIdempotencyKey() }
+  };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await axios.post(url, data, requestConfig);
+    } catch (error) {
+      const status = error.response?.status;
+      const retryable = !error.response || status === 409 || status >= 502;
+      if (!retryable || attempt >= CREATE_RETRIES) throw error;
+      await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  }
+};
+
 const App = () => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem("token"));
@@ -32,6 +56,23 @@ const App = () => {
     }
   }, [token]);
 
+  useEffect(() => {
+    // Tokens stop being accepted when an admin edits the user: back to the login screen
+    const interceptor = axios.interceptors.response.use(
+      response => response,
+      error => {
+        if (error.response?.status === 401 && !error.config?.url?.endsWith("/auth/login") && localStorage.getItem("token")) {
+          localStorage.removeItem("token");
+          setToken(null);
+          setUser(null);
+          toast.warning("Sessão expirada, faça login novamente");
+        }
+        return Promise.reject(error);
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const validateToken = async () => {
     try {
       const response = await axios.get(`${API}/auth/me`, {
@@ -146,6 +187,7 @@ const LoginPage = ({ onLogin }) => {
 const Dashboard = ({ user, onLogout }) => {
   const [activeLayout, setActiveLayout] = useState("16_fusos");
   const [machines, setMachines] = useState([]);
+  const layoutsRef = useRef({});
   const [orders, setOrders] = useState([]);
   const [users, setUsers] = useState([]);
   const [maintenances, setMaintenances] = useState([]);
@@ -169,10 +211,25 @@ const Dashboard = ({ user, onLogout }) => {
 
   const loadMachines = async () => {
     try {
-      const response = await axios.get(`${API}/machines/${activeLayout}`, {
-        headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
-      });
-      setMachines(response.data);
+      const headers = { Authorization: `Bearer ${localStorage.getItem("token")}` };
+      const statusResponse = await axios.get(`${API}/machines/${activeLayout}/status`, { headers });
+      const { layout_version, machines: machineStatus } = statusResponse.data;
+
+      // Static layout (id, code, position) is only fetched again when its version changes
+      let layout = layoutsRef.current[activeLayout];
+      if (!layout || layout.version !== layout_version) {
+        const layoutResponse = await axios.get(`${API}/layouts/${activeLayout}`, {
+          headers,
+          params: { v: layout_version }
+        });
+        layout = layoutResponse.data;
+        layoutsRef.current[activeLayout] = layout;
+      }
+
+      const statusByCode = Object.fromEntries(machineStatus.map(m => [m.code, m]));
+      setMachines(layout.machines
+        .filter(machine => statusByCode[machine.code])
+        .map(machine => ({ ...machine, ...statusByCode[machine.code] })));
     } catch (error) {
       toast.error("Erro ao carregar máquinas");
     }
@@ -512,7 +569,7 @@ const FusosPanel = ({ layout, machines, user, onMachineUpdate, onOrderUpdate, on
 
   const createManualOrder = async () => {
     try {
-      await axios.post(`${API}/machines/${manualOrderMachine.code}/orders`, orderData, {
+      await postIdempotent(`${API}/machines/${manualOrderMachine.code}/orders`, orderData, {
         headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
       });
       
@@ -536,7 +593,7 @@ const FusosPanel = ({ layout, machines, user, onMachineUpdate, onOrderUpdate, on
 
   const handleOrderSubmit = async () => {
     try {
-      await axios.post(`${API}/orders`, {
+      await postIdempotent(`${API}/orders`, {
         machine_id: selectedMachine.id,
         ...orderData
       }, {
@@ -1054,6 +1111,11 @@ const FusosPanel = ({ layout, machines, user, onMachineUpdate, onOrderUpdate, on
                               <p className="text-white font-medium">{order.quantidade}</p>
                             </div>
                           </div>
+                          {order.eta && order.eta.projected_finish && (
+                            <p className="text-sm text-gray-400 mt-2">
+                              Previsão de término: <span className="text-white font-medium">{formatDateTimeBrazil(order.eta.projected_finish)}</span>
+                            </p>
+                          )}
                         </div>
                         <div className="flex gap-2 ml-4">
                           {order.status === "pendente" && (user.role === "operador_externo" || user.role === "admin" || user.role === "operador_interno") && (
@@ -1571,7 +1633,7 @@ const OrdemProducaoPanel = ({ user }) => {
 
   const createOrdem = async () => {
     try {
-      await axios.post(`${API}/ordens-producao`, ordemData, {
+      await postIdempotent(`${API}/ordens-producao`, ordemData, {
         headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
       });
       
@@ -2099,7 +2161,7 @@ const RelatoriosPanel = ({ user }) => {
         data_prevista_entrega: selectedOrdem.data_entrega
       };
 
-      await axios.post(`${API}/espulas`, espulaPayload, {
+      await postIdempotent(`${API}/espulas`, espulaPayload, {
         headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
       });
       
@@ -2619,7 +2681,7 @@ const EspulasPanel = ({ espulas, user, onEspulaUpdate }) => {
         cargas_fracoes: cargasFracoes.filter(cf => cf.trim() !== "")
       };
       
-      await axios.post(`${API}/espulas`, espulaPayload, {
+      await postIdempotent(`${API}/espulas`, espulaPayload, {
         headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
       });
       
@@ -2660,7 +2722,7 @@ const EspulasPanel = ({ espulas, user, onEspulaUpdate }) => {
 
   const finalizeEspulaWithMachines = async (espulaId) => {
     try {
-      const response = await axios.post(`${API}/espulas/${espulaId}/finalize-with-machines`, {}, {
+      const response = await postIdempotent(`${API}/espulas/${espulaId}/finalize-with-machines`, {}, {
         headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
       });
       
@@ -2675,24 +2737,17 @@ const EspulasPanel = ({ espulas, user, onEspulaUpdate }) => {
     try {
       const XLSXStyle = require('xlsx-js-style');
       
-      const pendenteEspulas = espulas.filter(e => e.status === "pendente");
+      // Espulagens pendentes já enriquecidas pelo servidor com os dados do artigo (artigo_info)
+      const response = await axios.get(`${API}/reports/espulas?status=pendente`, {
+        headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
+      });
+      const pendenteEspulas = response.data.espulas;
       
       if (pendenteEspulas.length === 0) {
         toast.warning("Nenhuma espulagem pendente para exportar");
         return;
       }
       
-      // Buscar dados dos artigos do banco de dados para preencher informações
-      let artigosData = [];
-      try {
-        const response = await axios.get(`${API}/banco-dados`, {
-          headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
-        });
-        artigosData = response.data;
-      } catch (err) {
-        console.error("Erro ao carregar artigos:", err);
-      }
-      
       const wb = XLSXStyle.utils.book_new();
       
       // Descobrir o número máximo de cargas em todas as espulagens
@@ -2726,11 +2781,8 @@ const EspulasPanel = ({ espulas, user, onEspulaUpdate }) => {
       
       // UMA LINHA por espulagem (SEM linhas em branco)
       pendenteEspulas.forEach(espula => {
-        // Buscar dados do artigo no banco de dados
-        const artigoInfo = artigosData.find(a => 
-          a.artigo && espula.artigo && 
-          a.artigo.toLowerCase() === espula.artigo.toLowerCase()
-        );
+        // Dados do artigo no banco de dados
+        const artigoInfo = espula.artigo_info;
         
         // Montar lista de máquinas (prioridade: alocadas > espulagem > banco de dados)
         let maquinasList = '';
@@ -3609,6 +3661,8 @@ const BancoDadosPanel = ({ user }) => {
     ciclos: '',
     carga: ''
   });
+  const [importing, setImporting] = useState(false);
+  const importInputRef = useRef(null);
 
   useEffect(() => {
     loadArtigos();
@@ -3676,7 +3730,34 @@ const BancoDadosPanel = ({ user }) => {
       loadArtigos();
     } catch (error) {
       console.error("Erro ao salvar artigo:", error);
-      toast.error("Erro ao salvar artigo");
+      toast.error(error.response?.data?.detail || "Erro ao salvar artigo");
+    }
+  };
+
+  const importArtigos = async (event) => {
+    const file = event.target.files?.[0];
+    event.target.value = '';
+    if (!file) return;
+
+    const formData = new FormData();
+    formData.append('file', file);
+    setImporting(true);
+    try {
+      const response = await axios.post(`${API}/banco-dados/import`, formData, {
+        headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
+      });
+      const { inserted, updated, errors } = response.data;
+      toast.success(`Importação concluída: ${inserted} novos, ${updated} atualizados`);
+      if (errors.length > 0) {
+        console.warn("Linhas com erro na importação:", errors);
+        toast.error(`${errors.length} linha(s) com erro, ex.: linha ${errors[0].row} - ${errors[0].errors.join(', ')}`);
+      }
+      loadArtigos();
+    } catch (error) {
+      console.error("Erro ao importar artigos:", error);
+      toast.error(error.response?.data?.detail || "Erro ao importar artigos");
+    } finally {
+      setImporting(false);
     }
   };
 
@@ -3699,9 +3780,27 @@ const BancoDadosPanel = ({ user }) => {
     <div className="space-y-6">
       <div className="flex justify-between items-center">
         <h2 className="text-3xl font-bold text-white">Banco de Dados - Artigos</h2>
-        <Button onClick={() => openForm()} className="btn-merco">
-          + Lançar Artigo
-        </Button>
+        <div className="flex gap-2">
+          <input
+            ref={importInputRef}
+            type="file"
+            accept=".csv,.xlsx"
+            className="hidden"
+            onChange={importArtigos}
+          />
+          <Button
+            onClick={() => importInputRef.current?.click()}
+            disabled={importing}
+            variant="outline"
+            className="border-gray-600 text-white hover:bg-gray-700"
+          >
+            <Download className="h-4 w-4 mr-2 rotate-180" />
+            {importing ? 'Importando...' : 'Importar CSV/XLSX'}
+          </Button>
+          <Button onClick={() => openForm()} className="btn-merco">
+            + Lançar Artigo
+          </Button>
+        </div>
       </div>
 
       <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-3">
@@ -4012,39 +4111,37 @@ const AdminPanel = ({ users, onUserUpdate }) => {
 
   const exportCompleteReport = async () => {
     try {
-      // Fetch all data from all endpoints
-      const [ordersResponse, ordensResponse, espulasResponse, maintenanceResponse, artigosResponse] = await Promise.all([
-        axios.get(`${API}/orders`, {
-          headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
-        }),
-        axios.get(`${API}/ordens-producao`, {
-          headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
-        }),
-        axios.get(`${API}/espulas`, {
-          headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
-        }),
-        axios.get(`${API}/maintenance`, {
+      // Relatório já enriquecido no servidor (artigo_info) + banco de dados para a aba de artigos
+      const [reportResponse, artigosResponse] = await Promise.all([
+        axios.get(`${API}/reports/complete`, {
           headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
         }),
         axios.get(`${API}/banco-dados`, {
           headers: { Authorization: `Bearer ${localStorage.getItem("token")}` }
         })
       ]);
+      const report = reportResponse.data;
 
       const artigosData = artigosResponse.data || [];
       const wb = XLSX.utils.book_new();
+
+      // queue_position é uma chave esparsa - calcular a posição real na fila de cada máquina
+      const queueRank = {};
+      [...report.orders]
+        .sort((a, b) => (a.queue_position || 0) - (b.queue_position || 0))
+        .forEach(order => {
+          queueRank[order.machine_code] = (queueRank[order.machine_code] || 0) + 1;
+          queueRank[order.id] = queueRank[order.machine_code];
+        });
       
       // Sheet 1: Produção (Orders) - com dados do artigo
-      const ordersData = ordersResponse.data.map(order => {
-        const artigoInfo = artigosData.find(a => 
-          a.artigo && order.artigo && 
-          a.artigo.toLowerCase() === order.artigo.toLowerCase()
-        );
+      const ordersData = report.orders.map(order => {
+        const artigoInfo = order.artigo_info;
         return {
           'ID': order.id,
           'Número OS': order.numero_os || '-',
           'Origem': order.origem === 'manual' ? 'Manual' : order.origem === 'espulagem' ? 'Espulagem' : 'Ordem',
-          'Posição na Fila': order.queue_position || '-',
+          'Posição na Fila': queueRank[order.id] || '-',
           'Máquina': order.machine_code,
           'Layout': order.layout_type === '16_fusos' ? '16 Fusos' : '32 Fusos',
           'Cliente': order.cliente,
@@ -4069,11 +4166,8 @@ const AdminPanel = ({ users, onUserUpdate }) => {
       XLSX.utils.book_append_sheet(wb, ordersWS, "Produção");
 
       // Sheet 2: Ordens de Produção (todas) - com dados do artigo
-      const ordensData = ordensResponse.data.map(ordem => {
-        const artigoInfo = artigosData.find(a => 
-          a.artigo && ordem.artigo && 
-          a.artigo.toLowerCase() === ordem.artigo.toLowerCase()
-        );
+      const ordensData = report.ordens_producao.map(ordem => {
+        const artigoInfo = ordem.artigo_info;
         return {
           'Número OS': ordem.numero_os,
           'Cliente': ordem.cliente,
@@ -4096,11 +4190,8 @@ const AdminPanel = ({ users, onUserUpdate }) => {
       XLSX.utils.book_append_sheet(wb, ordensWS, "Ordens de Produção");
 
       // Sheet 3: Espulagem - com dados do artigo
-      const espulasData = espulasResponse.data.map(espula => {
-        const artigoInfo = artigosData.find(a => 
-          a.artigo && espula.artigo && 
-          a.artigo.toLowerCase() === espula.artigo.toLowerCase()
-        );
+      const espulasData = report.espulas.map(espula => {
+        const artigoInfo = espula.artigo_info;
         
         // Lista de máquinas alocadas
         let maquinasList = '';
@@ -4148,7 +4239,7 @@ const AdminPanel = ({ users, onUserUpdate }) => {
       XLSX.utils.book_append_sheet(wb, espulasWS, "Espulagem");
 
       // Sheet 4: Manutenção
-      const maintenanceData = maintenanceResponse.data.map(maint => ({
+      const maintenanceData = report.maintenance.map(maint => ({
         'ID': maint.id,
         'Máquina': maint.machine_code,
         'Motivo': maint.motivo,